@@ -0,0 +1,109 @@
+"""Module with the coalescing of the tickets that request the same change of an entity"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+DEFAULT_COALESCE_WINDOW = 300
+
+EntityKey = Tuple[str, Hashable]
+
+
+@dataclass
+class Execution:
+    """Ticket running the change of an entity and the tickets waiting for its outcome"""
+    issue_key: str
+    followers: Dict[str, object] = field(default_factory=dict)
+
+
+class Coalescer:
+    """Shares one execution among the tickets that request the same change
+
+    The entity key is defined by the handler class (see
+    JiraHandler.entity_key). While a ticket of a key is running the other
+    tickets of the key wait for it, and its outcome is kept for `window`
+    seconds, the tickets of the key dispatched meanwhile get the same outcome
+    without running the change again. An outcome is kept with the ordering
+    key of its ticket (see JiraHandler.ordering_key), and `forget` drops it
+    when another ticket of the ordering key runs, e.g. a removal of the
+    client that made the outcome of its inclusion stale.
+
+    :param window: seconds the outcome of a key is kept, 0 to only share
+        the executions running
+    :type window: float
+    :param clock: clock of the window, defaults to time.monotonic
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, window: float = DEFAULT_COALESCE_WINDOW,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.window = window
+        self.clock = clock
+        self.running: Dict[EntityKey, Execution] = {}
+        self.outcomes: Dict[EntityKey, Tuple[object, float, Optional[Hashable]]] = {}
+        self.lock = threading.Lock()
+
+    def outcome(self, key: EntityKey) -> Optional[object]:
+        """Returns the outcome of the last execution of the key, None when it expired"""
+        with self.lock:
+            outcome = self.outcomes.get(key)
+            if outcome is None:
+                return None
+            if outcome[1] <= self.clock():
+                del self.outcomes[key]
+                return None
+            return outcome[0]
+
+    def follow(self, key: EntityKey, ticket: object) -> bool:
+        """Makes the ticket wait for the execution of the key
+
+        :return: False if there is no execution of the key running
+        """
+        with self.lock:
+            execution = self.running.get(key)
+            if execution is None or execution.issue_key == ticket.key:
+                return False
+            execution.followers[ticket.key] = ticket
+            return True
+
+    def lead(self, key: EntityKey, issue_key: str) -> None:
+        """Records the ticket as the execution of the key"""
+        with self.lock:
+            self.running[key] = Execution(issue_key)
+
+    def complete(self, key: EntityKey, outcome: object = None,
+                 order_key: Hashable = None) -> List[object]:
+        """Ends the execution of the key
+
+        :param outcome: outcome shared with the other tickets, None when the
+            execution failed and each ticket must run on its own
+        :type outcome: object
+        :param order_key: ordering key of the ticket, its outcome is dropped by
+            `forget` of the ordering key
+        :type order_key: Hashable
+        :return: tickets that waited for the execution
+        """
+        with self.lock:
+            execution = self.running.pop(key, None)
+            if outcome is not None and self.window:
+                self.outcomes[key] = (outcome, self.clock() + self.window, order_key)
+            self._expire()
+            return list(execution.followers.values()) if execution else []
+
+    def forget(self, order_key: Hashable) -> None:
+        """Drops the outcomes of the ordering key, called when a ticket of the
+        ordering key runs and may change what they recorded"""
+        with self.lock:
+            for key in [key for key, (_, _, outcome_order_key) in self.outcomes.items()
+                        if outcome_order_key == order_key]:
+                del self.outcomes[key]
+
+    def waiting(self) -> int:
+        """Returns the number of tickets waiting for an execution"""
+        with self.lock:
+            return sum(len(execution.followers) for execution in self.running.values())
+
+    def _expire(self) -> None:
+        now = self.clock()
+        for key in [key for key, (_, expires, _) in self.outcomes.items() if expires <= now]:
+            del self.outcomes[key]
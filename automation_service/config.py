@@ -10,9 +10,16 @@ import json
 import pathlib
 
 from enum import Enum
+from typing import Dict
+
+from automation_service import config_store
+from automation_service import log_handlers
 
 
 DEFAULT_CONFIG_FILE = 'config.ini'
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 10
+QUEUE_LOGGING: Dict[str, log_handlers.QueueLogging] = {}
 
 def set_file_handler_args_kwargs(log_folder: str, log_file: str) -> tuple:
     """Returns the args and kwargs for the file handler
@@ -51,17 +58,57 @@ def checks_log_folder(log_folder: str) -> bool:
 class LogHandler(Enum):
     """Enum to define the log handler"""
     CONSOLE = (logging.StreamHandler, None)
-    FILE = (logging.FileHandler, set_file_handler_args_kwargs)
+    FILE = (log_handlers.RotatingFileHandler, set_file_handler_args_kwargs)
+    TIMED_FILE = (log_handlers.TimedRotatingFileHandler, set_file_handler_args_kwargs)
+
+
+class LogFormat(Enum):
+    """Enum to define the format of the log file"""
+    TEXT = 'text'
+    JSON = 'json'
+
+    def get_formatter(self) -> logging.Formatter:
+        """Returns the formatter of the records"""
+        if self is LogFormat.JSON:
+            return log_handlers.JsonFormatter()
+        return log_handlers.ContextFormatter()
 
 
 def set_logger(log_file: str = 'jira_auto_main.log',
-               log_folder='logs', logger_name: str = __name__) -> logging.Logger:
+               log_folder='logs', logger_name: str = __name__,
+               max_bytes: int = DEFAULT_LOG_MAX_BYTES,
+               backup_count: int = DEFAULT_LOG_BACKUP_COUNT,
+               when: str = None, compress: bool = True,
+               log_format: str = LogFormat.TEXT.value,
+               level: str = 'DEBUG') -> logging.Logger:
     """Set the logger
 
+    The logger gets only a queue handler, the console and file handlers are
+    run by a background listener, so the threads that log do not wait for
+    the writes. The file is rotated by size, or by time when `when` is
+    informed, and the rotated files are compressed on the background.
+    The records carry the issue key and the handler type bound on the
+    context of the thread and are formatted only by the listener.
+
     :param log_file: name of the log file, defaults to 'jira_auto_main.log'
     :type log_file: str, optional
     :param log_folder: folder where the log file is, defaults to 'logs'
     :type log_folder: str, optional
+    :param max_bytes: size of the file that triggers the rotation, defaults to 10MB
+    :type max_bytes: int, optional
+    :param backup_count: number of rotated files kept, defaults to 10
+    :type backup_count: int, optional
+    :param when: interval of the rotation by time, e.g. 'midnight' or 'H',
+        defaults to None to rotate by size
+    :type when: str, optional
+    :param compress: True to gzip the rotated files, defaults to True
+    :type compress: bool, optional
+    :param log_format: format of the log file, 'text' or 'json' (one object per line),
+        defaults to 'text', the console is always text
+    :type log_format: str, optional
+    :param level: level of the logger, the calls below it return without
+        building the record, defaults to 'DEBUG'
+    :type level: str, optional
     :return: logger
     """
     logger = logging.getLogger(logger_name)
@@ -71,19 +118,59 @@ def set_logger(log_file: str = 'jira_auto_main.log',
     if logger.handlers:
         return logger
 
-    logger.setLevel(logging.DEBUG)
-    formatter = logging.Formatter(
-        '%(asctime)s - %(module)s.%(funcName)s:%(lineno)d - %(levelname)s - %(message)s'
-    )
-    for handler_type in LogHandler:
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    formatters = {LogHandler.CONSOLE: LogFormat.TEXT.get_formatter()}
+    file_handler = LogHandler.TIMED_FILE if when else LogHandler.FILE
+    rotation_kwargs = {'when': when} if when else {'maxBytes': max_bytes}
+
+    handlers = []
+    formatters[file_handler] = LogFormat(log_format.lower()).get_formatter()
+    for handler_type in (LogHandler.CONSOLE, file_handler):
         handler_args, handler_kwargs = [], {}
         if handler_type.value[1]:
             handler_args, handler_kwargs = handler_type.value[1](log_folder, log_file)
+            handler_kwargs.update(rotation_kwargs, backupCount=backup_count,
+                                  compress=compress, encoding='UTF-8')
+
+        handlers.append(get_log_handler(handler_type, formatters[handler_type], handler_args,
+                                        handler_kwargs))
 
-        handler = get_log_handler(handler_type, formatter, handler_args, handler_kwargs)
-        logger.addHandler(handler)
+    queue_logging = log_handlers.QueueLogging(handlers)
+    QUEUE_LOGGING[logger.name] = queue_logging
+    logger.addHandler(queue_logging.handler)
     return logger
 
+
+def stop_logger(logger_name: str = __name__) -> None:
+    """Writes the pending records of the logger and stops its listener
+
+    :param logger_name: name of the logger
+    :type logger_name: str
+    """
+    queue_logging = QUEUE_LOGGING.pop(logger_name, None)
+    if not queue_logging:
+        return
+    logger = logging.getLogger(logger_name)
+    logger.removeHandler(queue_logging.handler)
+    queue_logging.stop()
+
+
+def get_log_options(config: configparser.SectionProxy) -> dict:
+    """Returns the options of set_logger informed on the section SETUP
+
+    :param config: section SETUP of the config file
+    :type config: configparser.SectionProxy
+    :return: kwargs of set_logger
+    """
+    return {
+        'max_bytes': int(config.get('log_max_bytes', DEFAULT_LOG_MAX_BYTES)),
+        'backup_count': int(config.get('log_backup_count', DEFAULT_LOG_BACKUP_COUNT)),
+        'when': config.get('log_when') or None,
+        'compress': config.getboolean('log_compress', True),
+        'log_format': config.get('log_format') or LogFormat.TEXT.value,
+        'level': config.get('log_level') or 'DEBUG',
+    }
+
 def get_log_handler(
     handler_type: LogHandler,
     formatter: logging.Formatter,
@@ -109,17 +196,13 @@ def get_config(config_file: str, logger: logging.Logger = None) -> dict:
     :type config_file: str
     :param logger: logger, defaults to None
     :type logger: logging.Logger, optional
-    :return: config
+    :return: config, read only
     """
     if not logger:
         logger = set_logger()
 
     try:
-        config_file_path = os.path.abspath(os.path.join('./config', config_file)).replace('\\', '/')
-        config = configparser.ConfigParser()
-        with open(config_file_path, encoding="UTF-8") as cfg:
-            config.read_file(cfg)
-            return config
+        return config_store.read_config(config_store.config_path(config_file))
     except FileNotFoundError:
         logger.error('Config file not found')
         sys.exit(1)
@@ -141,6 +224,9 @@ def get_config_handler_file(config_file_name: str) -> dict:
 def configdecorator(*args, **kwargs): # pylint: disable=unused-argument
     """Decorator to get the config file.
 
+    The file is parsed once, the calls get the current snapshot of the
+    shared config_store.ConfigStore of the file.
+
     :param config_file: name of the config file, defaults to 'pre_rate.ini'
     :type config_file: str, optional
     :param config_folder: folder where the config file is, defaults to 'config'
@@ -154,7 +240,7 @@ def configdecorator(*args, **kwargs): # pylint: disable=unused-argument
 
         def function_wrapper_param(function, *args, **kwargs): # pylint: disable=unused-argument
             def func_wrapped(*args, **kwargs):
-                config = get_config(config_file=config_file)
+                config = config_store.get_store(config_file).snapshot().config
                 if config_group:
                     config = config[config_group]
 
@@ -164,16 +250,20 @@ def configdecorator(*args, **kwargs): # pylint: disable=unused-argument
 
     function = args[0]
     def func_wrapped(*args, **kwargs):
-        config = get_config(config_file=config_file)
+        config = config_store.get_store(config_file).snapshot().config
 
         return function(config=config, *args, **kwargs)
     return func_wrapped
 
 
 def logdecorator(function, *args, **kwargs): # pylint: disable=unused-argument
-    """Decorator to get the logger."""
+    """Decorator to get the logger, set on the first call."""
+    logger = None
+
     def func_wrapped(*args, **kwargs):
-        logger = set_logger()
+        nonlocal logger
+        if logger is None:
+            logger = set_logger()
 
         return function(logger=logger, *args, **kwargs)
     return func_wrapped
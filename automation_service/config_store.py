@@ -0,0 +1,351 @@
+"""Module with the store of the configuration, parsed once and served as immutable
+snapshots that are swapped when the files change"""
+import configparser
+import json
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from automation_service import loader
+from automation_service.dispatch import DispatchPolicy
+from automation_service.pools import HandlerLimit, parse_limits
+from automation_service import metrics
+from handlers.jira_handler import JiraHandlerData
+
+
+DEFAULT_CONFIG_FOLDER = 'config'
+DEFAULT_WATCH_INTERVAL = 5
+DEFAULT_PROCESS_QUEUE_SIZE = 10
+DEFAULT_SLEEP_TIME = 60
+DEFAULT_MIN_SLEEP_TIME = 1
+
+CONFIG_ERRORS = (OSError, ValueError, KeyError, TypeError, configparser.Error)
+
+
+class FrozenConfigParser(configparser.ConfigParser):
+    """ConfigParser that can not be changed after `freeze`, so the same
+    instance can be shared by every thread"""
+    frozen = False
+
+    def freeze(self) -> 'FrozenConfigParser':
+        """Blocks the changes of the parser"""
+        self.frozen = True
+        return self
+
+    def _check_frozen(self) -> None:
+        if self.frozen:
+            raise TypeError('Configuration snapshot is read only')
+
+    def set(self, section, option, value=None):
+        self._check_frozen()
+        super().set(section, option, value)
+
+    def add_section(self, section):
+        self._check_frozen()
+        super().add_section(section)
+
+    def remove_section(self, section):
+        self._check_frozen()
+        return super().remove_section(section)
+
+    def remove_option(self, section, option):
+        self._check_frozen()
+        return super().remove_option(section, option)
+
+    def read_dict(self, dictionary, source='<dict>'):
+        self._check_frozen()
+        super().read_dict(dictionary, source)
+
+    def _read(self, fp, fpname):
+        self._check_frozen()
+        super()._read(fp, fpname)
+
+
+def config_path(file_name: str, config_folder: str = DEFAULT_CONFIG_FOLDER) -> str:
+    """Returns the path of a file of the config folder"""
+    return os.path.abspath(os.path.join(config_folder, file_name)).replace('\\', '/')
+
+
+def read_config(path: str) -> FrozenConfigParser:
+    """Parses an ini file into a frozen parser
+
+    :param path: path of the file
+    :type path: str
+    :return: parser of the file, read only
+    """
+    parser = FrozenConfigParser()
+    with open(path, encoding='UTF-8') as config_file:
+        parser.read_file(config_file)
+    return parser.freeze()
+
+
+def read_handlers(path: str) -> Tuple[Tuple[str, ...], Mapping[str, str],
+                                       Mapping[str, HandlerLimit]]:
+    """Parses and validates config_handlers.json
+
+    :param path: path of the file
+    :type path: str
+    :return: modules of the plugins, the handler class of each summary and the
+        limits of the handler classes
+    :raises ValueError: if the file does not have the expected layout
+    """
+    with open(path, encoding='UTF-8') as handlers_file:
+        data = json.load(handlers_file)
+
+    plugins, handlers = data['plugins'], data['handlers']
+    if not isinstance(plugins, list) or not all(isinstance(plugin, str) for plugin in plugins):
+        raise ValueError('"plugins" must be a list of modules')
+    if not isinstance(handlers, dict) or \
+            not all(isinstance(value, str) for value in handlers.values()):
+        raise ValueError('"handlers" must map the summaries to the handler classes')
+    limits = parse_limits(data.get('limits', {}))
+    return tuple(plugins), MappingProxyType(dict(handlers)), MappingProxyType(limits)
+
+
+def load_plugins(plugins: Tuple[str, ...], handlers: Mapping[str, str]) -> JiraHandlerData:
+    """Loads the handler classes of the plugins on a new holder with the routing
+
+    :param plugins: modules of the plugins
+    :type plugins: tuple
+    :param handlers: handler class of each summary
+    :type handlers: Mapping[str, str]
+    :return: new holder of the handlers
+    :raises ValueError: if a plugin fails to load
+    """
+    handlers_holder = JiraHandlerData({}, dict(handlers))
+    try:
+        loader.load_handlers(plugins, handlers_holder)
+    except Exception as error: # pylint: disable=broad-except
+        raise ValueError(f'Error loading the plugins: {error!r}') from error
+    return handlers_holder
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable snapshot of the configuration files
+
+    :param version: sequence of the snapshot, incremented on each reload
+    :type version: int
+    :param config: parser of the ini file, read only
+    :type config: FrozenConfigParser
+    :param plugins: modules of the handlers, empty without config_handlers.json
+    :type plugins: tuple
+    :param handlers: handler class of each summary
+    :type handlers: Mapping[str, str]
+    :param limits: limits of the pools of the handler classes
+    :type limits: Mapping[str, HandlerLimit]
+    :param signature: modification time and size of each file when it was read,
+        including the source files of the plugins
+    :type signature: tuple
+    :param handlers_holder: handler classes of the plugins loaded with the
+        routing, None without config_handlers.json
+    :type handlers_holder: JiraHandlerData
+    """
+    version: int
+    config: FrozenConfigParser
+    plugins: Tuple[str, ...] = ()
+    handlers: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    limits: Mapping[str, HandlerLimit] = field(default_factory=lambda: MappingProxyType({}))
+    signature: tuple = ()
+    handlers_holder: Optional[JiraHandlerData] = field(default=None, compare=False)
+    process_queue_size: int = field(init=False)
+    sleep_time: int = field(init=False)
+    min_sleep_time: float = field(init=False)
+    dispatch_policy: DispatchPolicy = field(init=False)
+
+    def __post_init__(self) -> None:
+        setup = self.config['SETUP'] if self.config.has_section('SETUP') else {}
+        values = {
+            'process_queue_size': int(setup.get('process_queue_size',
+                                                DEFAULT_PROCESS_QUEUE_SIZE)),
+            'sleep_time': int(setup.get('sleep_time', DEFAULT_SLEEP_TIME)),
+            'min_sleep_time': float(setup.get('min_sleep_time', DEFAULT_MIN_SLEEP_TIME)),
+        }
+        if values['process_queue_size'] < 1:
+            raise ValueError('process_queue_size must be greater than 0')
+        if values['sleep_time'] < 0 or values['min_sleep_time'] < 0:
+            raise ValueError('sleep_time and min_sleep_time can not be negative')
+        values['dispatch_policy'] = DispatchPolicy.from_config(setup)
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class ConfigStore:
+    """Store of the configuration, parsed once and served as immutable snapshots
+
+    The files are only read again by `refresh`, called by the watcher started
+    with `watch` when their modification time or size change, the source
+    files of the plugins are watched too so a changed plugin produces a new
+    snapshot where the plugin is reloaded (see loader.load_handlers). The plugins
+    are loaded with the files, so a new snapshot is only swapped in when the
+    files are valid and every plugin loads, otherwise the current one is kept,
+    and the subscribers are called with it after the swap.
+
+    :param config_file: name of the ini file on the config folder
+    :type config_file: str
+    :param handlers_file: name of config_handlers.json on the config folder,
+        None when the store has only the ini file
+    :type handlers_file: str
+    :param config_folder: folder of the files, defaults to 'config'
+    :type config_folder: str
+    """
+    def __init__(self, config_file: str = 'config.ini', handlers_file: str = None,
+                 config_folder: str = DEFAULT_CONFIG_FOLDER,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        self.config_path = config_path(config_file, config_folder)
+        self.handlers_path = config_path(handlers_file, config_folder) if handlers_file else None
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.subscribers: List[Callable[[ConfigSnapshot], None]] = []
+        self.rejected_signature: Optional[tuple] = None
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._stop = threading.Event()
+        self.watcher: Optional[threading.Thread] = None
+
+    @property
+    def paths(self) -> List[str]:
+        """Paths of the files of the store"""
+        return [path for path in (self.config_path, self.handlers_path) if path]
+
+    def signature(self, plugins: Tuple[str, ...] = ()) -> tuple:
+        """Returns the modification time and size of the files and of the source
+        files of the plugins, None for a missing file"""
+        paths = self.paths + [loader.module_file(plugin) for plugin in plugins]
+        return tuple(loader.file_signature(path) for path in paths)
+
+    def load(self, version: int = 1) -> ConfigSnapshot:
+        """Reads and validates the files and loads the plugins
+
+        :param version: version of the snapshot
+        :type version: int
+        :return: new snapshot
+        :raises: the errors of CONFIG_ERRORS when a file is missing or invalid,
+            or a plugin fails to load
+        """
+        plugins, handlers, limits = (), MappingProxyType({}), MappingProxyType({})
+        handlers_holder = None
+        if self.handlers_path:
+            plugins, handlers, limits = read_handlers(self.handlers_path)
+        signature = self.signature(plugins)
+        config = read_config(self.config_path)
+        if self.handlers_path:
+            handlers_holder = load_plugins(plugins, handlers)
+        return ConfigSnapshot(version, config, plugins, handlers, limits, signature,
+                              handlers_holder)
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Returns the current snapshot, reading the files on the first call
+
+        The service can not start without its configuration, so an error on
+        the first read ends the program.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self.lock:
+            if self._snapshot is None:
+                try:
+                    self._snapshot = self.load()
+                except FileNotFoundError:
+                    self.logger.error('Config file not found')
+                    sys.exit(1)
+                except CONFIG_ERRORS as error:
+                    self.logger.error('Invalid configuration: %s', error)
+                    sys.exit(1)
+            return self._snapshot
+
+    def refresh(self) -> bool:
+        """Swaps in a new snapshot when the files changed and are valid
+
+        :return: True if a new snapshot was swapped in
+        """
+        current = self.snapshot()
+        signature = self.signature(current.plugins)
+        if signature in (current.signature, self.rejected_signature):
+            return False
+
+        with self.lock:
+            try:
+                snapshot = self.load(current.version + 1)
+            except CONFIG_ERRORS as error:
+                self.rejected_signature = signature
+                self.logger.error('Invalid configuration, keeping version %s: %s',
+                                  current.version, error)
+                metrics.CONFIG_RELOADS.inc(outcome='rejected')
+                return False
+            self._snapshot = snapshot
+            self.rejected_signature = None
+            subscribers = list(self.subscribers)
+
+        self.logger.info('Configuration version %s loaded', snapshot.version)
+        metrics.CONFIG_RELOADS.inc(outcome='applied')
+        for subscriber in subscribers:
+            try:
+                subscriber(snapshot)
+            except Exception: # pylint: disable=broad-except
+                self.logger.exception('Error applying configuration version %s',
+                                      snapshot.version)
+        return True
+
+    def subscribe(self, subscriber: Callable[[ConfigSnapshot], None]) -> None:
+        """Registers a function called with each new snapshot"""
+        with self.lock:
+            self.subscribers.append(subscriber)
+
+    def watch(self, interval: float = DEFAULT_WATCH_INTERVAL) -> None:
+        """Starts a daemon thread that checks the files every `interval` seconds"""
+        if not interval or (self.watcher and self.watcher.is_alive()):
+            return
+        self._stop.clear()
+        self.watcher = threading.Thread(target=self._watch, args=(interval,),
+                                        name='ConfigWatcher', daemon=True)
+        self.watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception: # pylint: disable=broad-except
+                self.logger.exception('Error watching the configuration')
+
+    def stop(self) -> None:
+        """Stops the watcher"""
+        self._stop.set()
+        if self.watcher:
+            self.watcher.join(timeout=5)
+
+
+STORES: Dict[Tuple[str, str], ConfigStore] = {}
+STORES_LOCK = threading.Lock()
+
+
+def get_store(config_file: str = 'config.ini', config_folder: str = DEFAULT_CONFIG_FOLDER,
+              logger: logging.Logger = logging.getLogger(__name__),
+              watch_interval: float = DEFAULT_WATCH_INTERVAL) -> ConfigStore:
+    """Returns the store shared by every caller of the ini file
+
+    A store created here is watched every `watch_interval` seconds (0 disables
+    it), so the callers get the changes of the file without a restart.
+    """
+    key = (config_file, config_folder)
+    with STORES_LOCK:
+        if key not in STORES:
+            STORES[key] = ConfigStore(config_file, config_folder=config_folder, logger=logger)
+            STORES[key].watch(watch_interval)
+        return STORES[key]
+
+
+def share_store(store: ConfigStore, config_file: str = 'config.ini',
+                config_folder: str = DEFAULT_CONFIG_FOLDER) -> None:
+    """Makes `get_store` of the ini file return a store already created and
+    watched, such as the store of the service, instead of a new one"""
+    with STORES_LOCK:
+        previous = STORES.get((config_file, config_folder))
+        STORES[(config_file, config_folder)] = store
+    if previous is not None and previous is not store:
+        previous.stop()
@@ -0,0 +1,134 @@
+"""Module with the cache of the rows parsed from the attachments, addressed by their content"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Mapping, Optional, Tuple
+
+from automation_service import metrics
+
+
+DEFAULT_CACHE_ENTRIES = 32
+DEFAULT_CACHE_ROWS = 200000
+
+
+def content_digest(content: bytes) -> str:
+    """Returns the digest that addresses the content of a file"""
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """Rows parsed and validated from a file
+
+    :param digest: digest of the content of the file
+    :type digest: str
+    :param rows: value of each key of the file, e.g. the tlp of each model
+    :type rows: dict
+    """
+    digest: str
+    rows: Dict[Hashable, object]
+
+
+class ContentCache:
+    """LRU cache of the rows parsed from the files of the tickets, addressed by
+    the digest of their content
+
+    A file uploaded again on other tickets is not parsed again. The
+    attachment ids are also mapped to the digests, since an attachment never
+    changes, a file already seen is found without downloading it. Each
+    handler class uses its own namespace.
+
+    The cache only holds what the files contain, whether their rows are on
+    the database is always checked by the handler against the database.
+
+    :param max_entries: max files kept
+    :type max_entries: int
+    :param max_rows: max rows kept, adding the rows of every file
+    :type max_rows: int
+    """
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES,
+                 max_rows: int = DEFAULT_CACHE_ROWS) -> None:
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.entries: Dict[Tuple[str, str], CacheEntry] = OrderedDict()
+        self.attachments: Dict[Tuple[str, str], str] = {}
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+    def configure(self, max_entries: int, max_rows: int) -> None:
+        """Changes the limits, evicting the least recently used files above them
+
+        :raises ValueError: if a limit is negative
+        """
+        if max_entries < 0 or max_rows < 0:
+            raise ValueError('The limits of the cache can not be negative')
+        with self.lock:
+            self.max_entries = max_entries
+            self.max_rows = max_rows
+            self._evict()
+
+    def lookup(self, namespace: str, digest: str = None,
+               attachment_id: str = None) -> Optional[CacheEntry]:
+        """Returns the entry of a file by the digest of its content or by the id
+        of its attachment, when both are informed the attachment is mapped to
+        the digest
+
+        :return: the entry, None when the file is not on the cache
+        """
+        with self.lock:
+            if digest is None and attachment_id is not None:
+                digest = self.attachments.get((namespace, str(attachment_id)))
+            entry = self.entries.get((namespace, digest)) if digest else None
+            if entry is None:
+                metrics.CONTENT_CACHE.inc(event='miss')
+                return None
+            self.entries.move_to_end((namespace, digest))
+            if attachment_id is not None:
+                self.attachments[(namespace, str(attachment_id))] = digest
+            metrics.CONTENT_CACHE.inc(event='hit')
+            return entry
+
+    def store(self, namespace: str, digest: str, rows: Mapping[Hashable, object],
+              attachment_id: str = None) -> CacheEntry:
+        """Keeps the rows parsed from a file
+
+        :return: the entry of the file, not kept when it has more rows than `max_rows`
+        """
+        entry = CacheEntry(digest, dict(rows))
+        with self.lock:
+            previous = self.entries.pop((namespace, digest), None)
+            if previous is not None:
+                self.rows -= len(previous.rows)
+            if len(entry.rows) > self.max_rows or not self.max_entries:
+                return entry
+            self.entries[(namespace, digest)] = entry
+            self.rows += len(entry.rows)
+            if attachment_id is not None:
+                self.attachments[(namespace, str(attachment_id))] = digest
+            self._evict()
+        return entry
+
+    def clear(self) -> None:
+        """Removes every file"""
+        with self.lock:
+            self.entries.clear()
+            self.attachments.clear()
+            self.rows = 0
+
+    def _evict(self) -> None:
+        while self.entries and (len(self.entries) > self.max_entries or
+                                self.rows > self.max_rows):
+            (namespace, digest), entry = self.entries.popitem(last=False)
+            self.rows -= len(entry.rows)
+            for attachment_key in [key for key, value in self.attachments.items()
+                                   if key[0] == namespace and value == digest]:
+                del self.attachments[attachment_key]
+            metrics.CONTENT_CACHE.inc(event='evicted')
+
+
+CACHE = ContentCache()
@@ -0,0 +1,44 @@
+"""Module to handle the context of the ticket processed by the current thread"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+
+_LOCAL = threading.local()
+
+
+def current() -> Dict[str, Any]:
+    """Returns the context bound to the current thread
+
+    :return: dict with the context values, issue_key and handler_type
+    :rtype: dict
+    """
+    values = getattr(_LOCAL, 'values', None)
+    if values is None:
+        values = _LOCAL.values = {}
+    return values
+
+
+def get(name: str, default: Any = None) -> Any:
+    """Returns a value from the context of the current thread
+
+    :param name: name of the value
+    :type name: str
+    :param default: value returned if the name is not bound, defaults to None
+    :type default: Any, optional
+    """
+    return current().get(name, default)
+
+
+@contextmanager
+def bind(**values) -> Iterator[Dict[str, Any]]:
+    """Binds values to the context of the current thread while inside the block
+
+    :return: context manager with the bound values
+    """
+    previous = current().copy()
+    current().update(values)
+    try:
+        yield current()
+    finally:
+        _LOCAL.values = previous
@@ -1,17 +1,76 @@
 """Module to handle database connection"""
 import logging
+import time
 from typing import Callable
 from typing import Union
 
 import cx_Oracle
 
+from automation_service import metrics
+from automation_service import tracing
+from automation_service.resilience import CircuitBreaker, CircuitBreakerOpen
+
+
+CONNECTION_ERRORS = (cx_Oracle.DatabaseError, ConnectionError)
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that records the latency of the statements executed
+
+    :param cursor: cursor of the connection
+    :type cursor: cx_Oracle.Cursor
+    """
+    def __init__(self, cursor: cx_Oracle.Cursor) -> None:
+        self.cursor = cursor
+
+    def __getattr__(self, name: str):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def _timed(self, function: Callable, statement: str, *args, **kwargs):
+        label = metrics.statement_label(statement)
+        start = time.perf_counter()
+        try:
+            with tracing.span('oracle.statement', statement=label):
+                return function(statement, *args, **kwargs)
+        finally:
+            metrics.ORACLE_STATEMENT_DURATION.observe(time.perf_counter() - start,
+                                                      statement=label)
+
+    def execute(self, statement: str, *args, **kwargs):
+        """Executes a statement"""
+        return self._timed(self.cursor.execute, statement, *args, **kwargs)
+
+    def executemany(self, statement: str, *args, **kwargs):
+        """Executes a statement for many rows"""
+        return self._timed(self.cursor.executemany, statement, *args, **kwargs)
+
 
 class Oracle:
-    """Class to handle oracle connection"""
-    def __init__(self, logger: logging.Logger = logging.getLogger(__name__)) -> None:
+    """Class to handle oracle connection
+
+    :param logger: logger
+    :type logger: logging.Logger
+    :param breaker: circuit breaker of the database, with the retry policy
+        applied on the connection attempts
+    :type breaker: CircuitBreaker, optional
+    """
+    def __init__(self, logger: logging.Logger = logging.getLogger(__name__),
+                 breaker: CircuitBreaker = None) -> None:
         self.logger: logging.Logger = logger
         self.connection: cx_Oracle.Connection = None
         self.connection_params: tuple = ()
+        self.breaker = breaker
+
+    def _connect(self) -> cx_Oracle.Connection:
+        """Connect to the database through the circuit breaker, when there is one"""
+        with tracing.span('oracle.connect'):
+            if not self.breaker:
+                return cx_Oracle.connect(*self.connection_params, threaded = True)
+            return self.breaker.call(cx_Oracle.connect, *self.connection_params,
+                                     errors=CONNECTION_ERRORS, threaded = True)
 
     def create_connection(self, user: str, password: str,
                           host: str, port: str, sid: str) -> cx_Oracle.Connection:
@@ -20,22 +79,22 @@ class Oracle:
         try:
             dsn = cx_Oracle.makedsn(host, port, sid)
             self.connection_params = (user, password, dsn)
-            self.connection = cx_Oracle.connect(*self.connection_params, threaded = True)
+            self.connection = self._connect()
             self.logger.debug("Connected to database")
 
             return self.connection
-        except (cx_Oracle.DatabaseError, ConnectionError) as error:
+        except (cx_Oracle.DatabaseError, ConnectionError, CircuitBreakerOpen) as error:
             self.logger.error(error)
             return None
 
     def reconnect_to_database(self):
         """Reconnect to database"""
         try:
-            self.connection = cx_Oracle.connect(*self.connection_params, threaded = True)
+            self.connection = self._connect()
             self.logger.debug("Reconnected to database")
 
             return self.connection
-        except (cx_Oracle.DatabaseError, ConnectionError) as error:
+        except (cx_Oracle.DatabaseError, ConnectionError, CircuitBreakerOpen) as error:
             self.logger.error(error)
             return None
 
@@ -43,7 +102,7 @@ class Oracle:
         """Get cursor from connection"""
         try:
             cursor = self.connection.cursor()
-            return cursor
+            return InstrumentedCursor(cursor)
         except cx_Oracle.DatabaseError as error:
             self.logger.error(error)
             return None
@@ -89,17 +148,20 @@ class Oracle:
         """Checks if connection is valid and connected"""
         try:
             return self.connection.ping() is None
-        except (cx_Oracle.InterfaceError, cx_Oracle.DatabaseError, ConnectionError):
+        except (cx_Oracle.InterfaceError, cx_Oracle.DatabaseError, ConnectionError,
+                AttributeError):
             return False
 
     def command_execution(self, command: str, params: list):
         """Query builder"""
         self.logger.debug("Building query")
-        if not self.is_connected():
-            self.reconnect_to_database()
+        if not self.is_connected() and not self.reconnect_to_database():
+            return None
 
         try:
             cursor = self.get_cursor()
+            if cursor is None:
+                return None
             cursor.execute(command, params)
             return cursor
         except cx_Oracle.DatabaseError as error:
@@ -120,6 +182,9 @@ def get_mail_list(lookup_code: str, oracle: Oracle) -> list:
         "'EMAIL_LIST' AND CODE = :lookup_code and enabled = 'Y'",
         [lookup_code]
     )
+    if cursor is None:
+        return mail_list
+
     try:
         row = cursor.fetchone()
         if row:
@@ -0,0 +1,305 @@
+"""Module with the queue of the tickets waiting for a free slot, ordered by urgency"""
+import datetime
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from collections import Counter
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+
+DEFAULT_PRIORITIES = ('Highest', 'High', 'Medium', 'Low', 'Lowest')
+DEFAULT_DISPATCH_QUEUE_SIZE = 100
+DEFAULT_PRIORITY_AGING = 600
+DEFAULT_SLA_FIELD = 'duedate'
+DEFAULT_SEARCH_PREFETCH = 2
+DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%d')
+
+
+class DispatchKey(Enum):
+    """Criteria of the order of the tickets waiting for a slot"""
+    PRIORITY = 'priority'
+    SLA = 'sla'
+    AGE = 'age'
+    HANDLER = 'handler'
+
+
+DEFAULT_ORDER = (DispatchKey.PRIORITY, DispatchKey.SLA, DispatchKey.AGE)
+
+
+def parse_list(value: str) -> List[str]:
+    """Returns the items of a comma separated option"""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def parse_timestamp(value: object) -> Optional[float]:
+    """Returns the timestamp of a Jira date or datetime, None if it is not a date"""
+    if not isinstance(value, str):
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+@dataclass(frozen=True)
+class DispatchPolicy:
+    """Order of the tickets waiting for a free slot of the process queue
+
+    :param order: criteria compared in order, the first that differs decides
+    :type order: tuple
+    :param priorities: names of the Jira priorities from the most to the least
+        urgent, the unknown priorities come after them
+    :type priorities: tuple
+    :param aging_interval: seconds waiting that raise a ticket one priority
+        level, so the low priorities are not starved, 0 disables the aging
+    :type aging_interval: float
+    :param handler_ranks: rank of the handler classes, lower first, the ones
+        not informed come after them
+    :type handler_ranks: Mapping[str, int]
+    :param sla_field: field of the ticket with its due date
+    :type sla_field: str
+    :param size: max number of tickets waiting, the least urgent are dropped
+    :type size: int
+    :param prefetch: tickets fetched by the search besides the free slots
+    :type prefetch: int
+    """
+    order: Tuple[DispatchKey, ...] = DEFAULT_ORDER
+    priorities: Tuple[str, ...] = DEFAULT_PRIORITIES
+    aging_interval: float = DEFAULT_PRIORITY_AGING
+    handler_ranks: Mapping[str, int] = field(default_factory=dict)
+    sla_field: str = DEFAULT_SLA_FIELD
+    size: int = DEFAULT_DISPATCH_QUEUE_SIZE
+    prefetch: int = DEFAULT_SEARCH_PREFETCH
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, str]) -> 'DispatchPolicy':
+        """Returns the policy of the options of the section SETUP
+
+        :param config: section SETUP of the config file
+        :type config: Mapping[str, str]
+        :raises ValueError: if an option is invalid
+        """
+        order = tuple(DispatchKey(key.lower()) for key in parse_list(
+            config.get('dispatch_order', ', '.join(key.value for key in DEFAULT_ORDER))))
+        handler_ranks = {}
+        for item in parse_list(config.get('handler_priority', '')):
+            handler_class, _, rank = item.partition(':')
+            handler_ranks[handler_class.strip()] = int(rank)
+        policy = cls(
+            order=order,
+            priorities=tuple(parse_list(config.get('priority_order', ''))) or DEFAULT_PRIORITIES,
+            aging_interval=float(config.get('priority_aging', DEFAULT_PRIORITY_AGING)),
+            handler_ranks=handler_ranks,
+            sla_field=config.get('sla_field', DEFAULT_SLA_FIELD) or DEFAULT_SLA_FIELD,
+            size=int(config.get('dispatch_queue_size', DEFAULT_DISPATCH_QUEUE_SIZE)),
+            prefetch=int(config.get('search_prefetch', DEFAULT_SEARCH_PREFETCH)),
+        )
+        if policy.size < 1 or policy.aging_interval < 0 or policy.prefetch < 0:
+            raise ValueError('dispatch_queue_size must be greater than 0, '
+                             'priority_aging and search_prefetch can not be negative')
+        return policy
+
+    def priority_rank(self, ticket: object) -> int:
+        """Returns the rank of the Jira priority of the ticket, lower first"""
+        priority = getattr(ticket.fields, 'priority', None)
+        name = getattr(priority, 'name', None)
+        if name in self.priorities:
+            return self.priorities.index(name)
+        return len(self.priorities)
+
+    def search_size(self, free_slots: int, waiting: int = 0) -> int:
+        """Returns the number of tickets to fetch for the free slots
+
+        :param free_slots: free slots of the process queue
+        :type free_slots: int
+        :param waiting: tickets already waiting on the dispatch queue that the
+            free slots could not take, e.g. blocked on the full pool of their
+            handler type, they are fetched again on top of the free slots
+        :type waiting: int
+        :return: max results of the search
+        """
+        return max(0, min(free_slots + self.prefetch + waiting, self.size))
+
+    def handler_rank(self, handler_type: Optional[str]) -> int:
+        """Returns the rank of the handler class, lower first"""
+        return self.handler_ranks.get(handler_type, len(self.handler_ranks))
+
+
+@dataclass
+class Candidate:
+    """Ticket fetched and waiting for a free slot"""
+    ticket: object
+    issue_key: str
+    handler_type: Optional[str]
+    priority_rank: int
+    due: float
+    created: float
+    enqueued_at: float
+    searched: bool = True
+
+
+class DispatchQueue:
+    """Bounded queue of the tickets fetched that wait for a free slot
+
+    Every free slot goes to the most urgent ticket waiting, the order is
+    computed when a ticket is taken, so the aging of the priority follows the
+    time each ticket waited.
+
+    :param policy: order of the tickets
+    :type policy: DispatchPolicy
+    :param clock: clock of the waiting time, defaults to time.monotonic
+    :type clock: Callable[[], float]
+    :param on_drop: function called with each ticket dropped without being
+        taken, by the bound of the queue or by a search, out of the lock of
+        the queue, e.g. to release what the ticket holds
+    :type on_drop: Callable[[object], None]
+    """
+    def __init__(self, policy: DispatchPolicy = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_drop: Callable[[object], None] = None) -> None:
+        self.policy = policy or DispatchPolicy()
+        self.clock = clock
+        self.on_drop = on_drop
+        self.candidates: Dict[str, Candidate] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def __contains__(self, issue_key: str) -> bool:
+        return issue_key in self.candidates
+
+    def sort_key(self, candidate: Candidate, now: float) -> tuple:
+        """Returns the key of the candidate, lower is more urgent"""
+        policy = self.policy
+        values = []
+        for key in policy.order:
+            if key is DispatchKey.PRIORITY:
+                aging = (now - candidate.enqueued_at) / policy.aging_interval \
+                    if policy.aging_interval else 0
+                values.append(candidate.priority_rank - aging)
+            elif key is DispatchKey.SLA:
+                values.append(candidate.due)
+            elif key is DispatchKey.AGE:
+                values.append(candidate.created)
+            else:
+                values.append(policy.handler_rank(candidate.handler_type))
+        return tuple(values)
+
+    def _candidate(self, ticket: object, handler_type: Optional[str],
+                   enqueued_at: float, searched: bool = True) -> Candidate:
+        fields = ticket.fields
+        due = parse_timestamp(getattr(fields, self.policy.sla_field, None))
+        created = parse_timestamp(getattr(fields, 'created', None))
+        return Candidate(
+            ticket=ticket,
+            issue_key=ticket.key,
+            handler_type=handler_type,
+            priority_rank=self.policy.priority_rank(ticket),
+            due=math.inf if due is None else due,
+            created=math.inf if created is None else created,
+            enqueued_at=enqueued_at,
+            searched=searched,
+        )
+
+    def _trim(self, now: float) -> List[object]:
+        if len(self.candidates) <= self.policy.size:
+            return []
+        ordered = sorted(self.candidates.values(), key=lambda item: self.sort_key(item, now))
+        self.candidates = {item.issue_key: item for item in ordered[:self.policy.size]}
+        return [item.ticket for item in ordered[self.policy.size:]]
+
+    def _dropped(self, tickets: List[object]) -> None:
+        if self.on_drop:
+            for ticket in tickets:
+                self.on_drop(ticket)
+
+    def refresh(self, tickets: list, handlers: Mapping[str, str]) -> int:
+        """Replaces the tickets waiting by the result of a search
+
+        The tickets of a previous search that are not on the result anymore
+        were taken or solved elsewhere and are dropped, the ones still there
+        keep their waiting time. The tickets put by `add` are kept. The
+        tickets dropped are given to `on_drop`.
+
+        :param tickets: tickets of the search
+        :type tickets: list
+        :param handlers: handler class of each summary
+        :type handlers: Mapping[str, str]
+        :return: number of tickets waiting
+        """
+        now = self.clock()
+        with self.lock:
+            candidates = {key: item for key, item in self.candidates.items()
+                          if not item.searched}
+            for ticket in tickets:
+                previous = self.candidates.get(ticket.key)
+                candidates[ticket.key] = self._candidate(
+                    ticket, handlers.get(getattr(ticket.fields, 'summary', None)),
+                    previous.enqueued_at if previous else now)
+            dropped = [item.ticket for key, item in self.candidates.items()
+                       if key not in candidates]
+            self.candidates = candidates
+            dropped += self._trim(now)
+            waiting = len(self.candidates)
+        self._dropped(dropped)
+        return waiting
+
+    def add(self, ticket: object, handler_type: Optional[str]) -> None:
+        """Puts a ticket that was not found by the search, such as a ticket of the
+        webhook or of the journal waiting for a slot of its handler type"""
+        now = self.clock()
+        with self.lock:
+            previous = self.candidates.get(ticket.key)
+            self.candidates[ticket.key] = self._candidate(
+                ticket, handler_type, previous.enqueued_at if previous else now, searched=False)
+            dropped = self._trim(now)
+        self._dropped(dropped)
+
+    def pop(self, accept: Callable[[Candidate], bool] = None) -> Optional[object]:
+        """Removes and returns the most urgent ticket
+
+        :param accept: function that tells if a ticket can be taken now, the
+            tickets refused keep waiting, defaults to take any ticket
+        :type accept: Callable[[Candidate], bool]
+        :return: the ticket, None when there is no ticket to take
+        """
+        now = self.clock()
+        with self.lock:
+            candidates = [item for item in self.candidates.values() if not accept or accept(item)]
+            if not candidates:
+                return None
+            candidate = min(candidates, key=lambda item: self.sort_key(item, now))
+            del self.candidates[candidate.issue_key]
+            return candidate.ticket
+
+    def peek(self, count: int) -> List[object]:
+        """Returns the `count` most urgent tickets, without removing them"""
+        now = self.clock()
+        with self.lock:
+            ordered = sorted(self.candidates.values(), key=lambda item: self.sort_key(item, now))
+            return [item.ticket for item in ordered[:count]]
+
+    def waiting(self) -> Dict[Optional[str], int]:
+        """Returns the number of tickets waiting of each handler type"""
+        with self.lock:
+            return dict(Counter(item.handler_type for item in self.candidates.values()))
+
+    def configure(self, policy: DispatchPolicy) -> None:
+        """Changes the policy, used when the configuration is reloaded"""
+        with self.lock:
+            self.policy = policy
+            self.candidates = {
+                key: self._candidate(item.ticket, item.handler_type, item.enqueued_at,
+                                     item.searched)
+                for key, item in self.candidates.items()
+            }
+            dropped = self._trim(self.clock())
+        self._dropped(dropped)
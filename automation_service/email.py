@@ -2,21 +2,30 @@
 # from __future__ import absolute_import
 
 import smtplib
+import time
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 # import ssl
 
+from automation_service import metrics
+from automation_service import tracing
+from automation_service.resilience import CircuitBreaker
+
+
+SMTP_ERRORS = (smtplib.SMTPException, OSError)
+
 
 class EmailSender:
     """Class to send emails"""
 
     def __init__(self, port: int = 25, smtp_server: str = "",
-                 sender_email: str = ""):
+                 sender_email: str = "", breaker: CircuitBreaker = None):
         self.port = port
         self.smtp_server = smtp_server
         self.sender_email = sender_email
+        self.breaker = breaker
 
     def send_email(self, receiver_email: list, message: str):
         """Method to send the message using lg SMTP server
@@ -24,7 +33,23 @@ class EmailSender:
         :type receiver_email: list
         :param message: message that will be sent to receiver
         :type message: str
+        :raises CircuitBreakerOpen: when the breaker of the SMTP server is open
         """
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            with tracing.span('email.send', receivers=len(receiver_email)):
+                if self.breaker:
+                    self.breaker.call(self._send_email, receiver_email, message,
+                                      errors=SMTP_ERRORS)
+                else:
+                    self._send_email(receiver_email, message)
+            outcome = 'sent'
+        finally:
+            metrics.EMAIL_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+
+    def _send_email(self, receiver_email: list, message: str):
+        """Sends the message to the SMTP server"""
         # context = ssl.create_default_context() # SSL context
         with smtplib.SMTP(self.smtp_server, self.port) as server:
             # server.login(sender_email, password)
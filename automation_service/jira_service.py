@@ -1,24 +1,67 @@
 """Module to contain jira main service"""
+import functools
 import logging
+import re
 import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Dict, List, Optional
 
 import jira
 import requests
 
 from handlers import jira_handler
 from automation_service import config
+from automation_service import context
+from automation_service.coalesce import Coalescer, EntityKey
+from automation_service.config_store import ConfigSnapshot, ConfigStore
+from automation_service.dispatch import Candidate, DispatchPolicy, DispatchQueue
+from automation_service.ordering import KeySequencer
+from automation_service.pools import HandlerPools, parse_limits
+from automation_service.prefetch import AttachmentPrefetcher, download_attachment
 from automation_service import loader
+from automation_service import metrics
+from automation_service import rate_limiter
+from automation_service import resilience
+from automation_service import tracing
+from automation_service.journal import WorkJournal
+from automation_service.recorder import TrafficRecorder
+from automation_service.scheduler import PollScheduler
+from automation_service.snapshot import BASE_FIELDS, TicketSnapshot
+
+
+JIRA_ERRORS = (jira.exceptions.JIRAError, requests.exceptions.RequestException, ConnectionError)
+ISSUE_KEY = re.compile(r'^[A-Z][A-Z0-9_]*-\d+$')
+ORDER_BY = re.compile(r'\border\s+by\b.*$', re.IGNORECASE | re.DOTALL)
 
 
 @dataclass
 class JiraProcess:
     """Class to contain jira hanlders processes"""
     process: jira_handler.JiraHandler
-    ticket: jira.Issue
+    ticket: TicketSnapshot
     issue_key: str
     status: str = "running"
+    entity: EntityKey = None
+    order_key: object = None
+
+
+@dataclass
+class PendingBatch:
+    """Tickets routed to a batch handler on the current poll
+
+    :param handler: batch handler class
+    :type handler: type
+    :param uses_database: True if the batch holds a database connection of its pool
+    :type uses_database: bool
+    :param items: processes on the queue of the tickets, started together
+    :type items: list
+    """
+    handler: type
+    uses_database: bool
+    items: List[JiraProcess] = field(default_factory=list)
 
 
 class JiraService(threading.Thread):
@@ -34,14 +77,52 @@ class JiraService(threading.Thread):
     :type process_queue: list
     :param process_queue_size: process queue size
     :type process_queue_size: int
-    :param sleep_time: sleep time
+    :param sleep_time: max sleep time between two searches, reached while
+        the searches are empty
     :type sleep_time: int
+    :param min_sleep_time: sleep time between two searches while there is
+        work to dispatch, defaults to the sleep time
+    :type min_sleep_time: float
+    :param reconcile_interval: seconds between two searches when the tickets
+        are received by the webhook, None to rely only on the searches
+    :type reconcile_interval: float
+    :param journal: work journal used to resume/skip tickets after a restart
+    :type journal: WorkJournal
+    :param limiter: rate limiter shared by the service and the handlers
+    :type limiter: rate_limiter.RateLimiter
+    :param breakers: circuit breakers of the dependencies, defaults to the
+        registry resilience.BREAKERS
+    :type breakers: resilience.CircuitBreakers
+    :param recorder: recorder of the Jira exchanges, None to not record
+    :type recorder: TrafficRecorder
+    :param config_store: store of the configuration, the routing of the
+        tickets, the queue size and the sleep times follow its snapshots.
+        None to read config_handlers.json once on the start
+    :type config_store: ConfigStore
+    :param dispatch_policy: order of the tickets found waiting for a free
+        slot, defaults to the Jira priority, the due date and the age
+    :type dispatch_policy: DispatchPolicy
+    :param coalescer: shares the executions of the tickets of the same entity
+    :type coalescer: Coalescer
+    :param prefetcher: downloads ahead the attachments of the tickets waiting
+        for a slot, None to download them only when the handlers run
+    :type prefetcher: AttachmentPrefetcher
 
     :return: None
     """
     def __init__(self, logger: logging.Logger, jira_config: dict,
                  database_config: dict, PROCESS_QUEUE: list, mail_list_lookup_code: str,
-                 PROCESS_QUEUE_SIZE: int = 10, sleep_time: int = 60) -> None:
+                 PROCESS_QUEUE_SIZE: int = 10, sleep_time: int = 60,
+                 min_sleep_time: float = None,
+                 reconcile_interval: float = None,
+                 journal: WorkJournal = None,
+                 limiter: rate_limiter.RateLimiter = None,
+                 breakers: resilience.CircuitBreakers = None,
+                 recorder: TrafficRecorder = None,
+                 config_store: ConfigStore = None,
+                 dispatch_policy: DispatchPolicy = None,
+                 coalescer: Coalescer = None,
+                 prefetcher: AttachmentPrefetcher = None) -> None:
         threading.Thread.__init__(self)
         self.logger = logger
         self.daemon = True
@@ -52,6 +133,15 @@ class JiraService(threading.Thread):
         self.jira_config = jira_config
         self.sleep_time = sleep_time
         self.sleep = False
+        self.scheduler = PollScheduler(
+            min_interval=sleep_time if min_sleep_time is None else min_sleep_time,
+            max_interval=sleep_time if reconcile_interval is None else reconcile_interval
+        )
+        self.reconcile_interval = reconcile_interval
+        self.last_search = None
+        self.pending_issues: deque = deque()
+        self.pending_keys = set()
+        self.queue_lock = threading.RLock()
         self.database_config = database_config
         self.connection = None
 
@@ -59,51 +149,393 @@ class JiraService(threading.Thread):
         self.mail_list_lookup_code = mail_list_lookup_code
         self.handlers_holder: jira_handler.JiraHandlerData = None
 
+        self.journal = journal
+        self.pending_resume: list = self.journal.unfinished() if self.journal else []
+
+        self.limiter = limiter or rate_limiter.RateLimiter(logger=logger)
+        self.call_accounting = rate_limiter.CallAccounting()
+        self.breakers = breakers or resilience.BREAKERS
+        self.recorder = recorder
+        self.config_store = config_store
+        self.config_version = None
+        self.dispatch_queue = DispatchQueue(dispatch_policy, on_drop=self._abandon_order)
+        self.pools = HandlerPools()
+        self.batches: Dict[str, PendingBatch] = {}
+        self.coalescer = coalescer or Coalescer()
+        self.sequencer = KeySequencer()
+        self.prefetcher = prefetcher
+        if prefetcher and prefetcher.download is None:
+            prefetcher.download = self._download_attachment
+
     def run(self) -> None:
         """Start jira service"""
         self.logger.info("Jira service started")
+        if self.prefetcher:
+            self.prefetcher.start()
 
-        config_handler_file = config.get_config_handler_file('config_handlers.json')
-        self.handlers_holder: jira_handler.JiraHandlerData = \
-            jira_handler.JiraHandlerData({}, config_handler_file['handlers'])
-
-        loader.load_handlers(config_handler_file['plugins'], self.handlers_holder)
+        if self.config_store:
+            self.apply_config(self.config_store.snapshot())
+            self.config_store.subscribe(self.apply_config)
+        else:
+            config_handler_file = config.get_config_handler_file('config_handlers.json')
+            self.handlers_holder = self._load_handlers(config_handler_file['plugins'],
+                                                       config_handler_file['handlers'])
+            self.pools.configure(parse_limits(config_handler_file.get('limits', {})))
 
         self._service_loop()
 
+    @staticmethod
+    def _load_handlers(plugins: list, handlers: dict) -> jira_handler.JiraHandlerData:
+        """Returns a new holder with the routing and the handler classes of the plugins"""
+        handlers_holder = jira_handler.JiraHandlerData({}, dict(handlers))
+        loader.load_handlers(plugins, handlers_holder)
+        return handlers_holder
+
+    def apply_config(self, snapshot: ConfigSnapshot) -> None:
+        """Applies a snapshot of the configuration
+
+        The new routing, loaded by the store with the snapshot, is swapped in
+        at once, the tickets already on the queue keep running with their
+        handlers. When the queue shrinks no new ticket is dispatched until the
+        queue drains below the new size.
+
+        :param snapshot: snapshot of the configuration
+        :type snapshot: ConfigSnapshot
+        """
+        handlers_holder = snapshot.handlers_holder
+        if handlers_holder is None:
+            handlers_holder = self._load_handlers(snapshot.plugins, snapshot.handlers)
+
+        with self.queue_lock:
+            self.handlers_holder = handlers_holder
+            self.handlers_not_found = set()
+            self.process_queue_size = snapshot.process_queue_size
+            self.sleep_time = snapshot.sleep_time
+            self.scheduler.configure(
+                min_interval=snapshot.min_sleep_time,
+                max_interval=snapshot.sleep_time if self.reconcile_interval is None \
+                    else self.reconcile_interval
+            )
+            self.config_version = snapshot.version
+        self.dispatch_queue.configure(snapshot.dispatch_policy)
+        self.pools.configure(snapshot.limits)
+        self.logger.info("Configuration version %s applied", snapshot.version)
+        self.scheduler.wake()
+
     def stop(self) -> None:
         """Stop jira service"""
         self.logger.info("Stoping service...")
         self.alive = False
+        if self.prefetcher:
+            self.prefetcher.stop()
+        self.scheduler.wake()
 
     def _check_queue_size(self) -> None:
         """Check the queue size"""
-        if self.process_queue_size == self.process_queue.__len__():
+        if self.process_queue.__len__() >= self.process_queue_size:
             self.logger.info("Queue is full")
             return True
         return False
 
+    def _free_slots(self) -> int:
+        """Returns the number of free slots on the queue"""
+        return max(0, self.process_queue_size - self.process_queue.__len__())
+
+    def reap_processes(self) -> None:
+        """Removes the ended processes from the queue"""
+        with self.queue_lock:
+            for queue_item in list(self.process_queue):
+                if queue_item.status == "batched":
+                    continue
+                if queue_item.status == "finished" or not queue_item.process.is_alive():
+                    self.logger.info("Process %s ended", queue_item.issue_key)
+                    self.process_queue.remove(queue_item)
+
     def _service_loop(self) -> None:
         """Service loop"""
         while self.alive:
             self._loop_message()
-            self.set_jira_connection()
+            with metrics.POLL_DURATION.time(), tracing.span('service.poll'):
+                self._poll()
 
-            if not self.connection:
-                continue
+    def _poll(self) -> None:
+        """Dispatch the tickets received by the webhook or found by the search
 
-            if self._check_queue_size():
-                continue
+        The free slots go first to the tickets already fetched waiting on the
+        dispatch queue, the search is only made when slots are left and only
+        fetches the free slots plus the prefetch margin of the dispatch policy.
+        The tickets of the batch handlers gathered on the poll are started at
+        its end, one process of each handler type, and the attachments of the
+        most urgent tickets left waiting are prefetched.
+        """
+        self.set_jira_connection()
 
-            tickets = self.connection.search_issues(self.search_query)
-            if not tickets:
-                continue
+        if not self.connection:
+            self.scheduler.record_result(0, self._free_slots())
+            return
 
-            for ticket in tickets:
-                if self._check_queue_size():
-                    continue
+        self.reap_processes()
+        try:
+            self._dispatch()
+        finally:
+            self._start_batches()
+        self._prefetch()
+
+    def _dispatch(self) -> None:
+        """Dispatch the tickets of the journal, of the webhook and of the search
+        while there are free slots"""
+        self._resume_from_journal()
+        dispatched = self._dispatch_pending_issues()
+        if self._check_queue_size():
+            self.scheduler.record_result(0, 0)
+            return
+
+        dispatched += self._dispatch_candidates()
+        free_slots = self._free_slots()
+        if self._search_due() and free_slots:
+            tickets = self._search_tickets(self.dispatch_queue.policy.search_size(
+                free_slots, len(self.dispatch_queue)))
+            handlers_holder = self.handlers_holder
+            self.dispatch_queue.refresh(tickets, handlers_holder.handlers if handlers_holder else {})
+            metrics.TICKETS.inc(len(tickets), event='found')
+            dispatched += self._dispatch_candidates()
+            metrics.TICKETS.inc(sum(1 for ticket in tickets if ticket.key in self.dispatch_queue),
+                                event='unused')
+
+        metrics.TICKETS.inc(dispatched, event='dispatched')
+        self.scheduler.record_result(dispatched, self._free_slots())
+
+    def _prefetch(self) -> None:
+        """Schedules the prefetch of the attachments of the most urgent tickets
+        waiting for a slot, the attachments of the tickets that left the
+        dispatch queue without being dispatched here, e.g. taken by another
+        service, are evicted from the spool"""
+        if not self.prefetcher:
+            return
+        jobs = []
+        for ticket in self.dispatch_queue.peek(self.prefetcher.depth):
+            handler = self._get_handler(getattr(ticket.fields, 'summary', None))
+            attachment = self._handler_key(handler, 'ticket_attachment', ticket)
+            if attachment is not None:
+                jobs.append((ticket.key, attachment))
+        self.prefetcher.schedule(jobs)
+        evicted = self.prefetcher.spool.retain(
+            lambda issue_key: issue_key in self.dispatch_queue or self._in_flight(issue_key))
+        metrics.PREFETCH.inc(evicted, event='evicted')
+
+    def _download_attachment(self, attachment: object) -> Optional[bytes]:
+        """Downloads an attachment for the prefetcher, None when Jira is not available"""
+        connection = self.connection
+        if connection is None or not self.breakers.get(resilience.JIRA).available():
+            return None
+        return download_attachment(connection, attachment)
+
+    def collect_metrics(self) -> None:
+        """Updates the gauges of the queue and of the circuit breakers"""
+        metrics.QUEUE_OCCUPANCY.set(self.process_queue.__len__())
+        metrics.QUEUE_SIZE.set(self.process_queue_size)
+        metrics.DISPATCH_BACKLOG.set(len(self.dispatch_queue))
+        metrics.COALESCE_WAITING.set(self.coalescer.waiting())
+        metrics.ORDERING_WAITING.set(len(self.sequencer))
+        if self.prefetcher:
+            metrics.PREFETCH_SPOOL_BYTES.set(self.prefetcher.spool.size)
+        waiting = self.dispatch_queue.waiting()
+        for handler_type, pool in self.pools.utilisation().items():
+            metrics.POOL_RUNNING.set(pool['running'], handler=handler_type)
+            metrics.POOL_CONNECTIONS.set(pool['connections'], handler=handler_type)
+            metrics.POOL_WAITING.set(waiting.get(handler_type, 0), handler=handler_type)
+            if pool['max_running'] is not None:
+                metrics.POOL_LIMIT.set(pool['max_running'], handler=handler_type)
+        for name, state in self.breaker_states().items():
+            metrics.BREAKER_OPEN.set(int(state == resilience.BreakerState.OPEN.value),
+                                     dependency=name)
+
+    def _search_due(self) -> bool:
+        """Checks if the master query must be searched on this loop
+
+        Without the webhook every loop searches, with the webhook the search
+        is only a reconciliation made every `reconcile_interval` seconds to
+        catch the events that were missed.
+        """
+        if self.reconcile_interval is None or self.last_search is None:
+            return True
+        return time.monotonic() - self.last_search >= self.reconcile_interval
+
+    def _in_flight(self, issue_key: str) -> bool:
+        """Checks if the ticket is on the process queue"""
+        return any(queue_item.issue_key == issue_key for queue_item in self.process_queue)
+
+    def submit_issue(self, raw_issue: dict) -> bool:
+        """Receives an issue from the webhook to be dispatched by the service loop
+
+        :param raw_issue: issue as received on the webhook payload
+        :type raw_issue: dict
+        :return: True if the issue was accepted, False if it has no handler or
+            it is already queued, running or processed
+        """
+        issue_key = raw_issue.get('key')
+        summary = (raw_issue.get('fields') or {}).get('summary')
+        handlers_holder = self.handlers_holder
+        if not isinstance(issue_key, str) or not ISSUE_KEY.match(issue_key) or \
+                not handlers_holder or summary not in handlers_holder.handlers:
+            return False
+
+        with self.queue_lock:
+            if issue_key in self.pending_keys or self._in_flight(issue_key) or \
+                    (self.journal and self.journal.is_done(issue_key)):
+                return False
+            self.pending_issues.append(raw_issue)
+            self.pending_keys.add(issue_key)
+
+        self.logger.info("Ticket %s received by webhook", issue_key)
+        self.scheduler.wake()
+        return True
+
+    def _dispatch_pending_issues(self) -> int:
+        """Dispatch the issues received by the webhook while there are free slots
+
+        The issues of each free slot are confirmed with the master query
+        before they are dispatched, so an issue that does not match its
+        filters anymore, e.g. assigned to someone else, is ignored.
+
+        :return: number of tickets dispatched
+        """
+        dispatched = 0
+        while self.pending_issues and not self._check_queue_size():
+            with self.queue_lock:
+                raw_issues = [self.pending_issues.popleft() for _ in
+                              range(min(len(self.pending_issues), self._free_slots()))]
+            try:
+                tickets = self._confirm_issues([raw_issue['key'] for raw_issue in raw_issues])
+                for ticket in tickets:
+                    if self._create_process(ticket):
+                        dispatched += 1
+            finally:
+                with self.queue_lock:
+                    self.pending_keys.difference_update(
+                        raw_issue['key'] for raw_issue in raw_issues)
+        return dispatched
+
+    def _confirm_issues(self, issue_keys: List[str]) -> List[TicketSnapshot]:
+        """Returns the issues that match the master query, fetched by a search of
+        the master query restricted to their keys
+
+        The issues left out are taken again by the reconciliation search when
+        they match the master query later or the search fails.
+
+        :param issue_keys: keys of the issues received by the webhook
+        :type issue_keys: List[str]
+        :return: snapshots of the issues that match the master query
+        """
+        master_filter = ORDER_BY.sub('', self.search_query).strip()
+        jql = f'key in ({", ".join(issue_keys)})'
+        if master_filter:
+            jql = f'({master_filter}) AND {jql}'
+        tickets = self._search_tickets(len(issue_keys), jql)
+        confirmed = {ticket.key for ticket in tickets}
+        for issue_key in issue_keys:
+            if issue_key not in confirmed:
+                self.logger.info("Ticket %s does not match the master query, ignored", issue_key)
+        return tickets
+
+    def _dispatch_candidates(self) -> int:
+        """Dispatch the tickets found by the searches, the most urgent first, while
+        there are free slots, the others wait on the dispatch queue for the next loop
+
+        The tickets whose handler type has no free slot on its pool keep
+        waiting, so a slow handler type does not hold the others.
+
+        :return: number of tickets dispatched
+        """
+        dispatched = 0
+        while self.dispatch_queue and not self._check_queue_size():
+            ticket = self.dispatch_queue.pop(self._pool_available)
+            if ticket is None:
+                break
+            if self._create_process(ticket):
+                dispatched += 1
+            else:
+                metrics.TICKETS.inc(event='skipped')
+                self._abandon_order(ticket)
+        return dispatched
+
+    def _uses_database(self, handler: type) -> bool:
+        """Checks if the handler opens a database connection"""
+        return bool(self.database_config) and \
+            resilience.ORACLE in getattr(handler, 'dependencies', ())
+
+    def _pool_available(self, candidate: Candidate) -> bool:
+        """Checks if the pool of the handler type of the ticket has a free slot"""
+        handlers_holder = self.handlers_holder
+        handler = handlers_holder.handlers_classes.get(candidate.handler_type) \
+            if handlers_holder else None
+        return self.pools.available(candidate.handler_type, self._uses_database(handler))
+
+    def _search_tickets(self, max_results: int = 50, jql: str = None) -> list:
+        """Search the tickets of the master query with the retry policy of Jira
+
+        :param max_results: max number of tickets fetched, defaults to the page size of Jira
+        :type max_results: int
+        :param jql: query searched instead of the master query, it does not
+            count as a search of the master query
+        :type jql: str
+        :return: snapshots of the tickets, empty when Jira is not available
+        """
+        breaker = self.breakers.get(resilience.JIRA)
+        if not breaker.available():
+            self.logger.warning("Jira circuit breaker open, skipping search")
+            return []
+
+        if jql is None:
+            self.last_search = time.monotonic()
+        try:
+            result = breaker.retry_policy.call(
+                self.connection.search_issues, jql or self.search_query, maxResults=max_results,
+                fields=self._search_fields(), expand=self._search_expand(), json_result=True,
+                retry_on=JIRA_ERRORS)
+        except JIRA_ERRORS as error:
+            self.logger.error("Jira search error: %s", error)
+            self.connection = None
+            return []
+        return [self._snapshot(raw) for raw in result.get('issues', [])]
+
+    def _base_fields(self) -> tuple:
+        """Returns the fields of every ticket, used by the dispatch"""
+        return BASE_FIELDS + (self.dispatch_queue.policy.sla_field,)
+
+    def _search_fields(self) -> List[str]:
+        """Returns the fields fetched by the searches, the base fields and the
+        fields declared by the handler classes"""
+        fields = dict.fromkeys(self._base_fields())
+        handlers_holder = self.handlers_holder
+        for handler in handlers_holder.handlers_classes.values() if handlers_holder else ():
+            fields.update(dict.fromkeys(getattr(handler, 'ticket_fields', ())))
+        return list(fields)
+
+    def _search_expand(self) -> Optional[str]:
+        """Returns the expands fetched by the searches, declared by the handler
+        classes, None when no handler declares expands"""
+        expand = {}
+        handlers_holder = self.handlers_holder
+        for handler in handlers_holder.handlers_classes.values() if handlers_holder else ():
+            expand.update(dict.fromkeys(getattr(handler, 'ticket_expand', ())))
+        return ','.join(expand) or None
+
+    def _snapshot(self, raw_issue: dict) -> TicketSnapshot:
+        """Returns the snapshot of an issue of the JSON of Jira, with the base
+        fields and the fields and expands declared by its handler class"""
+        handlers_holder = self.handlers_holder
+        handler = None
+        if handlers_holder:
+            summary = (raw_issue.get('fields') or {}).get('summary')
+            handler = handlers_holder.handlers_classes.get(handlers_holder.handlers.get(summary))
+        return TicketSnapshot.from_raw(
+            raw_issue, self._base_fields() + tuple(getattr(handler, 'ticket_fields', ())),
+            getattr(handler, 'ticket_expand', ()))
 
-                self._create_process(ticket)
+    def breaker_states(self) -> dict:
+        """Returns the state of the circuit breakers of the dependencies"""
+        return self.breakers.states()
 
     def set_ticket_assignee(self, ticket: object, assignee: str) -> None:
         """Set ticket assignee
@@ -117,36 +549,428 @@ class JiraService(threading.Thread):
         :return: None
         """
         try:
-            ticket.update(fields={"assignee": {"name": assignee}})
+            self._issue(ticket).update(fields={"assignee": {"name": assignee}})
         except AttributeError:
             self.logger.error("Ticket assignee error")
             return
 
-    def _create_process(self, ticket: object) -> None:
+    def _issue(self, ticket: object) -> jira.Issue:
+        """Returns the Jira resource of the ticket, to call the methods of the resource"""
+        if not isinstance(ticket, TicketSnapshot):
+            return ticket
+        return jira.Issue(self.connection._options, # pylint: disable=protected-access
+                          self.connection._session, # pylint: disable=protected-access
+                          raw={'key': ticket.key, 'id': ticket.id, 'self': ticket.url})
+
+    def _resume_from_journal(self) -> None:
+        """Dispatch again the tickets left unfinished on the journal by a previous run.
+
+        Only the unfinished tickets are fetched by key, with the retry policy
+        of Jira, the steps already recorded on the journal are skipped by the
+        handlers. While Jira is not available the tickets are kept to be
+        resumed on the next loop, a ticket that does not exist anymore is
+        recorded as failed.
+        """
+        breaker = self.breakers.get(resilience.JIRA)
+        while self.pending_resume and not self._check_queue_size():
+            if not breaker.available():
+                self.logger.warning("Jira circuit breaker open, resume postponed")
+                return
+            issue_key, handler_type = self.pending_resume.pop(0)
+            try:
+                issue = breaker.retry_policy.call(
+                    self.connection.issue, issue_key, fields=','.join(self._search_fields()),
+                    expand=self._search_expand(), retry_on=JIRA_ERRORS)
+                ticket = self._snapshot(issue.raw)
+            except jira.exceptions.JIRAError as error:
+                if error.status_code != HTTPStatus.NOT_FOUND:
+                    self._postpone_resume(issue_key, handler_type, error)
+                    return
+                self.logger.error("Error resuming ticket %s: %s", issue_key, error)
+                self.journal.fail(issue_key, str(error))
+                continue
+            except JIRA_ERRORS as error:
+                self._postpone_resume(issue_key, handler_type, error)
+                return
+
+            self.logger.info("Resuming ticket %s from journal", issue_key)
+            self._create_process(ticket, resumed=True)
+
+    def _postpone_resume(self, issue_key: str, handler_type: str, error: Exception) -> None:
+        """Puts back the ticket that could not be fetched to be resumed on the next loop"""
+        self.logger.error("Jira error resuming ticket %s, resume postponed: %s",
+                          issue_key, error)
+        self.pending_resume.insert(0, (issue_key, handler_type))
+
+    def _create_process(self, ticket: object, resumed: bool = False) -> bool:
         """Create process
 
         :param ticket: ticket
         :type ticket: object
+        :param resumed: True if the ticket is being resumed from the journal
+        :type resumed: bool
 
-        :return: None
+        :return: True if the process was started
         """
+        if not resumed and self.journal and self.journal.is_done(ticket.key):
+            self.logger.info("Ticket %s already processed, skipping", ticket.key)
+            return False
+
+        if self._in_flight(ticket.key):
+            return False
+
         handler = self._get_handler(ticket.fields.summary)
         if not handler:
-            return
+            return False
+
+        if not self.breakers.available(getattr(handler, 'dependencies', ())):
+            self.logger.warning("Dependencies of %s not available, ticket %s postponed",
+                                handler.__name__, ticket.key)
+            return False
+
+        entity = self._entity_key(ticket, handler)
+        if entity and self.coalescer.outcome(entity) is None and \
+                self.coalescer.follow(entity, ticket):
+            self.logger.info("Ticket %s waits for the ticket running %s", ticket.key, entity)
+            return False
+
+        order_key = self._handler_key(handler, 'ordering_key', ticket)
+        if order_key is not None and not self.sequencer.acquire(order_key, ticket):
+            self.logger.info("Ticket %s waits for the ticket running %s", ticket.key, order_key)
+            return False
+        outcome = self.coalescer.outcome(entity) if entity else None
 
-        process: jira_handler.JiraHandler = handler(ticket, self.database_config,
-                                       self.logger, self.connection, self.mail_list_lookup_code)
+        batch = self._is_batch(handler) and outcome is None
+        uses_database = self._uses_database(handler) and outcome is None and \
+            not (batch and handler.__name__ in self.batches)
+        if not self.pools.acquire(handler.__name__, uses_database):
+            self.logger.info("Pool of %s full, ticket %s waiting", handler.__name__, ticket.key)
+            self.dispatch_queue.add(ticket, handler.__name__)
+            return False
 
-        self.set_ticket_assignee(ticket=ticket, assignee=self.jira_config['user'])
-        self.process_queue.append(JiraProcess(process, ticket, ticket.key))
+        with context.bind(issue_key=ticket.key, handler_type=handler.__name__), \
+                tracing.span('service.route', handler=handler.__name__, resumed=resumed):
+            if outcome is not None:
+                self.logger.info("Ticket %s gets the outcome of %s", ticket.key, entity)
+                metrics.TICKETS.inc(event='coalesced')
+                return self._start_process(ticket, handler, outcome)
+            if order_key is not None:
+                self.coalescer.forget(order_key)
+            if entity:
+                self.coalescer.lead(entity, ticket.key)
+            if batch:
+                return self._add_to_batch(ticket, handler, uses_database, entity)
+            return self._start_process(ticket, handler)
+
+    @staticmethod
+    def _handler_key(handler: type, name: str, ticket: object) -> object:
+        """Returns the key of the ticket defined by the method `name` of the handler
+        class, None when the handler does not define it"""
+        if not (isinstance(handler, type) and issubclass(handler, jira_handler.JiraHandler)):
+            return None
         try:
-            process.start()
-        except RuntimeError as error:
-            self.logger.error("Process error")
-            ticket.comment(f"Process error: {error}")
-            del self.process_queue[-1]
+            return getattr(handler, name)(ticket)
+        except AttributeError:
             return None
 
+    def _entity_key(self, ticket: object, handler: type) -> EntityKey:
+        """Returns the handler type and the entity key of the ticket, None when
+        the handler does not coalesce its tickets"""
+        entity_key = self._handler_key(handler, 'entity_key', ticket)
+        return None if entity_key is None else (handler.__name__, entity_key)
+
+    def _release_order(self, order_key: object) -> None:
+        """Ends the ticket holding the ordering key, the next ticket of the key is
+        put on the dispatch queue holding the key"""
+        if order_key is None:
+            return
+        ticket = self.sequencer.release(order_key)
+        if ticket is not None:
+            handlers_holder = self.handlers_holder
+            self.dispatch_queue.add(ticket, handlers_holder.handlers.get(
+                ticket.fields.summary) if handlers_holder else None)
+
+    def _abandon_order(self, ticket: object) -> None:
+        """Releases the ordering key held by a ticket that was not started and is
+        not waiting for a slot, e.g. skipped or dropped from the dispatch
+        queue, so the tickets of the key are not blocked"""
+        if ticket.key in self.dispatch_queue or self._in_flight(ticket.key):
+            return
+        self._release_order(self.sequencer.key_of(ticket.key))
+
+    def _complete_entity(self, entity: EntityKey, outcome: object = None,
+                         order_key: object = None) -> None:
+        """Ends the execution of the entity, the tickets that waited for it are
+        put back on the dispatch queue to get its outcome, or to run on their
+        own when it failed"""
+        for ticket in self.coalescer.complete(entity, outcome, order_key):
+            self.dispatch_queue.add(ticket, entity[0])
+
+    @staticmethod
+    def _is_batch(handler: type) -> bool:
+        """Checks if the handler processes many tickets on one run"""
+        return isinstance(handler, type) and issubclass(handler, jira_handler.BatchJiraHandler)
+
+    def _assign(self, ticket: object, handler: type) -> None:
+        """Records the dispatch of the ticket on the journal and assigns it to the service user"""
+        if self.journal:
+            self.journal.dispatch(ticket.key, handler.__name__)
+        if not (self.journal and self.journal.is_step_done(ticket.key, 'assign')):
+            with tracing.span('handler.assign'):
+                self.set_ticket_assignee(ticket=ticket, assignee=self.jira_config['user'])
+            if self.journal:
+                self.journal.step(ticket.key, 'assign')
+
+    def _add_to_batch(self, ticket: object, handler: type, uses_database: bool,
+                      entity: EntityKey = None) -> bool:
+        """Puts the ticket on the batch of its handler, the ticket takes its slot
+        on the queue at once and the batch is started at the end of the poll,
+        or when it reaches the `batch_size` of the handler
+
+        :param ticket: ticket
+        :type ticket: object
+        :param handler: batch handler class of the ticket
+        :type handler: type
+        :param uses_database: True if the ticket took the database connection of the batch
+        :type uses_database: bool
+        :param entity: entity key of the ticket, None when it is not coalesced
+        :type entity: EntityKey
+
+        :return: True if the ticket was batched, False if the batch failed to start
+        """
+        batch = self.batches.setdefault(handler.__name__, PendingBatch(handler, uses_database))
+        queue_item = JiraProcess(None, ticket, ticket.key, status="batched", entity=entity,
+                                 order_key=self._handler_key(handler, 'ordering_key', ticket))
+        self._assign(ticket, handler)
+        with self.queue_lock:
+            self.process_queue.append(queue_item)
+        batch.items.append(queue_item)
+
+        if len(batch.items) >= handler.batch_size:
+            return self._start_batch(handler.__name__)
+        return True
+
+    def _start_batches(self) -> None:
+        """Starts the batches gathered on the poll"""
+        for handler_type in list(self.batches):
+            with context.bind(handler_type=handler_type):
+                self._start_batch(handler_type)
+
+    def _start_batch(self, handler_type: str) -> bool:
+        """Instantiate the batch handler with the tickets of its batch and start the process
+
+        :param handler_type: name of the batch handler class
+        :type handler_type: str
+
+        :return: True if the process was started
+        """
+        batch = self.batches.pop(handler_type)
+        tickets = [queue_item.ticket for queue_item in batch.items]
+        process: jira_handler.BatchJiraHandler = batch.handler(
+            tickets, self.database_config, self.logger, self.connection,
+            self.mail_list_lookup_code)
+        process.journal = self.journal
+        process.run = self._supervised_batch_run(batch.items, handler_type,
+                                                 batch.uses_database, process.run)
+        self.logger.info("Batch of %s started with %s tickets", handler_type, len(tickets))
+
+        with self.queue_lock:
+            for queue_item in batch.items:
+                queue_item.process = process
+                queue_item.status = "running"
+            try:
+                process.start()
+            except RuntimeError as error:
+                self.logger.error("Process error")
+                for index, queue_item in enumerate(batch.items):
+                    self.connection.add_comment(queue_item.ticket, f"Process error: {error}")
+                    self.process_queue.remove(queue_item)
+                    self.pools.release(handler_type, batch.uses_database and index == 0)
+                    if queue_item.entity:
+                        self._complete_entity(queue_item.entity)
+                    self._release_order(queue_item.order_key)
+                    if self.journal:
+                        self.journal.fail(queue_item.issue_key, str(error))
+                return False
+        return True
+
+    def _start_process(self, ticket: object, handler: type, outcome: object = None) -> bool:
+        """Instantiate the handler of the ticket, assign the ticket and start the process
+
+        The slot of the pool of the handler type must be acquired, it is
+        released when the process ends or fails to start.
+
+        :param ticket: ticket
+        :type ticket: object
+        :param handler: handler class of the ticket
+        :type handler: type
+        :param outcome: outcome of another ticket of the same entity applied
+            instead of running the ticket, the handler does not connect to the
+            database
+        :type outcome: object
+
+        :return: True if the process was started
+        """
+        shared = outcome is not None
+        process: jira_handler.JiraHandler = handler(
+            ticket, None if shared else self.database_config, self.logger, self.connection,
+            self.mail_list_lookup_code)
+        process.journal = self.journal
+        process.spool = self.prefetcher.spool if self.prefetcher else None
+        if shared:
+            process.run = functools.partial(process.apply_outcome, outcome)
+        queue_item = JiraProcess(
+            process, ticket, ticket.key,
+            entity=None if shared else self._entity_key(ticket, handler),
+            order_key=self._handler_key(handler, 'ordering_key', ticket))
+        uses_database = not shared and self._uses_database(handler)
+        process.run = self._supervised_run(queue_item, handler.__name__, uses_database)
+
+        self._assign(ticket, handler)
+
+        with self.queue_lock:
+            self.process_queue.append(queue_item)
+            try:
+                process.start()
+            except RuntimeError as error:
+                self.logger.error("Process error")
+                self.connection.add_comment(ticket, f"Process error: {error}")
+                self.process_queue.remove(queue_item)
+                self.pools.release(handler.__name__, uses_database)
+                if queue_item.entity:
+                    self._complete_entity(queue_item.entity)
+                self._release_order(queue_item.order_key)
+                if self.journal:
+                    self.journal.fail(ticket.key, str(error))
+                return False
+        return True
+
+    def _supervised_run(self, queue_item: JiraProcess, handler_type: str = None,
+                        uses_database: bool = False) -> callable:
+        """Wraps the run method of the handler to record the end of the process
+
+        When the run ends the database connection of the handler is closed,
+        the slot of its pool is released, the process is marked as finished
+        and the service loop is woken, so the freed slot is used without
+        waiting the sleep time.
+
+        :param queue_item: process on the queue
+        :type queue_item: JiraProcess
+        :param handler_type: name of the handler class
+        :type handler_type: str
+        :param uses_database: True if the handler holds a database connection of its pool
+        :type uses_database: bool
+        :return: wrapped run method
+        """
+        run = queue_item.process.run
+        issue_key = queue_item.issue_key
+
+        def supervised_run() -> None:
+            with context.bind(issue_key=issue_key, handler_type=handler_type), \
+                    tracing.span('handler.run', handler=handler_type) as span:
+                start = time.perf_counter()
+                error = None
+                try:
+                    run()
+                except Exception as run_error: # pylint: disable=broad-except
+                    error = run_error
+                    if span:
+                        span.set(error=type(error).__name__)
+                    self.logger.exception("Process %s failed", issue_key)
+                finally:
+                    metrics.HANDLER_DURATION.observe(time.perf_counter() - start,
+                                                     handler=handler_type)
+                    self._close_database(queue_item.process)
+                    self._finish_ticket(queue_item, handler_type, uses_database, error)
+                    self.scheduler.wake()
+        return supervised_run
+
+    def _supervised_batch_run(self, queue_items: List[JiraProcess], handler_type: str,
+                              uses_database: bool, run: callable) -> callable:
+        """Wraps the run method of a batch handler to record the end of each ticket
+
+        The tickets recorded on `failed` by the handler, or all of them if the
+        run raises, are recorded as failed, the others as finished.
+
+        :param queue_items: processes on the queue of the tickets of the batch
+        :type queue_items: List[JiraProcess]
+        :param handler_type: name of the handler class
+        :type handler_type: str
+        :param uses_database: True if the batch holds a database connection of its pool
+        :type uses_database: bool
+        :param run: run method of the handler
+        :type run: callable
+        :return: wrapped run method
+        """
+        def supervised_run() -> None:
+            process = queue_items[0].process
+            with context.bind(handler_type=handler_type), \
+                    tracing.span('handler.run_batch', handler=handler_type,
+                                 size=len(queue_items)) as span:
+                start = time.perf_counter()
+                error = None
+                try:
+                    run()
+                except Exception as run_error: # pylint: disable=broad-except
+                    error = run_error
+                    if span:
+                        span.set(error=type(error).__name__)
+                    self.logger.exception("Batch of %s failed", handler_type)
+                finally:
+                    metrics.HANDLER_DURATION.observe(time.perf_counter() - start,
+                                                     handler=handler_type)
+                    self._close_database(process)
+                    for index, queue_item in enumerate(queue_items):
+                        with context.bind(issue_key=queue_item.issue_key):
+                            self._finish_ticket(
+                                queue_item, handler_type, uses_database and index == 0,
+                                error or process.failed.get(queue_item.issue_key))
+                    self.scheduler.wake()
+        return supervised_run
+
+    @staticmethod
+    def _close_database(process: jira_handler.JiraHandler) -> None:
+        """Closes the database connection of the handler"""
+        database = getattr(process, 'database', None)
+        if database is not None and database.connection is not None:
+            database.close_connection()
+
+    def _finish_ticket(self, queue_item: JiraProcess, handler_type: str,
+                       uses_database: bool, error: Exception = None) -> None:
+        """Records the outcome of the ticket, releases its slot of the pool, ends
+        the execution of its entity, hands its ordering key to the next ticket
+        and marks the process as finished
+
+        :param queue_item: process on the queue of the ticket
+        :type queue_item: JiraProcess
+        :param handler_type: name of the handler class
+        :type handler_type: str
+        :param uses_database: True if the ticket holds a database connection of its pool
+        :type uses_database: bool
+        :param error: error of the ticket, None when it succeeded
+        :type error: Exception
+        """
+        issue_key = queue_item.issue_key
+        if error is None:
+            metrics.HANDLER_OUTCOMES.inc(handler=handler_type, outcome='success')
+            if self.journal:
+                self.journal.finish(issue_key)
+        else:
+            metrics.HANDLER_OUTCOMES.inc(handler=handler_type, outcome='error')
+            if self.journal:
+                self.journal.fail(issue_key, str(error))
+        self.logger.info("Process %s made %s Jira calls", issue_key,
+                         self.call_accounting.pop_ticket(issue_key))
+        self.pools.release(handler_type, uses_database)
+        if queue_item.entity:
+            self._complete_entity(queue_item.entity, None if error else
+                                  queue_item.process.outcomes.get(issue_key),
+                                  queue_item.order_key)
+        self._release_order(queue_item.order_key)
+        if self.prefetcher:
+            self.prefetcher.spool.discard(issue_key)
+        queue_item.status = "finished"
+
     def _get_handler(self, handler_type: str) -> object:
         """Get handler
 
@@ -158,33 +982,49 @@ class JiraService(threading.Thread):
         if handler_type in self.handlers_not_found:
             return None
 
+        handlers_holder = self.handlers_holder
         try:
-            handler_class: str = self.handlers_holder.handlers[handler_type]
-            return self.handlers_holder.handlers_classes[handler_class]
+            handler_class: str = handlers_holder.handlers[handler_type]
+            return handlers_holder.handlers_classes[handler_class]
         except KeyError:
-            self.logger.error(f'Handler type "{handler_type}" not found')
+            self.logger.error('Handler type "%s" not found', handler_type)
             self.handlers_not_found.add(handler_type)
             return None
 
     def _loop_message(self) -> None:
         """Loop message"""
         if self.sleep:
-            time.sleep(self.sleep_time)
+            self.scheduler.wait()
         else:
             self.sleep = True
         self.logger.info("Jira service loop")
 
     def set_jira_connection(self) -> None:
-        """Sets self.connection as a new jira.JIRA instance"""
+        """Sets self.connection as a new jira.JIRA instance
+
+        The connection is kept between the loops, so the calls of the service
+        and of the handlers go through the same rate limited session.
+        """
+        if self.connection is not None:
+            return
+
+        breaker = self.breakers.get(resilience.JIRA)
         try:
-            self.connection: jira.JIRA = jira.JIRA(
+            self.connection: jira.JIRA = breaker.call(
+                jira.JIRA,
                 server=self.jira_config['server'],
                 basic_auth=(self.jira_config['user'], self.jira_config['password']),
                 max_retries=0, timeout=5,
+                errors=(*JIRA_ERRORS, AttributeError),
             )
-        except (ConnectionError, AttributeError, requests.exceptions.ConnectTimeout):
+            rate_limiter.mount(self.connection._session, self.limiter, # pylint: disable=protected-access
+                               self.call_accounting, breaker, self.recorder)
+        except resilience.CircuitBreakerOpen:
+            self.logger.warning("Jira circuit breaker open, connection postponed")
+            self.connection = None
+        except (ConnectionError, AttributeError, requests.exceptions.RequestException):
             self.logger.error("Jira connection error")
             self.connection = None
         except jira.exceptions.JIRAError as error:
-            self.logger.error("Jira error: %s", str(error))
+            self.logger.error("Jira error: %s", error)
             self.connection = None
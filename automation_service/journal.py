@@ -0,0 +1,179 @@
+"""Module to handle the local work journal used for crash recovery"""
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+from enum import Enum
+from typing import Dict, List, Set, Tuple
+
+from automation_service.config import checks_log_folder
+
+
+class JournalEvent(Enum):
+    """Enum with the events recorded on the journal"""
+    DISPATCHED = 'dispatched'
+    STEP = 'step'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+
+DEFAULT_MAX_FAILURES = 3
+
+
+class WorkJournal:
+    """Append-only journal of the work done on each ticket.
+
+    The journal is a SQLite database in WAL mode, every dispatch, step
+    completion and finish of a ticket is appended as a new row, so after a
+    crash the service knows which tickets were in flight and which steps
+    of those tickets were already applied on Jira.
+
+    Only a finished ticket is done. A ticket that failed, e.g. on a transient
+    error of Jira or Oracle, is processed again when it is found, skipping
+    the steps already applied, until it fails `max_failures` times.
+
+    :param journal_file: name of the journal file, defaults to 'journal.db'
+    :type journal_file: str, optional
+    :param journal_folder: folder where the journal file is, defaults to 'journal'
+    :type journal_folder: str, optional
+    :param logger: logger
+    :type logger: logging.Logger, optional
+    :param max_failures: failures after which the ticket is not processed again
+    :type max_failures: int, optional
+    """
+    def __init__(self, journal_file: str = 'journal.db', journal_folder: str = 'journal',
+                 logger: logging.Logger = logging.getLogger(__name__),
+                 max_failures: int = DEFAULT_MAX_FAILURES) -> None:
+        self.logger = logger
+        self.max_failures = max_failures
+        self.lock = threading.Lock()
+        if journal_file == ':memory:':
+            self.journal_path = journal_file
+        else:
+            checks_log_folder(journal_folder)
+            self.journal_path = pathlib.Path(journal_folder, journal_file).as_posix()
+
+        self.connection = sqlite3.connect(self.journal_path, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            """create table if not exists journal (
+                id         integer primary key autoincrement,
+                issue_key  text not null,
+                event      text not null,
+                detail     text,
+                created_at real not null)""")
+        self.connection.execute(
+            'create index if not exists journal_issue_key on journal (issue_key)')
+
+        self.finished: Set[str] = set()
+        self.in_flight: Dict[str, str] = {}
+        self.steps: Dict[str, Set[str]] = {}
+        self.failures: Dict[str, int] = {}
+        self._load_state()
+
+    def _load_state(self) -> None:
+        """Rebuild the in memory state from the journal rows"""
+        rows = self.connection.execute(
+            'select issue_key, event, detail from journal order by id')
+        for issue_key, event, detail in rows:
+            if event == JournalEvent.DISPATCHED.value:
+                self.finished.discard(issue_key)
+                self.in_flight[issue_key] = detail
+                self.steps.setdefault(issue_key, set())
+            elif event == JournalEvent.STEP.value:
+                self.steps.setdefault(issue_key, set()).add(detail)
+            elif event == JournalEvent.FINISHED.value:
+                self._finished(issue_key)
+            elif event == JournalEvent.FAILED.value:
+                self._failed(issue_key)
+
+        if self.in_flight:
+            self.logger.info("Journal has %s unfinished tickets", len(self.in_flight))
+
+    def _append(self, issue_key: str, event: JournalEvent, detail: str = None) -> None:
+        """Append a row on the journal
+
+        :param issue_key: key of the ticket
+        :type issue_key: str
+        :param event: event to be recorded
+        :type event: JournalEvent
+        :param detail: detail of the event, handler type or step name
+        :type detail: str, optional
+        """
+        self.connection.execute(
+            'insert into journal (issue_key, event, detail, created_at) values (?, ?, ?, ?)',
+            (issue_key, event.value, detail, time.time())
+        )
+
+    def dispatch(self, issue_key: str, handler_type: str) -> None:
+        """Records the dispatch of a ticket to a handler"""
+        with self.lock:
+            self._append(issue_key, JournalEvent.DISPATCHED, handler_type)
+            self.finished.discard(issue_key)
+            self.in_flight[issue_key] = handler_type
+            self.steps.setdefault(issue_key, set())
+
+    def step(self, issue_key: str, step: str) -> None:
+        """Records the completion of a step of a ticket"""
+        with self.lock:
+            self._append(issue_key, JournalEvent.STEP, step)
+            self.steps.setdefault(issue_key, set()).add(step)
+
+    def finish(self, issue_key: str) -> None:
+        """Records the end of the processing of a ticket"""
+        with self.lock:
+            self._append(issue_key, JournalEvent.FINISHED)
+            self._finished(issue_key)
+
+    def fail(self, issue_key: str, error: str = None) -> None:
+        """Records that the processing of a ticket ended with an error, the steps
+        applied are kept for the next attempt"""
+        with self.lock:
+            self._append(issue_key, JournalEvent.FAILED, error)
+            self._failed(issue_key)
+            if self.failures[issue_key] >= self.max_failures:
+                self.logger.warning("Ticket %s failed %s times, it is not processed again",
+                                    issue_key, self.failures[issue_key])
+
+    def _finished(self, issue_key: str) -> None:
+        self.finished.add(issue_key)
+        self.in_flight.pop(issue_key, None)
+        self.steps.pop(issue_key, None)
+        self.failures.pop(issue_key, None)
+
+    def _failed(self, issue_key: str) -> None:
+        self.in_flight.pop(issue_key, None)
+        self.failures[issue_key] = self.failures.get(issue_key, 0) + 1
+
+    def is_done(self, issue_key: str) -> bool:
+        """Checks if the ticket was already processed
+
+        :param issue_key: key of the ticket
+        :type issue_key: str
+        :return: True if the ticket is finished on the journal, or failed
+            `max_failures` times, False otherwise
+        :rtype: bool
+        """
+        return issue_key in self.finished or \
+            self.failures.get(issue_key, 0) >= self.max_failures
+
+    def is_step_done(self, issue_key: str, step: str) -> bool:
+        """Checks if a step of the ticket was already completed"""
+        return step in self.steps.get(issue_key, ())
+
+    def unfinished(self) -> List[Tuple[str, str]]:
+        """Returns the tickets dispatched but not finished
+
+        :return: list of tuples with the issue key and the handler type
+        :rtype: list
+        """
+        with self.lock:
+            return list(self.in_flight.items())
+
+    def close(self) -> None:
+        """Close the journal"""
+        with self.lock:
+            self.connection.close()
@@ -1,8 +1,17 @@
 from abc import ABC, ABCMeta, abstractmethod
 import importlib
+import importlib.util
+import os
+import sys
+import threading
+from typing import Dict, Optional, Tuple
 from handlers.jira_handler import JiraHandlerData
 
 
+MODULE_SIGNATURES: Dict[str, Tuple[int, int]] = {}
+RELOAD_LOCK = threading.Lock()
+
+
 class HandlerInterface(ABC, metaclass=ABCMeta):
     """Initialize the handler, class used only for typing purposes"""
 
@@ -17,8 +26,68 @@ def import_module(module_name: str) -> HandlerInterface:
     return importlib.import_module(module_name)
 
 
+def module_file(module_name: str) -> Optional[str]:
+    """Returns the source file of a module, None if it is not found"""
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.has_location:
+        return None
+    return spec.origin
+
+
+def file_signature(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Returns the modification time and size of a file, None if it is missing"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload_module(module_name: str) -> HandlerInterface:
+    """Executes the current source of a module on a new module object
+
+    The new module replaces the old one on sys.modules only when it runs
+    without errors, and the old module object is not changed, so the
+    handlers of the old version keep their globals while they finish.
+    """
+    importlib.invalidate_caches()
+    spec = importlib.util.find_spec(module_name)
+    module = importlib.util.module_from_spec(spec)
+    code = compile(spec.loader.get_source(module_name), spec.origin, 'exec')
+    exec(code, module.__dict__) # pylint: disable=exec-used
+
+    sys.modules[module_name] = module
+    parent, _, name = module_name.rpartition('.')
+    if parent in sys.modules:
+        setattr(sys.modules[parent], name, module)
+    return module
+
+
+def load_module(module_name: str) -> HandlerInterface:
+    """Imports a module, or reloads it when its source changed since it was loaded"""
+    with RELOAD_LOCK:
+        signature = file_signature(module_file(module_name))
+        loaded = MODULE_SIGNATURES.get(module_name)
+        if module_name in sys.modules and loaded is not None and signature != loaded:
+            module = reload_module(module_name)
+        else:
+            module = import_module(module_name)
+        MODULE_SIGNATURES[module_name] = signature
+        return module
+
+
 def load_handlers(handlers: list, handlers_holder: JiraHandlerData) -> None:
-    """Load handlers"""
+    """Load handlers
+
+    The plugins changed since the last load are reloaded, so a new holder
+    gets the new version of their handler classes while the holders already
+    built keep the old ones.
+    """
     for handler in handlers:
-        module: HandlerInterface = import_module(handler)
+        module: HandlerInterface = load_module(handler)
         module.initialize(handlers_holder)
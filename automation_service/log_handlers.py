@@ -0,0 +1,207 @@
+"""Module with the log handlers of the service: queue, rotation, compression and
+the formatters of the records with the context of the ticket"""
+import datetime
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import uuid
+from typing import Callable, List, Optional
+
+from automation_service import context
+
+
+COMPRESSED_SUFFIX = '.gz'
+CONTEXT_FIELDS = ('issue_key', 'handler_type')
+TEXT_FORMAT = '%(asctime)s - %(module)s.%(funcName)s:%(lineno)d - %(levelname)s - ' \
+    '%(context)s%(message)s'
+
+
+class LogCompressor:
+    """Background worker that gzips the rotated log files
+
+    The rotation only renames the file, so the thread that writes the logs
+    is not blocked by the compression.
+    """
+    def __init__(self) -> None:
+        self.files: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def submit(self, source: str, dest: str) -> None:
+        """Schedules the compression of `source` into `dest`"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._work, name='LogCompressor',
+                                               daemon=True)
+                self.thread.start()
+        self.files.put((source, dest))
+
+    def _work(self) -> None:
+        while True:
+            source, dest = self.files.get()
+            try:
+                compress_file(source, dest)
+            except OSError:
+                logging.getLogger(__name__).exception("Error compressing log %s", source)
+            finally:
+                self.files.task_done()
+
+    def join(self) -> None:
+        """Waits the pending compressions"""
+        self.files.join()
+
+
+COMPRESSOR = LogCompressor()
+
+
+def compress_file(source: str, dest: str) -> None:
+    """Gzips `source` into `dest`, removing `source`"""
+    with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+def compressed_namer(name: str) -> str:
+    """Name of the rotated files, with the suffix .gz"""
+    return name + COMPRESSED_SUFFIX
+
+
+def background_rotator(source: str, dest: str) -> None:
+    """Renames the log file and compresses it on the background
+
+    Each rotation renames the file to its own temporary name, so a rotation
+    does not overwrite the file of a previous one still pending.
+    """
+    pending = dest[:-len(COMPRESSED_SUFFIX)] if dest.endswith(COMPRESSED_SUFFIX) else dest
+    pending += f'.{uuid.uuid4().hex}.rotating'
+    os.replace(source, pending)
+    COMPRESSOR.submit(pending, dest)
+
+
+def set_compression(handler: logging.handlers.BaseRotatingHandler) -> None:
+    """Makes the handler compress the rotated files on the background"""
+    handler.namer = compressed_namer
+    handler.rotator = background_rotator
+
+
+def compressed_rollover(handler: logging.handlers.BaseRotatingHandler,
+                        rollover: Callable[[], None]) -> None:
+    """Runs the rollover of the handler after the pending compressions, so the
+    backups are not shifted or removed while they are still being written"""
+    if handler.rotator is background_rotator:
+        COMPRESSOR.join()
+    rollover()
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """File handler rotated by size, with the rotated files compressed"""
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0, # pylint: disable=invalid-name
+                 compress: bool = True, **kwargs) -> None:
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, **kwargs)
+        if compress:
+            set_compression(self)
+
+    def doRollover(self) -> None:
+        compressed_rollover(self, super().doRollover)
+
+
+class TimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """File handler rotated by time, with the rotated files compressed"""
+    def __init__(self, filename: str, when: str = 'midnight', backupCount: int = 0, # pylint: disable=invalid-name
+                 compress: bool = True, **kwargs) -> None:
+        super().__init__(filename, when=when, backupCount=backupCount, **kwargs)
+        if compress:
+            set_compression(self)
+
+    def doRollover(self) -> None:
+        compressed_rollover(self, super().doRollover)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that stamps the context of the ticket on the records
+
+    The issue key and the handler type bound on the thread that logs (see
+    automation_service.context) are copied to the record, which is queued
+    without being formatted, the message is only built by the listener.
+    Values informed with `extra` are kept.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        values = context.current()
+        for name in CONTEXT_FIELDS:
+            if not hasattr(record, name):
+                setattr(record, name, values.get(name))
+        return record
+
+
+class ContextFormatter(logging.Formatter):
+    """Text formatter that prefixes the message with the issue key of the record"""
+    def __init__(self, fmt: str = TEXT_FORMAT, **kwargs) -> None:
+        super().__init__(fmt, **kwargs)
+
+    def format(self, record: logging.LogRecord) -> str:
+        issue_key = getattr(record, 'issue_key', None)
+        record.context = '[%s]: ' % issue_key if issue_key else ''
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter that writes each record as a JSON line with its context"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueLogging:
+    """Queue handler attached to the logger and the listener that drains it
+
+    The threads that log only put the record on the queue, stamped with the
+    context of the ticket, the formatting and the handlers that write on the
+    console and on the file run on the thread of the listener.
+
+    :param handlers: handlers that write the records
+    :type handlers: list
+    """
+    def __init__(self, handlers: List[logging.Handler]) -> None:
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.handler = ContextQueueHandler(self.queue)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers,
+                                                       respect_handler_level=True)
+        self.listener.start()
+
+    @property
+    def handlers(self) -> List[logging.Handler]:
+        """Handlers drained by the listener"""
+        return list(self.listener.handlers)
+
+    def stop(self) -> None:
+        """Writes the records on the queue and stops the listener"""
+        if self.listener._thread: # pylint: disable=protected-access
+            self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        COMPRESSOR.join()
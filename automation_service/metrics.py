@@ -0,0 +1,349 @@
+"""Module to handle the metrics of the service exposed on the Prometheus text format"""
+import bisect
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value: str) -> str:
+    """Escape the value of a label as required by the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames: Sequence[str], labelvalues: Sequence[str],
+                  extra: Tuple[str, str] = None) -> str:
+    """Returns the labels formatted as {name="value",...}"""
+    pairs = [f'{name}="{escape_label_value(value)}"'
+             for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    """Returns the value formatted as required by the text format"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of the metrics
+
+    :param name: name of the metric
+    :type name: str
+    :param documentation: help of the metric
+    :type documentation: str
+    :param labelnames: names of the labels of the metric
+    :type labelnames: tuple
+    """
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'Metric {self.name} expects the labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """Returns the lines of the samples of the metric"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Returns the metric on the text format"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.metric_type}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Metric that only goes up"""
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Increments the counter of the labels informed"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Returns the value of the labels informed"""
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{format_labels(self.labelnames, key)} {format_value(value)}'
+                for key, value in items]
+
+
+class Gauge(Counter):
+    """Metric that goes up and down"""
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        """Sets the value of the labels informed"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """Metric that counts the observations on buckets
+
+    :param buckets: upper bounds of the buckets, defaults to DEFAULT_BUCKETS
+    :type buckets: tuple, optional
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        """Records an observation on the labels informed"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observes the time spent inside the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        """Returns the number of observations of the labels informed"""
+        with self.lock:
+            counts, _ = self.values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, (list(counts), total))
+                           for key, (counts, total) in self.values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, ('le', format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Registry of the metrics of the service"""
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a metric, returning the one already registered with the same name"""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Creates and registers a counter"""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Creates and registers a gauge"""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Creates and registers a histogram"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Returns every metric on the text format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+POLL_DURATION = REGISTRY.histogram(
+    'jira_automation_poll_duration_seconds', 'Duration of a loop of the service')
+TICKETS = REGISTRY.counter(
+    'jira_automation_tickets_total', 'Tickets found, dispatched, skipped, fetched unused and coalesced by the service',
+    ('event',))
+QUEUE_OCCUPANCY = REGISTRY.gauge(
+    'jira_automation_queue_occupancy', 'Processes running on the queue')
+QUEUE_SIZE = REGISTRY.gauge(
+    'jira_automation_queue_size', 'Size of the process queue')
+DISPATCH_BACKLOG = REGISTRY.gauge(
+    'jira_automation_dispatch_backlog', 'Tickets found waiting for a free slot')
+COALESCE_WAITING = REGISTRY.gauge(
+    'jira_automation_coalesce_waiting', 'Tickets waiting for a ticket of the same entity')
+ORDERING_WAITING = REGISTRY.gauge(
+    'jira_automation_ordering_waiting', 'Tickets waiting for a ticket of the same ordering key')
+PREFETCH = REGISTRY.counter(
+    'jira_automation_prefetch_total', 'Attachments spooled, taken, missed, skipped and '
+    'evicted by the prefetcher', ('event',))
+PREFETCH_SPOOL_BYTES = REGISTRY.gauge(
+    'jira_automation_prefetch_spool_bytes', 'Bytes of the attachments on the prefetch spool')
+CONTENT_CACHE = REGISTRY.counter(
+    'jira_automation_content_cache_total', 'Lookups that hit or missed the cache of the files '
+    'parsed, and files evicted', ('event',))
+POOL_RUNNING = REGISTRY.gauge(
+    'jira_automation_pool_running', 'Tickets running on the pool of each handler type',
+    ('handler',))
+POOL_LIMIT = REGISTRY.gauge(
+    'jira_automation_pool_limit', 'Max tickets running on the pool of each handler type',
+    ('handler',))
+POOL_CONNECTIONS = REGISTRY.gauge(
+    'jira_automation_pool_connections', 'Database connections of each handler type',
+    ('handler',))
+POOL_WAITING = REGISTRY.gauge(
+    'jira_automation_pool_waiting', 'Tickets waiting for the pool of each handler type',
+    ('handler',))
+HANDLER_DURATION = REGISTRY.histogram(
+    'jira_automation_handler_duration_seconds', 'Run time of the handlers', ('handler',))
+HANDLER_OUTCOMES = REGISTRY.counter(
+    'jira_automation_handler_outcomes_total', 'Outcomes of the handlers', ('handler', 'outcome'))
+JIRA_CALL_DURATION = REGISTRY.histogram(
+    'jira_automation_jira_call_duration_seconds', 'Latency of the Jira API calls',
+    ('method', 'endpoint'))
+JIRA_CALLS = REGISTRY.counter(
+    'jira_automation_jira_calls_total', 'Jira API calls by status code',
+    ('endpoint', 'status'))
+ORACLE_STATEMENT_DURATION = REGISTRY.histogram(
+    'jira_automation_oracle_statement_duration_seconds', 'Latency of the Oracle statements',
+    ('statement',))
+EMAIL_DURATION = REGISTRY.histogram(
+    'jira_automation_email_duration_seconds', 'Latency of the emails sent', ('outcome',))
+BREAKER_OPEN = REGISTRY.gauge(
+    'jira_automation_breaker_open', 'Circuit breakers open (1) or closed (0)', ('dependency',))
+CONFIG_RELOADS = REGISTRY.counter(
+    'jira_automation_config_reloads_total', 'Changes of the configuration files applied or '
+    'rejected', ('outcome',))
+
+
+ISSUE_KEY_PATTERN = re.compile(r'^([A-Z][A-Z0-9_]*-\d+|\d+)$')
+STATEMENT_PATTERNS = (
+    re.compile(r'^\s*(insert)\s+into\s+([\w.$#]+)', re.IGNORECASE),
+    re.compile(r'^\s*(update)\s+([\w.$#]+)', re.IGNORECASE),
+    re.compile(r'^\s*(delete)\s+(?:from\s+)?([\w.$#]+)', re.IGNORECASE),
+    re.compile(r'^\s*(select|merge)\b.*?\b(?:from|into)\s+([\w.$#]+)',
+               re.IGNORECASE | re.DOTALL),
+)
+
+
+def endpoint_label(path: str) -> str:
+    """Returns the path of a Jira call with the issue keys and ids replaced by {id}
+
+    :param path: path of the url called
+    :type path: str
+    :return: endpoint used as label
+    """
+    labels = []
+    for part in path.split('?')[0].split('/'):
+        if labels[-2:-1] == ['attachment'] and labels[-1] == '{id}':
+            part = '{filename}'
+        elif ISSUE_KEY_PATTERN.match(part) and labels[-1:] != ['api']:
+            part = '{id}'
+        labels.append(part)
+    return '/'.join(labels)
+
+
+def statement_label(statement: str) -> str:
+    """Returns the operation and the table of a statement, e.g. 'update tb_ocs_tlp'
+
+    :param statement: sql statement
+    :type statement: str
+    :return: statement used as label
+    """
+    for pattern in STATEMENT_PATTERNS:
+        match = pattern.match(statement)
+        if match:
+            return f'{match.group(1).lower()} {match.group(2).lower()}'
+    return ' '.join(statement.split()[:2]).lower()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of the registry"""
+    server: 'MetricsServer'
+
+    def do_GET(self) -> None: # pylint: disable=invalid-name
+        """Returns the metrics"""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        if self.server.collect:
+            self.server.collect()
+        content = self.server.registry.render().encode('UTF-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None: # pylint: disable=redefined-builtin
+        self.server.logger.debug(format, *args)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Embedded HTTP server that exposes the metrics on /metrics
+
+    :param host: host where the server listens
+    :type host: str
+    :param port: port where the server listens, 0 to use a free port
+    :type port: int
+    :param registry: registry of the metrics, defaults to REGISTRY
+    :type registry: Registry, optional
+    :param collect: callback called before every scrape, to update the gauges
+    :type collect: Callable, optional
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY,
+                 collect=None, logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        super().__init__((host, port), MetricsRequestHandler)
+        self.registry = registry
+        self.collect = collect
+        self.logger = logger
+        self.thread: threading.Thread = None
+
+    def start(self) -> None:
+        """Start the server on a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info("Metrics endpoint listening on %s:%s", *self.server_address[:2])
+
+    def stop(self) -> None:
+        """Stop the server"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,67 @@
+"""Module with the ordering of the tickets that change the same rows"""
+import threading
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+
+class KeySequencer:
+    """Runs the tickets of the same ordering key one at a time, in the order
+    they arrive, while the tickets of different keys run in parallel
+
+    The ordering key is defined by the handler class (see
+    JiraHandler.ordering_key), e.g. the row changed on the database. A key is
+    held by the ticket running it, the next tickets of the key wait on the
+    queue of the key and, when the ticket ends, the key is handed to the
+    first of them. Every operation is O(1).
+    """
+    def __init__(self) -> None:
+        self.owners: Dict[Hashable, str] = {}
+        self.held: Dict[str, Hashable] = {}
+        self.queues: Dict[Hashable, Deque[object]] = {}
+        self.waiting: Dict[str, Hashable] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.waiting)
+
+    def acquire(self, key: Hashable, ticket: object) -> bool:
+        """Takes the key for the ticket
+
+        :return: True if the ticket can run, False if it waits for the key
+        """
+        with self.lock:
+            owner = self.owners.get(key)
+            if owner is None or owner == ticket.key:
+                self.owners[key] = ticket.key
+                self.held[ticket.key] = key
+                return True
+            if ticket.key not in self.waiting:
+                self.waiting[ticket.key] = key
+                self.queues.setdefault(key, deque()).append(ticket)
+            return False
+
+    def release(self, key: Hashable) -> Optional[object]:
+        """Ends the ticket holding the key
+
+        :return: next ticket of the key, which now holds it, None when no
+            ticket is waiting
+        """
+        with self.lock:
+            owner = self.owners.pop(key, None)
+            self.held.pop(owner, None)
+            queue = self.queues.get(key)
+            if not queue:
+                self.queues.pop(key, None)
+                return None
+            ticket = queue.popleft()
+            if not queue:
+                del self.queues[key]
+            del self.waiting[ticket.key]
+            self.owners[key] = ticket.key
+            self.held[ticket.key] = key
+            return ticket
+
+    def key_of(self, issue_key: str) -> Optional[Hashable]:
+        """Returns the key held by the ticket, None if it holds no key"""
+        with self.lock:
+            return self.held.get(issue_key)
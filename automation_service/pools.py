@@ -0,0 +1,132 @@
+"""Module with the pools of slots of each handler type, inside the overall cap of the
+process queue"""
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class HandlerLimit:
+    """Limits of a handler type, None for no limit besides the process queue
+
+    :param max_running: max tickets of the type running at once
+    :type max_running: int
+    :param max_connections: max database connections open by the type at once
+    :type max_connections: int
+    """
+    max_running: Optional[int] = None
+    max_connections: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, int]) -> 'HandlerLimit':
+        """Returns the limit of an entry of `limits` on config_handlers.json
+
+        :raises ValueError: if a limit is not a positive integer
+        """
+        unknown = set(data) - {'max_running', 'max_connections'}
+        if unknown:
+            raise ValueError(f'Unknown limits: {", ".join(sorted(unknown))}')
+        for name, value in data.items():
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError(f'{name} must be a positive integer')
+        return cls(**data)
+
+
+def parse_limits(data: Mapping[str, Mapping[str, int]]) -> Dict[str, HandlerLimit]:
+    """Returns the limits of each handler class of `limits` on config_handlers.json
+
+    :raises ValueError: if the limits are invalid
+    """
+    if not isinstance(data, dict) or not all(isinstance(value, dict) for value in data.values()):
+        raise ValueError('"limits" must map the handler classes to their limits')
+    return {handler_type: HandlerLimit.from_dict(limit) for handler_type, limit in data.items()}
+
+
+@dataclass
+class HandlerPool:
+    """Slots and database connections in use by a handler type"""
+    handler_type: str
+    limit: HandlerLimit = field(default_factory=HandlerLimit)
+    running: int = 0
+    connections: int = 0
+
+    def available(self, uses_database: bool = True) -> bool:
+        """Checks if a ticket of the type can start"""
+        if self.limit.max_running is not None and self.running >= self.limit.max_running:
+            return False
+        if uses_database and self.limit.max_connections is not None and \
+                self.connections >= self.limit.max_connections:
+            return False
+        return True
+
+
+class HandlerPools:
+    """Pools of the handler types
+
+    Each handler type informed on `limits` has its own slots and database
+    connections, so a slow type can not take the slots of the others, while
+    the process queue remains the overall cap. The types without limits
+    share the process queue.
+
+    :param limits: limits of each handler class
+    :type limits: Mapping[str, HandlerLimit]
+    """
+    def __init__(self, limits: Mapping[str, HandlerLimit] = None) -> None:
+        self.pools: Dict[str, HandlerPool] = {}
+        self.lock = threading.Lock()
+        self.configure(limits or {})
+
+    def configure(self, limits: Mapping[str, HandlerLimit]) -> None:
+        """Changes the limits, the tickets running keep their slots"""
+        with self.lock:
+            for handler_type, pool in self.pools.items():
+                pool.limit = limits.get(handler_type, HandlerLimit())
+            for handler_type, limit in limits.items():
+                self._pool(handler_type).limit = limit
+
+    def _pool(self, handler_type: str) -> HandlerPool:
+        pool = self.pools.get(handler_type)
+        if pool is None:
+            pool = self.pools[handler_type] = HandlerPool(handler_type)
+        return pool
+
+    def available(self, handler_type: str, uses_database: bool = True) -> bool:
+        """Checks if a ticket of the handler type can start"""
+        with self.lock:
+            pool = self.pools.get(handler_type)
+            return pool is None or pool.available(uses_database)
+
+    def acquire(self, handler_type: str, uses_database: bool = True) -> bool:
+        """Takes a slot, and a database connection when the handler uses it
+
+        :return: False if the pool of the handler type is full
+        """
+        with self.lock:
+            pool = self._pool(handler_type)
+            if not pool.available(uses_database):
+                return False
+            pool.running += 1
+            if uses_database:
+                pool.connections += 1
+            return True
+
+    def release(self, handler_type: str, uses_database: bool = True) -> None:
+        """Gives back the slot and the database connection of a ticket"""
+        with self.lock:
+            pool = self._pool(handler_type)
+            pool.running = max(0, pool.running - 1)
+            if uses_database:
+                pool.connections = max(0, pool.connections - 1)
+
+    def utilisation(self) -> Dict[str, dict]:
+        """Returns the slots and connections in use and the limits of each pool"""
+        with self.lock:
+            return {
+                handler_type: {
+                    'running': pool.running,
+                    'max_running': pool.limit.max_running,
+                    'connections': pool.connections,
+                    'max_connections': pool.limit.max_connections,
+                }
+                for handler_type, pool in self.pools.items()
+            }
@@ -0,0 +1,240 @@
+"""Module with the speculative download of the attachments of the tickets waiting for a slot"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import jira
+
+from automation_service import context
+from automation_service import metrics
+from automation_service import tracing
+
+
+DEFAULT_PREFETCH_DEPTH = 2
+DEFAULT_SPOOL_BYTES = 50 * 1024 * 1024
+
+
+def download_attachment(jira_session: jira.JIRA, attachment: object) -> bytes:
+    """Downloads the content of an attachment of a ticket snapshot
+
+    The metadata comes with the ticket, so only the content is requested.
+
+    :param jira_session: jira session
+    :type jira_session: jira.JIRA
+    :param attachment: attachment of the ticket, with its `content` url
+    :type attachment: snapshot.FieldValues
+    :return: content of the attachment
+    """
+    return jira.resources.Attachment(
+        jira_session._options, # pylint: disable=protected-access
+        jira_session._session, # pylint: disable=protected-access
+        raw=attachment.raw).get()
+
+
+@dataclass
+class SpoolEntry:
+    """Attachment of a ticket kept on the spool"""
+    attachment_id: str
+    path: str
+    size: int
+
+
+class AttachmentSpool:
+    """Size capped spool on disk of the attachments downloaded ahead
+
+    Each ticket keeps at most one attachment, an attachment that does not fit
+    on the free bytes of the spool is not kept. The content is read back and
+    removed from the spool when its handler takes it.
+
+    :param max_bytes: max bytes of the attachments kept
+    :type max_bytes: int
+    :param directory: directory of the files, defaults to a new temporary directory
+    :type directory: str
+    """
+    def __init__(self, max_bytes: int = DEFAULT_SPOOL_BYTES, directory: str = None) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory or tempfile.mkdtemp(prefix='attachment_spool_')
+        self.entries: Dict[str, SpoolEntry] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, issue_key: str) -> bool:
+        with self.lock:
+            return issue_key in self.entries
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+    def free_bytes(self) -> int:
+        """Returns the bytes left on the spool"""
+        with self.lock:
+            return self.max_bytes - self.size
+
+    def put(self, issue_key: str, attachment_id: str, content: bytes) -> bool:
+        """Keeps the attachment of the ticket, replacing the one it had
+
+        :return: False if the attachment does not fit on the spool
+        """
+        with self.lock:
+            self._remove(issue_key)
+            if len(content) > self.max_bytes - self.size:
+                return False
+            path = os.path.join(self.directory, f'{issue_key}_{attachment_id}')
+            with open(path, 'wb') as file_object:
+                file_object.write(content)
+            self.entries[issue_key] = SpoolEntry(str(attachment_id), path, len(content))
+            self.size += len(content)
+            return True
+
+    def take(self, issue_key: str, attachment_id: str) -> Optional[bytes]:
+        """Removes and returns the attachment of the ticket
+
+        :return: the content, None if the attachment is not on the spool
+        """
+        with self.lock:
+            entry = self.entries.get(issue_key)
+            if entry is None or entry.attachment_id != str(attachment_id):
+                return None
+            try:
+                with open(entry.path, 'rb') as file_object:
+                    return file_object.read()
+            except OSError:
+                return None
+            finally:
+                self._remove(issue_key)
+
+    def discard(self, issue_key: str) -> bool:
+        """Removes the attachment of the ticket, False if it was not on the spool"""
+        with self.lock:
+            return self._remove(issue_key)
+
+    def retain(self, keep: Callable[[str], bool]) -> int:
+        """Removes the attachments of the tickets that are not kept, such as the
+        tickets taken by another service
+
+        :param keep: function that tells if the attachment of a ticket is kept
+        :type keep: Callable[[str], bool]
+        :return: number of attachments removed
+        """
+        with self.lock:
+            evicted = [issue_key for issue_key in self.entries if not keep(issue_key)]
+            for issue_key in evicted:
+                self._remove(issue_key)
+            return len(evicted)
+
+    def clear(self) -> None:
+        """Removes the attachments and the directory of the spool"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _remove(self, issue_key: str) -> bool:
+        entry = self.entries.pop(issue_key, None)
+        if entry is None:
+            return False
+        self.size -= entry.size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+        return True
+
+
+class AttachmentPrefetcher(threading.Thread):
+    """Downloads ahead the attachments of the tickets most likely to be
+    dispatched next, so their handlers find the content on the spool
+
+    The service schedules the most urgent tickets waiting for a slot on each
+    poll, the attachment of each one is defined by its handler class (see
+    JiraHandler.ticket_attachment). Only the tickets of the last schedule are
+    downloaded, one at a time, and an attachment larger than the free bytes
+    of the spool, or with a size different of its metadata, is not kept.
+
+    :param spool: spool of the attachments
+    :type spool: AttachmentSpool
+    :param logger: logger
+    :type logger: logging.Logger
+    :param depth: number of tickets waiting that are prefetched
+    :type depth: int
+    :param download: function that returns the content of an attachment, None
+        when it can not be downloaded now, defaults to the download of the
+        Jira connection of the service that uses the prefetcher
+    :type download: Callable[[object], Optional[bytes]]
+    """
+    def __init__(self, spool: AttachmentSpool, logger: logging.Logger,
+                 depth: int = DEFAULT_PREFETCH_DEPTH,
+                 download: Callable[[object], Optional[bytes]] = None) -> None:
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.spool = spool
+        self.download = download
+        self.logger = logger
+        self.depth = depth
+        self.pending: Dict[str, object] = OrderedDict()
+        self.alive = True
+        self.condition = threading.Condition()
+
+    def schedule(self, jobs: List[Tuple[str, object]]) -> None:
+        """Replaces the tickets waiting to be prefetched
+
+        :param jobs: key and attachment of the tickets, the most urgent first,
+            only the first `depth` are prefetched
+        :type jobs: List[Tuple[str, object]]
+        """
+        with self.condition:
+            self.pending = OrderedDict(
+                (issue_key, attachment) for issue_key, attachment in jobs[:self.depth]
+                if issue_key not in self.spool)
+            self.condition.notify()
+
+    def stop(self) -> None:
+        """Stops the prefetcher and clears the spool"""
+        with self.condition:
+            self.alive = False
+            self.pending.clear()
+            self.condition.notify()
+        self.spool.clear()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.alive and not self.pending:
+                    self.condition.wait()
+                if not self.alive:
+                    return
+                issue_key, attachment = self.pending.popitem(last=False)
+            self.prefetch(issue_key, attachment)
+
+    def prefetch(self, issue_key: str, attachment: object) -> bool:
+        """Downloads the attachment of the ticket to the spool
+
+        :return: True if the attachment was spooled
+        """
+        size = getattr(attachment, 'size', None)
+        if issue_key in self.spool or (size is not None and size > self.spool.free_bytes()):
+            metrics.PREFETCH.inc(event='skipped')
+            return False
+
+        with context.bind(issue_key=issue_key), \
+                tracing.span('prefetch.download', size=size):
+            try:
+                content = self.download(attachment)
+            except Exception as error: # pylint: disable=broad-except
+                self.logger.warning("Prefetch of the attachment of %s failed: %s",
+                                    issue_key, error)
+                content = None
+
+        if content is None or (size is not None and len(content) != size) or \
+                not self.spool.put(issue_key, attachment.id, content):
+            metrics.PREFETCH.inc(event='skipped')
+            return False
+        self.logger.debug("Attachment %s of %s prefetched", attachment.id, issue_key)
+        metrics.PREFETCH.inc(event='spooled')
+        return True
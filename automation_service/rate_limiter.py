@@ -0,0 +1,246 @@
+"""Module to handle the rate limit of the calls made to the Jira API"""
+import email.utils
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from automation_service import context
+from automation_service import metrics
+from automation_service import tracing
+from automation_service.recorder import TrafficRecorder
+from automation_service.resilience import CircuitBreaker, CircuitBreakerOpen
+
+
+SERVICE_CONTEXT = 'JiraService'
+
+
+class RateLimiter:
+    """Token bucket shared by every thread that calls the Jira API.
+
+    The rate is adapted to the responses observed, it is halved on every
+    HTTP 429 and when the latency is above the target, and grows back slowly
+    while the calls are fast, the Retry-After header of a 429 blocks every
+    caller until the time informed by Jira.
+
+    :param rate: max number of calls per second
+    :type rate: float
+    :param burst: size of the bucket
+    :type burst: int
+    :param min_rate: min number of calls per second, defaults to rate / 10
+    :type min_rate: float, optional
+    :param latency_target: latency in seconds above which the rate is reduced
+    :type latency_target: float, optional
+    """
+    def __init__(self, rate: float = 5, burst: int = 10, min_rate: float = None,
+                 latency_target: float = 2,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        self.logger = logger
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate else self.max_rate / 10
+        self.rate = self.max_rate
+        self.burst = max(int(burst), 1)
+        self.latency_target = latency_target
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Adds the tokens generated since the last refill"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self) -> float:
+        """Blocks until a call can be made
+
+        :return: time waited in seconds
+        :rtype: float
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self, latency: float) -> None:
+        """Adapts the rate to the latency of a successful call"""
+        with self.lock:
+            if latency > self.latency_target:
+                self.rate = max(self.min_rate, self.rate / 2)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        """Reduces the rate and blocks the callers after a HTTP 429
+
+        :param retry_after: seconds informed by Jira on the Retry-After header
+        :type retry_after: float, optional
+        """
+        with self.lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            wait = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+        self.logger.warning("Jira rate limit reached, waiting %.1fs, rate %.2f/s",
+                            wait, self.rate)
+
+
+class CallAccounting:
+    """Counts the Jira API calls per ticket and per handler type"""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.per_ticket: Counter = Counter()
+        self.per_handler_type: Counter = Counter()
+
+    def record(self, issue_key: str = None, handler_type: str = None) -> None:
+        """Records one call made on the context informed"""
+        with self.lock:
+            self.per_handler_type[handler_type or SERVICE_CONTEXT] += 1
+            if issue_key:
+                self.per_ticket[issue_key] += 1
+
+    def pop_ticket(self, issue_key: str) -> int:
+        """Returns the number of calls of a ticket and stops tracking it"""
+        with self.lock:
+            return self.per_ticket.pop(issue_key, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Returns a copy of the counters"""
+        with self.lock:
+            return {
+                'per_ticket': dict(self.per_ticket),
+                'per_handler_type': dict(self.per_handler_type),
+            }
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Parse the Retry-After header, seconds or http date
+
+    :param value: value of the header
+    :type value: str
+    :return: seconds to wait, None if the header is not valid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_date.timestamp() - time.time(), 0.0)
+
+
+class JiraHttpAdapter(HTTPAdapter):
+    """Transport adapter that applies the rate limiter to every Jira call
+
+    :param limiter: rate limiter shared by the service and the handlers
+    :type limiter: RateLimiter
+    :param accounting: counters of calls per ticket and handler type
+    :type accounting: CallAccounting
+    :param max_throttled_retries: times a call is retried after a 429
+    :type max_throttled_retries: int
+    :param breaker: circuit breaker of Jira, fed with the result of every call
+        and refusing the calls while open
+    :type breaker: CircuitBreaker
+    :param recorder: recorder of the exchanges, used to replay the traffic offline
+    :type recorder: TrafficRecorder
+    """
+    def __init__(self, limiter: RateLimiter, accounting: CallAccounting = None,
+                 max_throttled_retries: int = 3, breaker: CircuitBreaker = None,
+                 recorder: TrafficRecorder = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.accounting = accounting
+        self.max_throttled_retries = max_throttled_retries
+        self.breaker = breaker
+        self.recorder = recorder
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response: # pylint: disable=arguments-differ
+        if self.breaker and not self.breaker.allow():
+            raise requests.exceptions.ConnectionError(
+                str(CircuitBreakerOpen(self.breaker.name)), request=request)
+
+        attempt = 0
+        endpoint = metrics.endpoint_label(urlparse(request.url).path)
+        while True:
+            with tracing.span('jira.call', method=request.method, endpoint=endpoint,
+                              attempt=attempt) as span:
+                waited = self.limiter.acquire()
+                if span:
+                    span.set(rate_limit_wait=waited)
+                if self.accounting:
+                    self.accounting.record(context.get('issue_key'), context.get('handler_type'))
+
+                start = time.monotonic()
+                try:
+                    response = super().send(request, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    metrics.JIRA_CALLS.inc(endpoint=endpoint, status='error')
+                    if self.breaker:
+                        self.breaker.record_failure()
+                    raise
+                except BaseException:
+                    metrics.JIRA_CALLS.inc(endpoint=endpoint, status='error')
+                    if self.breaker:
+                        self.breaker.release()
+                    raise
+                latency = time.monotonic() - start
+                metrics.JIRA_CALL_DURATION.observe(latency, method=request.method,
+                                                   endpoint=endpoint)
+                metrics.JIRA_CALLS.inc(endpoint=endpoint, status=response.status_code)
+                if span:
+                    span.set(status=response.status_code)
+                if self.recorder:
+                    self.recorder.record(request, response, latency)
+
+                if response.status_code != 429:
+                    self.limiter.on_success(latency)
+                    if self.breaker:
+                        if response.status_code >= 500:
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+                    return response
+
+                if self.breaker:
+                    self.breaker.record_success()
+                self.limiter.on_throttled(parse_retry_after(response.headers.get('Retry-After')))
+                if attempt >= self.max_throttled_retries:
+                    return response
+                response.close()
+                attempt += 1
+
+
+def mount(session: requests.Session, limiter: RateLimiter,
+          accounting: CallAccounting = None, breaker: CircuitBreaker = None,
+          recorder: TrafficRecorder = None) -> requests.Session:
+    """Mount the rate limited adapter on a requests session
+
+    :param session: session of the jira.JIRA connection
+    :type session: requests.Session
+    :return: session
+    """
+    adapter = JiraHttpAdapter(limiter, accounting, breaker=breaker, recorder=recorder)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
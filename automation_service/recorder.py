@@ -0,0 +1,128 @@
+"""Module to record the exchanges of the service with the Jira REST API"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+
+BASE_URL_PLACEHOLDER = '{base_url}'
+SCRUBBED = '***'
+SENSITIVE_KEYS = ('password', 'token', 'apikey', 'api_key', 'os_password', 'secret')
+TEXT_CONTENT_TYPES = ('json', 'text', 'xml', 'javascript')
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+
+def is_sensitive(key: str) -> bool:
+    """Checks if the name of a field or parameter holds a credential"""
+    return any(sensitive in key.lower() for sensitive in SENSITIVE_KEYS)
+
+
+def scrub_json(value):
+    """Replaces the values of the sensitive keys of a JSON document"""
+    if isinstance(value, dict):
+        return {key: SCRUBBED if is_sensitive(key) else scrub_json(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub_json(item) for item in value]
+    return value
+
+
+class TrafficRecorder:
+    """Records the Jira exchanges as JSON lines, to be served back by benchmarks.replay
+
+    Only the path and the query of the requests are recorded, the base url
+    of the server is replaced by `{base_url}` on the response bodies, and
+    the credentials (headers, sensitive fields and the secrets informed) are
+    scrubbed.
+
+    :param record_file: path of the file
+    :type record_file: str
+    :param base_url: url of the Jira server
+    :type base_url: str
+    :param secrets: values replaced on the recorded content, e.g. user and password
+    :type secrets: Iterable[str]
+    """
+    def __init__(self, record_file: str, base_url: str, secrets: Iterable[str] = (),
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        folder = os.path.dirname(record_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.record_file = record_file
+        self.base_url = base_url.rstrip('/')
+        self.secrets: List[str] = sorted((secret for secret in secrets if secret),
+                                         key=len, reverse=True)
+        self.logger = logger
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def scrub(self, text: str) -> str:
+        """Replaces the base url and the secrets on a text"""
+        text = text.replace(self.base_url, BASE_URL_PLACEHOLDER)
+        for secret in self.secrets:
+            text = text.replace(secret, SCRUBBED)
+        return text
+
+    def _path(self, url: str) -> str:
+        parts = urlsplit(url)
+        query = [(key, SCRUBBED if is_sensitive(key) else value)
+                 for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+        return self.scrub(parts.path + (f'?{urlencode(query)}' if query else ''))
+
+    def _request_body(self, body) -> str:
+        if not body:
+            return None
+        if isinstance(body, bytes):
+            try:
+                body = body.decode('UTF-8')
+            except UnicodeDecodeError:
+                return None
+        try:
+            return self.scrub(json.dumps(scrub_json(json.loads(body))))
+        except ValueError:
+            return self.scrub(body)
+
+    def _response_body(self, response: requests.Response) -> dict:
+        content_type = response.headers.get('Content-Type', '')
+        if any(kind in content_type for kind in TEXT_CONTENT_TYPES):
+            text = response.content.decode(response.encoding or 'UTF-8', errors='replace')
+            try:
+                text = json.dumps(scrub_json(json.loads(text)))
+            except ValueError:
+                pass
+            return {'body': self.scrub(text)}
+        return {'body_base64': base64.b64encode(response.content).decode('ascii')}
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response,
+               latency: float) -> None:
+        """Appends an exchange to the file
+
+        :param request: request sent to Jira
+        :type request: requests.PreparedRequest
+        :param response: response of Jira
+        :type response: requests.Response
+        :param latency: seconds Jira took to answer
+        :type latency: float
+        """
+        exchange = {
+            'offset': round(time.monotonic() - self.started, 6),
+            'latency': round(latency, 6),
+            'method': request.method,
+            'path': self._path(request.url),
+            'request_body': self._request_body(request.body),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS
+                        if name in response.headers},
+        }
+        try:
+            exchange.update(self._response_body(response))
+            line = json.dumps(exchange) + '\n'
+            with self.lock, open(self.record_file, 'a', encoding='UTF-8') as record_file:
+                record_file.write(line)
+        except (OSError, requests.exceptions.RequestException) as error:
+            self.logger.error("Error recording Jira exchange: %s", error)
@@ -0,0 +1,239 @@
+"""Module to handle the retry policies and circuit breakers of the dependencies"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+
+JIRA = 'jira'
+ORACLE = 'oracle'
+SMTP = 'smtp'
+
+
+class BreakerState(Enum):
+    """Enum with the states of a circuit breaker"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreakerOpen(Exception):
+    """Raised when a call is made to a dependency with the breaker open"""
+    def __init__(self, name: str) -> None:
+        super().__init__(f'Circuit breaker "{name}" is open')
+        self.name = name
+
+
+@dataclass
+class RetryPolicy:
+    """Retry policy with exponential backoff and full jitter
+
+    :param max_attempts: max number of attempts, including the first one
+    :type max_attempts: int
+    :param base_delay: delay in seconds before the first retry
+    :type base_delay: float
+    :param max_delay: max delay in seconds between two attempts
+    :type max_delay: float
+    :param jitter: True to randomize the delay between zero and the backoff
+    :type jitter: bool
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30
+    jitter: bool = True
+
+    def delays(self) -> Iterator[float]:
+        """Returns the delays to wait before each retry"""
+        for attempt in range(self.max_attempts - 1):
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            yield random.uniform(0, delay) if self.jitter else delay
+
+    def call(self, function: Callable, *args,
+             retry_on: Tuple[type, ...] = (Exception,), **kwargs) -> Any:
+        """Calls the function retrying on the errors informed
+
+        :param function: function to be called
+        :type function: Callable
+        :param retry_on: errors that trigger a retry, defaults to (Exception,)
+        :type retry_on: tuple, optional
+        :return: return of the function
+        """
+        for delay in self.delays():
+            try:
+                return function(*args, **kwargs)
+            except retry_on:
+                time.sleep(delay)
+        return function(*args, **kwargs)
+
+
+class CircuitBreaker:
+    """Circuit breaker of a dependency
+
+    After `failure_threshold` consecutive failures the breaker opens and the
+    calls are refused without touching the dependency, after `reset_timeout`
+    seconds one call is let through (half open) and its result closes or
+    opens the breaker again.
+
+    :param name: name of the dependency
+    :type name: str
+    :param failure_threshold: consecutive failures that open the breaker
+    :type failure_threshold: int
+    :param reset_timeout: seconds before a trial call is allowed
+    :type reset_timeout: float
+    :param retry_policy: retry policy applied on the calls made by the breaker
+    :type retry_policy: RetryPolicy
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60,
+                 retry_policy: RetryPolicy = None,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        self.logger = logger
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self._state = BreakerState.CLOSED
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        """Current state of the breaker"""
+        with self.lock:
+            if self._state is BreakerState.OPEN and self._reset_timeout_elapsed():
+                return BreakerState.HALF_OPEN
+            return self._state
+
+    def _reset_timeout_elapsed(self) -> bool:
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def _set_state(self, state: BreakerState) -> None:
+        if state is not self._state:
+            self.logger.warning('Circuit breaker "%s" %s', self.name, state.value)
+        self._state = state
+
+    def available(self) -> bool:
+        """Checks if the dependency can be used, without reserving a trial call"""
+        return self.state is not BreakerState.OPEN
+
+    def allow(self) -> bool:
+        """Checks if a call can be made, reserving the trial call when half open"""
+        with self.lock:
+            if self._state is BreakerState.CLOSED:
+                return True
+            if self._state is BreakerState.OPEN and self._reset_timeout_elapsed():
+                self._set_state(BreakerState.HALF_OPEN)
+            if self._state is BreakerState.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Releases the trial call without recording a result"""
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self) -> None:
+        """Records a successful call"""
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+            self._set_state(BreakerState.CLOSED)
+
+    def record_failure(self) -> None:
+        """Records a failed call"""
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self._state is BreakerState.HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(BreakerState.OPEN)
+
+    def call(self, function: Callable, *args,
+             errors: Tuple[type, ...] = (Exception,), **kwargs) -> Any:
+        """Calls the function with the retry policy if the breaker allows it
+
+        :param function: function to be called
+        :type function: Callable
+        :param errors: errors counted as failures of the dependency
+        :type errors: tuple, optional
+        :raises CircuitBreakerOpen: when the breaker is open
+        :return: return of the function
+        """
+        if not self.allow():
+            raise CircuitBreakerOpen(self.name)
+        try:
+            result = self.retry_policy.call(function, *args, retry_on=errors, **kwargs)
+        except errors:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+
+class CircuitBreakers:
+    """Registry with the circuit breakers of the dependencies"""
+    def __init__(self) -> None:
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Returns the breaker of the dependency, creating it with the defaults"""
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name)
+            return self.breakers[name]
+
+    def configure(self, name: str, config: dict,
+                  logger: logging.Logger = logging.getLogger(__name__)) -> CircuitBreaker:
+        """Creates the breaker of a dependency using the options of its config section
+
+        :param name: name of the dependency
+        :type name: str
+        :param config: config section with the options retry_attempts,
+            retry_base_delay, retry_max_delay, breaker_threshold and
+            breaker_reset_timeout
+        :type config: dict
+        :return: circuit breaker
+        """
+        policy = RetryPolicy(
+            max_attempts=int(config.get('retry_attempts', 3)),
+            base_delay=float(config.get('retry_base_delay', 0.5)),
+            max_delay=float(config.get('retry_max_delay', 30)),
+        )
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=int(config.get('breaker_threshold', 5)),
+            reset_timeout=float(config.get('breaker_reset_timeout', 60)),
+            retry_policy=policy,
+            logger=logger,
+        )
+        with self.lock:
+            self.breakers[name] = breaker
+        return breaker
+
+    def available(self, names: Iterable[str]) -> bool:
+        """Checks if all the dependencies informed can be used"""
+        return all(self.get(name).available() for name in names)
+
+    def states(self) -> Dict[str, str]:
+        """Returns the state of every breaker"""
+        with self.lock:
+            breakers = list(self.breakers.values())
+        return {breaker.name: breaker.state.value for breaker in breakers}
+
+
+BREAKERS = CircuitBreakers()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Returns the breaker of a dependency from the registry of the service"""
+    return BREAKERS.get(name)
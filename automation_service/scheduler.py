@@ -0,0 +1,82 @@
+"""Module to handle the cadence of the polling of the service loop"""
+import random
+import threading
+
+
+class PollScheduler:
+    """Adaptive interval between two searches of the service loop
+
+    The interval goes to `min_interval` while the searches return work and
+    there are free slots on the queue, grows by `backoff` up to
+    `max_interval` while the searches are empty, and the wait is
+    interrupted by `wake` when a slot of the queue is freed.
+
+    :param min_interval: min seconds between two searches
+    :type min_interval: float
+    :param max_interval: max seconds between two searches
+    :type max_interval: float
+    :param backoff: factor applied on the interval after an empty search
+    :type backoff: float
+    :param jitter: fraction of the interval randomized, so many instances of
+        the service do not poll in lockstep
+    :type jitter: float
+    """
+    def __init__(self, min_interval: float = 1, max_interval: float = 60,
+                 backoff: float = 2, jitter: float = 0.1) -> None:
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.interval = self.min_interval
+        self.event = threading.Event()
+
+    def configure(self, min_interval: float, max_interval: float) -> None:
+        """Changes the bounds of the interval, used when the configuration is reloaded
+
+        :param min_interval: min seconds between two searches
+        :type min_interval: float
+        :param max_interval: max seconds between two searches
+        :type max_interval: float
+        """
+        self.max_interval = max_interval
+        self.min_interval = min(min_interval, max_interval)
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+
+    def record_result(self, dispatched: int, free_slots: int) -> float:
+        """Adapts the interval to the result of the last search
+
+        :param dispatched: number of tickets dispatched by the last search
+        :type dispatched: int
+        :param free_slots: free slots left on the queue
+        :type free_slots: int
+        :return: the new interval
+        :rtype: float
+        """
+        if free_slots <= 0:
+            self.interval = self.max_interval
+        elif dispatched:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.min_interval) *
+                                self.backoff)
+        return self.interval
+
+    def next_wait(self) -> float:
+        """Returns the interval with the jitter applied"""
+        if not self.jitter:
+            return self.interval
+        return max(0.0, self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def wait(self) -> bool:
+        """Waits the interval or until `wake` is called
+
+        :return: True if the wait was interrupted by `wake`
+        :rtype: bool
+        """
+        woken = self.event.wait(self.next_wait())
+        self.event.clear()
+        return woken
+
+    def wake(self) -> None:
+        """Interrupts the current wait, used when a slot of the queue is freed"""
+        self.event.set()
@@ -0,0 +1,119 @@
+"""Module with the compact snapshots of the tickets, parsed from the raw JSON of Jira"""
+from typing import Any, Dict, Iterable, Optional
+
+
+BASE_FIELDS = ('summary', 'priority', 'created')
+
+
+def wrap(value: Any) -> Any:
+    """Returns the JSON value with attribute access on its objects"""
+    if isinstance(value, dict):
+        return FieldValues(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+class FieldValues:
+    """Read only attribute access to a JSON object of Jira, e.g. `fields.priority.name`
+
+    The nested objects are wrapped when they are read, so the parse only keeps
+    the dict of the response.
+
+    :param values: JSON object
+    :type values: dict
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, values: Dict[str, Any]) -> None:
+        self._values = values
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return wrap(self._values[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return self._values
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._values = state
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, FieldValues) and self._values == other._values
+
+    def __repr__(self) -> str:
+        return f'FieldValues({self._values!r})'
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """JSON object of the values"""
+        return self._values
+
+
+class TicketSnapshot:
+    """Compact and picklable snapshot of a ticket with its key and the fields
+    needed by its handler, used instead of jira.Issue
+
+    The Jira methods that receive an issue also accept the snapshot, converted
+    to its key by `str`.
+
+    :param key: key of the ticket
+    :type key: str
+    :param ticket_id: id of the ticket
+    :type ticket_id: str
+    :param fields: JSON object with the fields of the ticket
+    :type fields: dict
+    :param url: url of the ticket on the REST API
+    :type url: str
+    :param expanded: JSON objects of the expands of the ticket, e.g. `changelog`
+    :type expanded: dict
+    """
+    __slots__ = ('key', 'id', 'fields', 'url', 'expanded')
+
+    def __init__(self, key: str, ticket_id: str = None, fields: Dict[str, Any] = None,
+                 url: str = None, expanded: Dict[str, Any] = None) -> None:
+        self.key = key
+        self.id = ticket_id # pylint: disable=invalid-name
+        self.fields = FieldValues(fields or {})
+        self.url = url
+        self.expanded = FieldValues(expanded or {})
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], field_names: Optional[Iterable[str]] = None,
+                 expand: Iterable[str] = ()) -> 'TicketSnapshot':
+        """Returns the snapshot of an issue of the JSON of Jira
+
+        :param raw: issue of a search, of the webhook or of the issue endpoint
+        :type raw: dict
+        :param field_names: fields kept, None to keep every field
+        :type field_names: Iterable[str]
+        :param expand: expands kept, the objects beside `fields` on the issue
+        :type expand: Iterable[str]
+        """
+        fields = raw.get('fields') or {}
+        if field_names is not None:
+            fields = {name: fields[name] for name in field_names if name in fields}
+        expanded = {name: raw[name] for name in expand if name in raw}
+        return cls(raw['key'], raw.get('id'), fields, raw.get('self'), expanded)
+
+    @property
+    def summary(self) -> Optional[str]:
+        """Summary of the ticket"""
+        return self.fields.raw.get('summary')
+
+    def __str__(self) -> str:
+        return self.key
+
+    def __repr__(self) -> str:
+        return f'TicketSnapshot({self.key!r})'
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TicketSnapshot) and \
+            (self.key, self.fields) == (other.key, other.fields)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
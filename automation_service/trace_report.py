@@ -0,0 +1,163 @@
+"""Report of the spans exported by the tracing of the service
+
+Usage::
+
+    python -m automation_service.trace_report traces/spans.jsonl
+    python -m automation_service.trace_report traces/spans.jsonl --issue TMS-123
+
+Without `--issue` the report shows, for each handler type, where the wall
+clock time of its tickets was spent. The time of each span is counted
+without the time of its child spans (self time), so the handler steps are
+run on a single thread and the self times of a ticket add up to its wall
+clock time, giving the breakdown of its critical path.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, TextIO
+
+
+ROOT_SPAN = 'handler.run'
+
+
+def load_spans(lines: Iterable[str]) -> List[dict]:
+    """Loads the spans of a JSON lines export, skipping the invalid lines
+
+    :param lines: lines of the file
+    :type lines: Iterable[str]
+    :return: list of spans
+    """
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
+
+
+def group_by_trace(spans: List[dict]) -> Dict[str, List[dict]]:
+    """Groups the spans by trace id (issue key), sorted by start"""
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span['trace_id']].append(span)
+    for trace in traces.values():
+        trace.sort(key=lambda span: span['start'])
+    return dict(traces)
+
+
+def self_times(spans: List[dict]) -> Dict[str, float]:
+    """Returns the self time of each span, the duration minus its children
+
+    :param spans: spans of a trace
+    :type spans: list
+    :return: dict with the span id and its self time
+    """
+    children = defaultdict(float)
+    for span in spans:
+        if span.get('parent_id'):
+            children[span['parent_id']] += span['duration']
+    return {span['span_id']: max(0.0, span['duration'] - children[span['span_id']])
+            for span in spans}
+
+
+def depths(spans: List[dict]) -> Dict[str, int]:
+    """Returns the depth of each span on the tree of its trace"""
+    by_id = {span['span_id']: span for span in spans}
+    result = {}
+
+    def depth(span: dict) -> int:
+        if span['span_id'] not in result:
+            parent = by_id.get(span.get('parent_id'))
+            result[span['span_id']] = depth(parent) + 1 if parent else 0
+        return result[span['span_id']]
+
+    for span in spans:
+        depth(span)
+    return result
+
+
+def timeline(spans: List[dict]) -> List[str]:
+    """Returns the lines of the timeline of a trace
+
+    :param spans: spans of a trace, sorted by start
+    :type spans: list
+    :return: lines with the offset, duration and name of each span
+    """
+    if not spans:
+        return []
+    origin = spans[0]['start']
+    span_depths = depths(spans)
+    lines = []
+    for span in spans:
+        attributes = ' '.join(f'{key}={value}' for key, value in span['attributes'].items())
+        lines.append(f"{span['start'] - origin:>9.3f}s {span['duration']:>9.3f}s "
+                     f"{'  ' * span_depths[span['span_id']]}{span['name']} {attributes}".rstrip())
+    return lines
+
+
+def breakdown(spans: List[dict]) -> Dict[str, Dict[str, float]]:
+    """Aggregates the self time of the spans of the tickets by handler type
+
+    The spans of a ticket are attributed to the handler of its `handler.run`
+    span, the routing made by the service before the run is included. A ticket
+    has many `handler.run` spans when it is run again or when a batch handler
+    opens its scope more than once, it is still counted as one ticket.
+
+    :param spans: every span exported
+    :type spans: list
+    :return: dict with the handler type and the seconds spent on each span name
+    """
+    result: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for trace in group_by_trace(spans).values():
+        handler = next((span['attributes'].get('handler') for span in trace
+                        if span['name'] == ROOT_SPAN), None)
+        if not handler:
+            continue
+        times = self_times(trace)
+        for span in trace:
+            result[handler][span['name']] += times[span['span_id']]
+        result[handler]['tickets'] += 1
+    return result
+
+
+def write_breakdown(spans: List[dict], output: TextIO) -> None:
+    """Writes the time spent by handler type and span name"""
+    for handler, times in sorted(breakdown(spans).items()):
+        tickets = int(times.pop('tickets'))
+        total = sum(times.values()) or 1.0
+        output.write(f'{handler} ({tickets} tickets, {total:.3f}s)\n')
+        for name, seconds in sorted(times.items(), key=lambda item: -item[1]):
+            output.write(f'  {name:<40} {seconds:>10.3f}s {seconds / total:>7.1%} '
+                         f'{seconds / tickets:>9.3f}s/ticket\n')
+
+
+def main(args: List[str] = None, output: TextIO = sys.stdout) -> None:
+    """Entry point of the report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace_file', help='JSON lines file exported by the tracing')
+    parser.add_argument('--issue', action='append',
+                        help='issue key to show the timeline, can be repeated')
+    parser.add_argument('--timelines', action='store_true',
+                        help='show the timeline of every ticket')
+    options = parser.parse_args(args)
+
+    with open(options.trace_file, encoding='UTF-8') as trace_file:
+        spans = load_spans(trace_file)
+
+    traces = group_by_trace(spans)
+    issues = options.issue or (sorted(key for key in traces if key != 'service')
+                               if options.timelines else [])
+    for issue in issues:
+        output.write(f'{issue}\n')
+        for line in timeline(traces.get(issue, [])):
+            output.write(f'{line}\n')
+        output.write('\n')
+
+    if not options.issue:
+        write_breakdown(spans, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Module to handle the tracing of the tickets with lightweight spans"""
+import functools
+import json
+import logging
+import os
+import pathlib
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from automation_service import context
+
+
+SERVICE_TRACE = 'service'
+
+
+class Span:
+    """Timed operation of a ticket or of the service loop
+
+    :param name: name of the operation, e.g. jira.call, oracle.statement
+    :type name: str
+    :param trace_id: issue key of the ticket, or 'service' for the loop
+    :type trace_id: str
+    :param parent_id: id of the enclosing span on the same thread
+    :type parent_id: str
+    :param attributes: attributes of the operation
+    :type attributes: dict
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration',
+                 'attributes', 'thread', '_started')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str],
+                 attributes: dict) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = 0.0
+        self.attributes = attributes
+        self.thread = threading.current_thread().name
+        self._started = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        """Adds attributes to the span"""
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        """Ends the span"""
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self) -> dict:
+        """Returns the span as a dict to be exported"""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'thread': self.thread,
+            'attributes': self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Exports the spans as JSON lines on a file
+
+    The lines are buffered and written when a root span ends or when the
+    buffer is full, so the threads pay only an append on a list per span.
+
+    :param trace_file: path of the file
+    :type trace_file: str
+    :param buffer_size: number of spans kept before writing to the file
+    :type buffer_size: int
+    """
+    def __init__(self, trace_file: str, buffer_size: int = 256) -> None:
+        folder = os.path.dirname(trace_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.trace_file = pathlib.Path(trace_file)
+        self.buffer_size = buffer_size
+        self.buffer: List[dict] = []
+        self.lock = threading.Lock()
+
+    def export(self, span: Span, root: bool = False) -> None:
+        """Adds a span to the buffer"""
+        with self.lock:
+            self.buffer.append(span.to_dict())
+            if root or len(self.buffer) >= self.buffer_size:
+                self._write()
+
+    def _write(self) -> None:
+        if not self.buffer:
+            return
+        lines = ''.join(json.dumps(item, default=str) + '\n' for item in self.buffer)
+        with open(self.trace_file, 'a', encoding='UTF-8') as trace_file:
+            trace_file.write(lines)
+        self.buffer = []
+
+    def flush(self) -> None:
+        """Writes the buffered spans"""
+        with self.lock:
+            self._write()
+
+
+class Tracer:
+    """Creates the spans and keeps the stack of open spans of each thread
+
+    Without an exporter the spans are not created, so tracing costs only a
+    check of an attribute when it is disabled.
+
+    :param exporter: exporter of the finished spans
+    :type exporter: JsonlExporter, optional
+    """
+    def __init__(self, exporter: JsonlExporter = None,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        self.exporter = exporter
+        self.logger = logger
+        self.local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        """True if the spans are being exported"""
+        return self.exporter is not None
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def current_span(self) -> Optional[Span]:
+        """Returns the innermost open span of the current thread"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Opens a span while inside the block
+
+        The trace id is the issue key bound on the context of the thread, or
+        the one informed on the attribute issue_key.
+
+        :param name: name of the operation
+        :type name: str
+        :return: context manager with the span, None when tracing is disabled
+        """
+        if not self.exporter:
+            yield None
+            return
+
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        trace_id = attributes.pop('issue_key', None) or context.get('issue_key') or \
+            (parent.trace_id if parent else SERVICE_TRACE)
+        new_span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        stack.append(new_span)
+        try:
+            yield new_span
+        except BaseException as error:
+            new_span.set(error=type(error).__name__)
+            raise
+        finally:
+            new_span.end()
+            stack.pop()
+            try:
+                self.exporter.export(new_span, root=parent is None)
+            except OSError as error:
+                self.logger.error("Error exporting span: %s", error)
+
+
+TRACER = Tracer()
+
+
+def configure(trace_file: str, logger: logging.Logger = logging.getLogger(__name__)) -> Tracer:
+    """Enables the export of the spans of the service to a JSON lines file
+
+    :param trace_file: path of the file, empty to disable the tracing
+    :type trace_file: str
+    :return: tracer of the service
+    """
+    TRACER.logger = logger
+    TRACER.exporter = JsonlExporter(trace_file) if trace_file else None
+    return TRACER
+
+
+def span(name: str, **attributes):
+    """Opens a span on the tracer of the service"""
+    return TRACER.span(name, **attributes)
+
+
+def traced(name: str = None) -> Callable:
+    """Decorator that opens a span around each call of the function
+
+    :param name: name of the span, defaults to the qualified name of the function
+    :type name: str, optional
+    """
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def func_wrapped(*args, **kwargs):
+            with TRACER.span(span_name):
+                return function(*args, **kwargs)
+        return func_wrapped
+    return decorator
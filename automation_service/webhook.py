@@ -0,0 +1,123 @@
+"""Module to receive the Jira webhooks of created/updated issues"""
+import hmac
+import ipaddress
+import json
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+
+WEBHOOK_EVENTS = ('jira:issue_created', 'jira:issue_updated')
+MAX_BODY_SIZE = 5 * 1024 * 1024
+DEFAULT_HOST = '127.0.0.1'
+
+
+def is_loopback(host: str) -> bool:
+    """Checks if the host only accepts connections of the local machine"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_binding(host: str, token: str) -> None:
+    """Checks that the endpoint is not exposed without a token
+
+    :raises ValueError: if the host is not a loopback address and there is no token
+    """
+    if not token and not is_loopback(host):
+        raise ValueError(f'The webhook on {host} requires webhook_token, '
+                         'or must listen on a loopback address')
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests sent by Jira to the webhook endpoint"""
+    server: 'WebhookServer'
+
+    def do_POST(self) -> None: # pylint: disable=invalid-name
+        """Receives a webhook event"""
+        if not self._check_token():
+            self._reply(HTTPStatus.FORBIDDEN)
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if not 0 < length <= MAX_BODY_SIZE:
+            self._reply(HTTPStatus.BAD_REQUEST)
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(HTTPStatus.BAD_REQUEST)
+            return
+
+        if not isinstance(payload, dict) or payload.get('webhookEvent') not in WEBHOOK_EVENTS \
+                or not isinstance(payload.get('issue'), dict):
+            self._reply(HTTPStatus.OK, {'accepted': False})
+            return
+
+        accepted = self.server.on_issue(payload['issue'])
+        self._reply(HTTPStatus.ACCEPTED if accepted else HTTPStatus.OK, {'accepted': accepted})
+
+    def _check_token(self) -> bool:
+        """Checks the token of the request, informed on the query string or header"""
+        if not self.server.token:
+            return True
+        query = parse_qs(urlparse(self.path).query)
+        token = self.headers.get('X-Webhook-Token') or query.get('token', [''])[0]
+        return hmac.compare_digest(token, self.server.token)
+
+    def _reply(self, status: HTTPStatus, body: dict = None) -> None:
+        content = json.dumps(body or {}).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None: # pylint: disable=redefined-builtin
+        self.server.logger.debug(format, *args)
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """Embedded HTTP server that feeds the Jira webhooks to the service
+
+    :param host: host where the server listens
+    :type host: str
+    :param port: port where the server listens, 0 to use a free port
+    :type port: int
+    :param on_issue: callback that receives the raw issue of the event and
+        returns True if the issue was accepted
+    :type on_issue: Callable
+    :param token: token expected on the query string `token` or on the
+        header X-Webhook-Token, defaults to no token, only allowed on a
+        loopback address
+    :type token: str, optional
+    :raises ValueError: if the host is not a loopback address and there is no token
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, on_issue: Callable[[dict], bool],
+                 token: str = '', logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        check_binding(host, token)
+        super().__init__((host, port), WebhookRequestHandler)
+        self.on_issue = on_issue
+        self.token = token
+        self.logger = logger
+        self.thread: threading.Thread = None
+
+    def start(self) -> None:
+        """Start the server on a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info("Webhook receiver listening on %s:%s", *self.server_address[:2])
+
+    def stop(self) -> None:
+        """Stop the server"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1 @@
+"""Benchmarks of the service, run against local stand-ins of Jira and Oracle"""
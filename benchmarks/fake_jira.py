@@ -0,0 +1,297 @@
+"""In-process stand-in of the Jira REST API used by the service and the handlers"""
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+API_PREFIX = '/rest/api/2/'
+RESOLVE_TRANSITION = '71'
+SERVER_INFO = {'version': '9.4.0', 'versionNumbers': [9, 4, 0], 'deploymentType': 'Server'}
+FIELDS = [{'id': 'summary', 'name': 'Summary', 'clauseNames': ['summary']}]
+KEY_QUERY_PATTERN = re.compile(r'^\s*key\s*=\s*([A-Z][A-Z0-9_]*-\d+)\s*$', re.IGNORECASE)
+
+
+@dataclass
+class FakeIssue:
+    """Issue of the backlog of the fake Jira
+
+    :param key: issue key
+    :type key: str
+    :param summary: summary used by the service to route the issue
+    :type summary: str
+    :param fields: other fields of the issue
+    :type fields: dict
+    :param attachment: content of the attachment of the issue, if any
+    :type attachment: bytes
+    :param attachment_name: file name of the attachment
+    :type attachment_name: str
+    """
+    key: str
+    summary: str
+    fields: dict = field(default_factory=dict)
+    attachment: Optional[bytes] = None
+    attachment_name: str = ''
+    created_at: float = field(default_factory=time.monotonic)
+    assigned_at: Optional[float] = None
+    resolved_at: Optional[float] = None
+    assignee: Optional[str] = None
+    transitions: List[str] = field(default_factory=list)
+    comments: List[str] = field(default_factory=list)
+
+
+class FakeJira:
+    """State of the fake Jira: the backlog and the calls received
+
+    The master search returns the issues not assigned and not resolved, an
+    issue is resolved by the transition `RESOLVE_TRANSITION`.
+
+    :param latency: seconds added to every response
+    :type latency: float
+    """
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.issues: Dict[str, FakeIssue] = {}
+        self.attachments: Dict[str, FakeIssue] = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.resolved = threading.Condition(self.lock)
+
+    def add_issue(self, issue: FakeIssue) -> None:
+        """Adds an issue to the backlog"""
+        with self.lock:
+            self.issues[issue.key] = issue
+            if issue.attachment is not None:
+                self.attachments[str(10000 + len(self.attachments))] = issue
+
+    def resolved_count(self) -> int:
+        """Returns the number of issues resolved"""
+        with self.lock:
+            return sum(1 for issue in self.issues.values() if issue.resolved_at)
+
+    def wait_resolved(self, count: int, timeout: float) -> bool:
+        """Waits until `count` issues are resolved
+
+        :return: True if the issues were resolved before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self.resolved:
+            while sum(1 for issue in self.issues.values() if issue.resolved_at) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.resolved.wait(remaining)
+        return True
+
+    def raw_issue(self, issue: FakeIssue, base_url: str) -> dict:
+        """Returns the issue as returned by the Jira API"""
+        fields = {'summary': issue.summary, 'assignee': None, **issue.fields}
+        if issue.assignee:
+            fields['assignee'] = {'name': issue.assignee}
+        fields['attachment'] = [
+            {'id': attachment_id, 'filename': issue.attachment_name,
+             'size': len(issue.attachment),
+             'content': f'{base_url}/secure/attachment/{attachment_id}/{issue.attachment_name}'}
+            for attachment_id, attached in self.attachments.items() if attached is issue
+        ]
+        return {'id': issue.key.split('-')[-1], 'key': issue.key,
+                'self': f'{base_url}{API_PREFIX}issue/{issue.key}', 'fields': fields}
+
+    def search(self, jql: str, start_at: int, max_results: int, base_url: str) -> dict:
+        """Returns a page of the issues of the query"""
+        with self.lock:
+            match = KEY_QUERY_PATTERN.match(jql)
+            if match:
+                issues = [self.issues[match.group(1)]] if match.group(1) in self.issues else []
+            else:
+                issues = [issue for issue in self.issues.values()
+                          if not issue.assignee and not issue.resolved_at]
+            page = issues[start_at:start_at + max_results]
+            return {'startAt': start_at, 'maxResults': max_results, 'total': len(issues),
+                    'issues': [self.raw_issue(issue, base_url) for issue in page]}
+
+    def assign(self, key: str, assignee: str) -> bool:
+        """Assigns an issue"""
+        with self.lock:
+            issue = self.issues.get(key)
+            if not issue:
+                return False
+            issue.assignee = assignee
+            issue.assigned_at = issue.assigned_at or time.monotonic()
+            return True
+
+    def transition(self, key: str, transition_id: str) -> bool:
+        """Applies a transition on an issue"""
+        with self.resolved:
+            issue = self.issues.get(key)
+            if not issue:
+                return False
+            issue.transitions.append(transition_id)
+            if transition_id == RESOLVE_TRANSITION and not issue.resolved_at:
+                issue.resolved_at = time.monotonic()
+                self.resolved.notify_all()
+            return True
+
+    def comment(self, key: str, body: str) -> Optional[int]:
+        """Adds a comment to an issue, returning its id"""
+        with self.lock:
+            issue = self.issues.get(key)
+            if not issue:
+                return None
+            issue.comments.append(body)
+            return len(issue.comments)
+
+
+class FakeJiraRequestHandler(BaseHTTPRequestHandler):
+    """Serves the endpoints of the Jira API called by the service and the handlers"""
+    server: 'FakeJiraServer'
+    protocol_version = 'HTTP/1.1'
+
+    def _route(self, method: str) -> None:
+        jira = self.server.jira
+        with jira.lock:
+            jira.calls += 1
+        if jira.latency:
+            time.sleep(jira.latency)
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+        base_url = self.server.url
+        path = url.path
+
+        if path.startswith('/secure/attachment/') and method == 'GET':
+            issue = jira.attachments.get(path.split('/')[3])
+            if issue is None:
+                self._reply(HTTPStatus.NOT_FOUND)
+            else:
+                self._reply(HTTPStatus.OK, issue.attachment, 'application/octet-stream')
+            return
+
+        if not path.startswith(API_PREFIX):
+            self._reply(HTTPStatus.NOT_FOUND)
+            return
+        parts = path[len(API_PREFIX):].strip('/').split('/')
+
+        if parts == ['serverInfo']:
+            self._reply(HTTPStatus.OK, {**SERVER_INFO, 'baseUrl': base_url})
+        elif parts == ['field']:
+            self._reply(HTTPStatus.OK, FIELDS)
+        elif parts == ['search']:
+            if method == 'POST':
+                query = {**query, **body}
+            self._reply(HTTPStatus.OK, jira.search(
+                query.get('jql', ''), int(query.get('startAt') or 0),
+                int(query.get('maxResults') or 50), base_url))
+        elif parts[0] == 'attachment' and len(parts) == 2:
+            issue = jira.attachments.get(parts[1])
+            if issue is None:
+                self._reply(HTTPStatus.NOT_FOUND)
+            else:
+                self._reply(HTTPStatus.OK, {
+                    'id': parts[1], 'filename': issue.attachment_name,
+                    'size': len(issue.attachment),
+                    'content': f'{base_url}/secure/attachment/{parts[1]}/'
+                               f'{issue.attachment_name}'})
+        elif parts[0] == 'issue' and len(parts) >= 2:
+            self._issue(method, parts[1], parts[2:], body, base_url)
+        else:
+            self._reply(HTTPStatus.NOT_FOUND)
+
+    def _issue(self, method: str, key: str, parts: List[str], body: dict,
+               base_url: str) -> None:
+        jira = self.server.jira
+        if key not in jira.issues:
+            self._reply(HTTPStatus.NOT_FOUND, {'errorMessages': ['Issue Does Not Exist']})
+        elif not parts and method == 'GET':
+            self._reply(HTTPStatus.OK, jira.raw_issue(jira.issues[key], base_url))
+        elif not parts and method == 'PUT':
+            assignee = ((body.get('fields') or {}).get('assignee') or {}).get('name')
+            if assignee:
+                jira.assign(key, assignee)
+            self._reply(HTTPStatus.NO_CONTENT)
+        elif parts == ['transitions'] and method == 'POST':
+            jira.transition(key, str(body['transition']['id']))
+            self._reply(HTTPStatus.NO_CONTENT)
+        elif parts == ['comment'] and method == 'POST':
+            comment_id = jira.comment(key, body.get('body', ''))
+            self._reply(HTTPStatus.CREATED, {
+                'id': str(comment_id), 'body': body.get('body', ''),
+                'self': f'{base_url}{API_PREFIX}issue/{key}/comment/{comment_id}'})
+        else:
+            self._reply(HTTPStatus.NOT_FOUND)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _reply(self, status: HTTPStatus, body=None,
+               content_type: str = 'application/json') -> None:
+        if body is None:
+            content = b''
+        elif isinstance(body, bytes):
+            content = body
+        else:
+            content = json.dumps(body).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None: # pylint: disable=invalid-name
+        """Handles the GET requests"""
+        self._route('GET')
+
+    def do_POST(self) -> None: # pylint: disable=invalid-name
+        """Handles the POST requests"""
+        self._route('POST')
+
+    def do_PUT(self) -> None: # pylint: disable=invalid-name
+        """Handles the PUT requests"""
+        self._route('PUT')
+
+    def log_message(self, format: str, *args) -> None: # pylint: disable=redefined-builtin
+        self.server.logger.debug(format, *args)
+
+
+class FakeJiraServer(ThreadingHTTPServer):
+    """HTTP server of the fake Jira, listening on a free local port
+
+    :param jira: state of the fake Jira
+    :type jira: FakeJira
+    """
+    daemon_threads = True
+
+    def __init__(self, jira: FakeJira, host: str = '127.0.0.1', port: int = 0,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        super().__init__((host, port), FakeJiraRequestHandler)
+        self.jira = jira
+        self.logger = logger
+        self.thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the server"""
+        return 'http://%s:%s' % self.server_address[:2]
+
+    def start(self) -> None:
+        """Start the server on a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the server"""
+        self.shutdown()
+        self.server_close()
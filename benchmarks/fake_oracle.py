@@ -0,0 +1,120 @@
+"""In-process stand-in of the Oracle database used by the handlers"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from automation_service import metrics
+
+
+class FakeOracle:
+    """Backend of the fake connections, replaces cx_Oracle.connect on the benchmarks
+
+    The table lge_code_lookup of the credit hold handler and the tlp of the
+    models of tb_ocs_tlp are kept in memory, the other statements only count
+    the rows affected.
+
+    :param latency: seconds added to every statement
+    :type latency: float
+    :param connect_latency: seconds added to every logon
+    :type connect_latency: float
+    """
+    def __init__(self, latency: float = 0.0, connect_latency: float = 0.0) -> None:
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.credit_hold: Dict[str, str] = {}
+        self.tlp: Dict[str, object] = {}
+        self.statements = 0
+        self.connections = 0
+        self.commits = 0
+        self.lock = threading.Lock()
+
+    def connect(self, *args, **kwargs) -> 'FakeConnection': # pylint: disable=unused-argument
+        """Opens a connection, same signature of cx_Oracle.connect"""
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        with self.lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+    def execute(self, statement: str, params: dict) -> List[tuple]:
+        """Executes a statement, returning the rows selected"""
+        if self.latency:
+            time.sleep(self.latency)
+        label = metrics.statement_label(statement)
+        with self.lock:
+            self.statements += 1
+            client_code = params.get('client_code')
+            if label == 'select lge_code_lookup':
+                enabled = self.credit_hold.get(client_code)
+                return [(enabled,)] if enabled else []
+            if label in ('insert lge_code_lookup', 'update lge_code_lookup'):
+                self.credit_hold[client_code] = params.get('enabled')
+            return self._execute_tlp(label, params)
+
+    def _execute_tlp(self, label: str, params: dict) -> List[tuple]:
+        model = params.get('model')
+        if label == 'select tb_ocs_tlp':
+            return [(value, self.tlp[value], 'LGBR', 'TMS', 'Y')
+                    for name, value in params.items()
+                    if name.startswith('model_') and value in self.tlp]
+        if label == 'insert tb_ocs_tlp':
+            self.tlp.setdefault(model, params.get('tlp'))
+        elif label == 'update tb_ocs_tlp' and model in self.tlp:
+            self.tlp[model] = params.get('tlp')
+        return []
+
+
+class FakeConnection:
+    """Connection of the fake database"""
+    def __init__(self, backend: FakeOracle) -> None:
+        self.backend = backend
+
+    def cursor(self) -> 'FakeCursor':
+        """Returns a new cursor"""
+        return FakeCursor(self.backend)
+
+    def commit(self) -> None:
+        """Commits the transaction"""
+        with self.backend.lock:
+            self.backend.commits += 1
+
+    def ping(self) -> None:
+        """Checks the connection"""
+
+    def close(self) -> None:
+        """Closes the connection"""
+
+
+class FakeCursor:
+    """Cursor of the fake database"""
+    def __init__(self, backend: FakeOracle) -> None:
+        self.backend = backend
+        self.rows: List[tuple] = []
+        self.description = [('ENABLED',)]
+
+    def execute(self, statement: str, params: dict = None, **kwargs) -> 'FakeCursor':
+        """Executes a statement"""
+        self.rows = self.backend.execute(statement, {**(params or {}), **kwargs})
+        return self
+
+    def executemany(self, statement: str, rows: list) -> None:
+        """Executes a statement for many rows"""
+        for row in rows:
+            self.backend.execute(statement, row if isinstance(row, dict) else {})
+
+    def fetchone(self) -> Optional[tuple]:
+        """Returns the next row"""
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size: int = 1) -> List[tuple]:
+        """Returns the next rows"""
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self) -> List[tuple]:
+        """Returns the remaining rows"""
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
@@ -0,0 +1,143 @@
+"""Benchmark of the time the logging calls take on the threads of the handlers
+
+Compares the handlers attached directly to the logger (``sync``), where each
+call writes on the console and on the file while holding their locks, with
+the queue handler drained by the background listener (``queue``), and the
+cost of a debug call on the queue logger set to INFO (``filtered``).
+
+Usage::
+
+    python -m benchmarks.logging_overhead --threads 1,10 --messages 10000 --output logging.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+import threading
+import time
+from typing import List
+
+from automation_service import context
+from automation_service import log_handlers
+from benchmarks.throughput import int_list, percentile
+
+
+MODES = ('sync', 'queue', 'filtered')
+
+
+def get_handlers(folder: str, console) -> List[logging.Handler]:
+    """Returns the console and file handlers of the service"""
+    formatter = log_handlers.ContextFormatter()
+    handlers = [logging.StreamHandler(console),
+                log_handlers.RotatingFileHandler(os.path.join(folder, 'benchmark.log'),
+                                                 maxBytes=10 * 1024 * 1024, backupCount=2)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def run_logging(mode: str, threads: int, messages: int, folder: str) -> dict:
+    """Logs `messages` records on each of `threads` threads
+
+    :param mode: 'sync', 'queue' or 'filtered'
+    :type mode: str
+    :param threads: number of threads logging at once
+    :type threads: int
+    :param messages: records logged by each thread
+    :type messages: int
+    :param folder: folder of the log file
+    :type folder: str
+    :return: latency of the calls and the time until every record is written
+    """
+    with open(os.devnull, 'w', encoding='UTF-8') as console:
+        handlers = get_handlers(folder, console)
+        logger = logging.Logger(f'benchmark_{mode}_{threads}', logging.DEBUG)
+        queue_logging = None
+        if mode == 'filtered':
+            logger.setLevel(logging.INFO)
+        if mode != 'sync':
+            queue_logging = log_handlers.QueueLogging(handlers)
+            logger.addHandler(queue_logging.handler)
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+
+        latencies: List[float] = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        log = logger.debug if mode == 'filtered' else logger.info
+
+        def work(worker: int) -> None:
+            thread_latencies = []
+            barrier.wait()
+            with context.bind(issue_key=f'BENCH-{worker}', handler_type='benchmark'):
+                for index in range(messages):
+                    start = time.perf_counter_ns()
+                    log("Step %s of the ticket", index)
+                    thread_latencies.append(time.perf_counter_ns() - start)
+            with lock:
+                latencies.extend(thread_latencies)
+
+        workers = [threading.Thread(target=work, args=(worker,)) for worker in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        calls_elapsed = time.perf_counter() - start
+        if queue_logging:
+            queue_logging.stop()
+        else:
+            for handler in handlers:
+                handler.close()
+        drained_elapsed = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'threads': threads,
+        'messages': threads * messages,
+        'call_mean_ns': int(sum(latencies) / len(latencies)) if latencies else 0,
+        'call_p50_ns': int(percentile(latencies, 0.5)),
+        'call_p99_ns': int(percentile(latencies, 0.99)),
+        'calls_seconds': round(calls_elapsed, 6),
+        'written_seconds': round(drained_elapsed, 6),
+    }
+
+
+def main(args: List[str] = None) -> dict:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int_list, default=[1, 10],
+                        help='comma separated numbers of threads logging at once')
+    parser.add_argument('--messages', type=int, default=10000,
+                        help='records logged by each thread')
+    parser.add_argument('--output', help='file where the JSON is written, defaults to stdout')
+    options = parser.parse_args(args)
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for threads in options.threads:
+            for mode in MODES:
+                results.append(run_logging(mode, threads, options.messages, folder))
+
+    report = {
+        'benchmark': 'logging_overhead',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'parameters': {key: value for key, value in vars(options).items() if key != 'output'},
+        'results': results,
+    }
+    content = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='UTF-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
+    return report
+
+
+if __name__ == '__main__':
+    main()
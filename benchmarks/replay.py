@@ -0,0 +1,334 @@
+"""Replay of the Jira exchanges recorded by automation_service.recorder
+
+The replay server answers each request with the next unserved exchange
+recorded for the same method, path and query, falling back to the same
+method and path when the query changed, and repeating the last exchange
+once they are all served. The recorded latencies are applied multiplied by
+the time scale.
+
+Usage::
+
+    python -m benchmarks.replay jira_traffic.jsonl --time-scale 0.5 \\
+        --handlers config/config_handlers.json --queue-size 10 --output replay.json
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+from automation_service import content_cache
+from automation_service import rate_limiter
+from automation_service import resilience
+from automation_service.recorder import BASE_URL_PLACEHOLDER
+from benchmarks.fake_jira import FIELDS, SERVER_INFO
+from benchmarks.fake_oracle import FakeOracle
+from benchmarks.throughput import DATABASE_CONFIG, JIRA_CONFIG, BenchmarkService, \
+    working_directory
+
+
+CONFIG_FOLDER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+ISSUE_PATH_PATTERN = re.compile(r'/issue/([A-Z][A-Z0-9_]*-\d+)')
+DEFAULT_EXCHANGES = {
+    '/rest/api/2/serverInfo': SERVER_INFO,
+    '/rest/api/2/field': FIELDS,
+}
+
+
+def load_exchanges(record_file: str) -> List[dict]:
+    """Loads the exchanges of a recording, skipping the invalid lines"""
+    exchanges = []
+    with open(record_file, encoding='UTF-8') as lines:
+        for line in lines:
+            try:
+                exchanges.append(json.loads(line))
+            except ValueError:
+                continue
+    return exchanges
+
+
+class ExchangeIndex:
+    """Index of the recorded exchanges, served in the recorded order
+
+    :param exchanges: exchanges of the recording
+    :type exchanges: list
+    """
+    def __init__(self, exchanges: List[dict]) -> None:
+        self.exchanges = exchanges
+        self.served = [False] * len(exchanges)
+        self.positions: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.indexes: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for index, exchange in enumerate(exchanges):
+            self.indexes[(exchange['method'], exchange['path'])].append(index)
+            self.indexes[(exchange['method'], exchange['path'].split('?')[0])].append(index)
+        self.replayed = 0
+        self.repeated = 0
+        self.unmatched = 0
+        self.issues = set()
+        self.lock = threading.Lock()
+
+    def _next(self, key: Tuple[str, str]) -> Optional[int]:
+        indexes = self.indexes.get(key, [])
+        position = self.positions[key]
+        while position < len(indexes) and self.served[indexes[position]]:
+            position += 1
+        self.positions[key] = position
+        return indexes[position] if position < len(indexes) else None
+
+    def match(self, method: str, path: str) -> Optional[dict]:
+        """Returns the exchange that answers the request, None if there is none"""
+        keys = ((method, path), (method, path.split('?')[0]))
+        with self.lock:
+            for key in keys:
+                index = self._next(key)
+                if index is not None:
+                    self.served[index] = True
+                    self.replayed += 1
+                    issue = ISSUE_PATH_PATTERN.search(path)
+                    if issue:
+                        self.issues.add(issue.group(1))
+                    return self.exchanges[index]
+            for key in keys:
+                if self.indexes.get(key):
+                    self.repeated += 1
+                    return self.exchanges[self.indexes[key][-1]]
+            if keys[1][1] not in DEFAULT_EXCHANGES:
+                self.unmatched += 1
+            return None
+
+    def pending(self) -> int:
+        """Returns the number of exchanges not served yet"""
+        with self.lock:
+            return self.served.count(False)
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    """Answers the requests with the recorded exchanges"""
+    server: 'ReplayServer'
+    protocol_version = 'HTTP/1.1'
+
+    def _replay(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        exchange = self.server.index.match(self.command, self.path)
+        if exchange is None:
+            default = DEFAULT_EXCHANGES.get(self.path.split('?')[0])
+            if default is None:
+                self._reply(HTTPStatus.NOT_FOUND, b'', {'Content-Type': 'application/json'})
+            else:
+                self._reply(HTTPStatus.OK, json.dumps(default).encode('UTF-8'),
+                            {'Content-Type': 'application/json'})
+            return
+
+        if self.server.time_scale:
+            time.sleep(exchange.get('latency', 0) * self.server.time_scale)
+        if 'body_base64' in exchange:
+            content = base64.b64decode(exchange['body_base64'])
+        else:
+            content = (exchange.get('body') or '').replace(
+                BASE_URL_PLACEHOLDER, self.server.url).encode('UTF-8')
+        self._reply(exchange['status'], content, exchange.get('headers', {}))
+
+    def _reply(self, status: int, content: bytes, headers: dict) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _replay
+
+    def log_message(self, format: str, *args) -> None: # pylint: disable=redefined-builtin
+        self.server.logger.debug(format, *args)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP server that serves back a recording of the Jira traffic
+
+    :param exchanges: exchanges of the recording
+    :type exchanges: list
+    :param time_scale: factor applied on the recorded latencies, 0 to answer at once
+    :type time_scale: float
+    """
+    daemon_threads = True
+
+    def __init__(self, exchanges: List[dict], time_scale: float = 1.0,
+                 host: str = '127.0.0.1', port: int = 0,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> None:
+        super().__init__((host, port), ReplayRequestHandler)
+        self.index = ExchangeIndex(exchanges)
+        self.time_scale = time_scale
+        self.logger = logger
+        self.thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the server"""
+        return 'http://%s:%s' % self.server_address[:2]
+
+    def start(self) -> None:
+        """Start the server on a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the server"""
+        self.shutdown()
+        self.server_close()
+
+
+@dataclass
+class ReplayResult:
+    """Result of a replay of a recording"""
+    exchanges: int
+    replayed: int
+    repeated: int
+    unmatched: int
+    pending: int
+    issues: int
+    elapsed_seconds: float
+    recorded_seconds: float
+    throughput: float
+
+
+def run_replay(exchanges: List[dict], plugins: List[str], handlers: Dict[str, str],
+               queue_size: int = 10, time_scale: float = 1.0, db_latency: float = 0.0,
+               idle_timeout: float = 5, timeout: float = 3600,
+               logger: logging.Logger = logging.getLogger(__name__)) -> ReplayResult:
+    """Runs the service against the replay server until the recording is served
+
+    The run ends when every exchange was served, when no exchange was served
+    for `idle_timeout` seconds or after `timeout` seconds.
+
+    :param exchanges: exchanges of the recording
+    :type exchanges: list
+    :param plugins: modules of the handlers
+    :type plugins: list
+    :param handlers: summaries of the tickets and their handler classes
+    :type handlers: dict
+    :param queue_size: size of the process queue
+    :type queue_size: int
+    :param time_scale: factor applied on the recorded latencies
+    :type time_scale: float
+    :param db_latency: seconds added to every database statement
+    :type db_latency: float
+    :return: result of the replay
+    """
+    server = ReplayServer(exchanges, time_scale, logger=logger)
+    server.start()
+    service = BenchmarkService(
+        logger, {**JIRA_CONFIG, 'server': server.url}, DATABASE_CONFIG, [], 'BENCH',
+        PROCESS_QUEUE_SIZE=queue_size, sleep_time=1, min_sleep_time=0,
+        limiter=rate_limiter.RateLimiter(rate=1000, burst=1000, logger=logger),
+        breakers=resilience.CircuitBreakers(),
+    )
+    service.plugins = plugins
+    service.handlers = handlers
+    oracle = FakeOracle(latency=db_latency)
+    # the files loaded by a previous run are not on the new database
+    content_cache.CACHE.clear()
+
+    try:
+        with tempfile.TemporaryDirectory() as folder, working_directory(folder), \
+                mock.patch('cx_Oracle.connect', oracle.connect):
+            start = last_progress = time.monotonic()
+            served = 0
+            service.start()
+            while server.index.pending() and time.monotonic() - start < timeout:
+                time.sleep(0.05)
+                if server.index.replayed != served:
+                    served, last_progress = server.index.replayed, time.monotonic()
+                elif time.monotonic() - last_progress >= idle_timeout:
+                    break
+            elapsed = time.monotonic() - start
+            service.stop()
+            service.join(timeout=5)
+            for queue_item in list(service.process_queue):
+                queue_item.process.join(timeout=5)
+    finally:
+        server.stop()
+
+    index = server.index
+    recorded = max((exchange.get('offset', 0) for exchange in exchanges), default=0)
+    return ReplayResult(
+        exchanges=len(exchanges),
+        replayed=index.replayed,
+        repeated=index.repeated,
+        unmatched=index.unmatched,
+        pending=index.pending(),
+        issues=len(index.issues),
+        elapsed_seconds=round(elapsed, 4),
+        recorded_seconds=round(recorded, 4),
+        throughput=round(len(index.issues) / elapsed, 4) if elapsed else 0.0,
+    )
+
+
+def default_handlers_file() -> str:
+    """Returns the config_handlers.json of the package, or its example when the
+    package was not configured"""
+    handlers_file = os.path.join(CONFIG_FOLDER, 'config_handlers.json')
+    if os.path.exists(handlers_file):
+        return handlers_file
+    return handlers_file + '.example'
+
+
+def main(args: List[str] = None) -> dict:
+    """Entry point of the replay"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('record_file', help='JSON lines file recorded by the service')
+    parser.add_argument('--handlers', default=default_handlers_file(),
+                        help='config_handlers.json with the plugins and handlers, defaults to '
+                             'config/config_handlers.json or, when it does not exist, to '
+                             'config/config_handlers.json.example')
+    parser.add_argument('--queue-size', type=int, default=10, help='size of the process queue')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='factor applied on the recorded latencies, 0 to not wait')
+    parser.add_argument('--db-latency', type=float, default=0.0,
+                        help='seconds added to every database statement')
+    parser.add_argument('--idle-timeout', type=float, default=5,
+                        help='seconds without any exchange served that end the replay')
+    parser.add_argument('--timeout', type=float, default=3600, help='max seconds of the replay')
+    parser.add_argument('--output', help='file where the JSON is written, defaults to stdout')
+    options = parser.parse_args(args)
+
+    logger = logging.getLogger('benchmark')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    with open(options.handlers, encoding='UTF-8') as handlers_file:
+        config_handlers = json.load(handlers_file)
+
+    result = run_replay(load_exchanges(options.record_file), config_handlers['plugins'],
+                        config_handlers['handlers'], options.queue_size, options.time_scale,
+                        options.db_latency, options.idle_timeout, options.timeout, logger)
+    report = {
+        'benchmark': 'replay',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'parameters': {key: value for key, value in vars(options).items() if key != 'output'},
+        'result': asdict(result),
+    }
+    content = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='UTF-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""End-to-end throughput benchmark of the service
+
+Drives the real JiraService loop, the routing and the handlers
+CreditHoldHandler and TlpUpdateHandler against the fake Jira and the fake
+Oracle, for every combination of queue size and backlog size informed, and
+writes the results as JSON.
+
+Usage::
+
+    python -m benchmarks.throughput --queue-sizes 1,4,10 --backlogs 50,200 \\
+        --jira-latency 0.02 --db-latency 0.005 --output results.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Sequence
+from unittest import mock
+
+from automation_service import jira_service
+from automation_service import loader
+from automation_service import content_cache
+from automation_service import rate_limiter
+from automation_service import resilience
+from automation_service.recorder import TrafficRecorder
+from benchmarks.fake_jira import FakeIssue, FakeJira, FakeJiraServer
+from benchmarks.fake_oracle import FakeOracle
+from benchmarks.workbook import build_tlp_workbook
+from handlers import jira_handler
+
+
+PLUGINS = ['handlers.credit_hold', 'handlers.update_tlp']
+SUMMARIES = {
+    'credit_hold': ('BENCH: Credit hold', 'CreditHoldHandler'),
+    'tlp': ('BENCH: TLP', 'TlpUpdateHandler'),
+}
+JIRA_CONFIG = {'jql_master': 'project = BENCH', 'user': 'bench', 'password': 'bench'}
+DATABASE_CONFIG = {'user': 'bench', 'password': 'bench', 'host': 'localhost',
+                   'port': '1521', 'sid': 'bench'}
+
+
+@dataclass
+class BenchmarkResult:
+    """Result of a run of the benchmark"""
+    queue_size: int
+    backlog: int
+    mix: str
+    resolved: int
+    elapsed_seconds: float
+    throughput: float
+    latency_p50: float
+    latency_p99: float
+    processing_p50: float
+    processing_p99: float
+    peak_memory_bytes: int
+    jira_calls: int
+    db_statements: int
+    db_connections: int
+    timed_out: bool
+
+
+class BenchmarkService(jira_service.JiraService):
+    """JiraService with the handlers informed instead of the ones of config_handlers.json"""
+    plugins: List[str] = PLUGINS
+    handlers: Dict[str, str] = dict(SUMMARIES.values())
+
+    def run(self) -> None:
+        self.handlers_holder = jira_handler.JiraHandlerData({}, dict(self.handlers))
+        loader.load_handlers(self.plugins, self.handlers_holder)
+        self._service_loop()
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Returns the percentile of the values by the nearest rank method"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@contextlib.contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """Changes the working directory inside the block, the TLP handler writes
+    the attachment on the working directory"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def build_backlog(jira: FakeJira, backlog: int, mix: List[str], tlp_rows: int) -> None:
+    """Adds the tickets of the backlog to the fake Jira, alternating the handlers of the mix"""
+    workbook = build_tlp_workbook(tlp_rows) if 'tlp' in mix else None
+    for index in range(backlog):
+        kind = mix[index % len(mix)]
+        key = f'BENCH-{index + 1}'
+        summary = SUMMARIES[kind][0]
+        if kind == 'tlp':
+            issue = FakeIssue(key, summary, attachment=workbook,
+                              attachment_name=f'TLP_{key}.xlsx')
+        else:
+            issue = FakeIssue(key, summary, fields={
+                'customfield_11701': f'C{index:06d}',
+                'customfield_11700': {'value': 'Incluir'},
+            })
+        jira.add_issue(issue)
+
+
+def run_benchmark(queue_size: int, backlog: int, mix: List[str], jira_latency: float = 0.0,
+                  db_latency: float = 0.0, connect_latency: float = 0.0, tlp_rows: int = 10,
+                  rate_limit: float = 1000, timeout: float = 300, record_file: str = None,
+                  logger: logging.Logger = logging.getLogger(__name__)) -> BenchmarkResult:
+    """Runs the service until the backlog is resolved
+
+    :param queue_size: size of the process queue of the service
+    :type queue_size: int
+    :param backlog: number of tickets on Jira when the service starts
+    :type backlog: int
+    :param mix: handlers of the tickets, 'credit_hold' and/or 'tlp'
+    :type mix: list
+    :param jira_latency: seconds added to every Jira response
+    :type jira_latency: float
+    :param db_latency: seconds added to every database statement
+    :type db_latency: float
+    :param connect_latency: seconds added to every database logon
+    :type connect_latency: float
+    :param tlp_rows: number of models on the TLP workbooks
+    :type tlp_rows: int
+    :param rate_limit: calls per second of the rate limiter of the service
+    :type rate_limit: float
+    :param timeout: max seconds waiting the backlog to be resolved
+    :type timeout: float
+    :param record_file: file where the Jira exchanges are recorded, to be
+        replayed by benchmarks.replay
+    :type record_file: str
+    :return: result of the run
+    """
+    jira = FakeJira(latency=jira_latency)
+    build_backlog(jira, backlog, mix, tlp_rows)
+    oracle = FakeOracle(latency=db_latency, connect_latency=connect_latency)
+    # the files loaded by a previous run are not on the new database
+    content_cache.CACHE.clear()
+    server = FakeJiraServer(jira, logger=logger)
+    server.start()
+
+    service = BenchmarkService(
+        logger, {**JIRA_CONFIG, 'server': server.url}, DATABASE_CONFIG, [], 'BENCH',
+        PROCESS_QUEUE_SIZE=queue_size, sleep_time=1, min_sleep_time=0,
+        limiter=rate_limiter.RateLimiter(rate=rate_limit, burst=int(rate_limit), logger=logger),
+        breakers=resilience.CircuitBreakers(),
+        recorder=TrafficRecorder(record_file, server.url,
+                                 secrets=(JIRA_CONFIG['user'], JIRA_CONFIG['password']),
+                                 logger=logger) if record_file else None,
+    )
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as folder, working_directory(folder), \
+                mock.patch('cx_Oracle.connect', oracle.connect):
+            start = time.monotonic()
+            service.start()
+            finished = jira.wait_resolved(backlog, timeout)
+            elapsed = time.monotonic() - start
+            service.stop()
+            service.join(timeout=5)
+            for queue_item in list(service.process_queue):
+                queue_item.process.join(timeout=5)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        server.stop()
+
+    issues = [issue for issue in jira.issues.values() if issue.resolved_at]
+    latencies = [issue.resolved_at - issue.created_at for issue in issues]
+    processing = [issue.resolved_at - issue.assigned_at for issue in issues]
+    return BenchmarkResult(
+        queue_size=queue_size,
+        backlog=backlog,
+        mix=','.join(mix),
+        resolved=len(issues),
+        elapsed_seconds=round(elapsed, 4),
+        throughput=round(len(issues) / elapsed, 4) if elapsed else 0.0,
+        latency_p50=round(percentile(latencies, 0.5), 4),
+        latency_p99=round(percentile(latencies, 0.99), 4),
+        processing_p50=round(percentile(processing, 0.5), 4),
+        processing_p99=round(percentile(processing, 0.99), 4),
+        peak_memory_bytes=peak_memory,
+        jira_calls=jira.calls,
+        db_statements=oracle.statements,
+        db_connections=oracle.connections,
+        timed_out=not finished,
+    )
+
+
+def int_list(value: str) -> List[int]:
+    """Parses a comma separated list of integers"""
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(args: List[str] = None) -> dict:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queue-sizes', type=int_list, default=[1, 4, 10],
+                        help='comma separated sizes of the process queue')
+    parser.add_argument('--backlogs', type=int_list, default=[50],
+                        help='comma separated numbers of tickets on the backlog')
+    parser.add_argument('--mix', default='credit_hold,tlp',
+                        help='comma separated handlers of the tickets: credit_hold, tlp')
+    parser.add_argument('--jira-latency', type=float, default=0.01,
+                        help='seconds added to every Jira response')
+    parser.add_argument('--db-latency', type=float, default=0.002,
+                        help='seconds added to every database statement')
+    parser.add_argument('--connect-latency', type=float, default=0.05,
+                        help='seconds added to every database logon')
+    parser.add_argument('--tlp-rows', type=int, default=10,
+                        help='models on each TLP workbook')
+    parser.add_argument('--rate-limit', type=float, default=1000,
+                        help='calls per second of the rate limiter')
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='max seconds of each run')
+    parser.add_argument('--record', help='file where the Jira exchanges are recorded')
+    parser.add_argument('--output', help='file where the JSON is written, defaults to stdout')
+    options = parser.parse_args(args)
+
+    logger = logging.getLogger('benchmark')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    mix = [kind for kind in options.mix.split(',') if kind]
+    unknown = set(mix) - set(SUMMARIES)
+    if unknown:
+        parser.error(f'unknown handlers on --mix: {", ".join(sorted(unknown))}')
+
+    results = []
+    for backlog in options.backlogs:
+        for queue_size in options.queue_sizes:
+            result = run_benchmark(
+                queue_size, backlog, mix, jira_latency=options.jira_latency,
+                db_latency=options.db_latency, connect_latency=options.connect_latency,
+                tlp_rows=options.tlp_rows, rate_limit=options.rate_limit,
+                timeout=options.timeout, record_file=options.record, logger=logger)
+            results.append(asdict(result))
+            print(f'queue_size={queue_size} backlog={backlog}: '
+                  f'{result.throughput:.2f} tickets/s', file=sys.stderr)
+
+    report = {
+        'benchmark': 'throughput',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'threads': threading.active_count(),
+        'parameters': {key: value for key, value in vars(options).items() if key != 'output'},
+        'results': results,
+    }
+    content = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='UTF-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
+    return report
+
+
+if __name__ == '__main__':
+    main()
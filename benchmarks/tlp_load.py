@@ -0,0 +1,171 @@
+"""Micro-benchmarks of the steps of TlpUpdateHandler
+
+For each row count a workbook is generated and the steps of the handler
+are measured separately, reporting the time and the peak memory (traced by
+tracemalloc on a second run of the step) per 10k rows:
+
+* ``parse``: read_xls_file of a valid workbook
+* ``validate``: read_xls_file of a workbook with an invalid header, the
+  time taken to reject the file
+* ``load``: execute_command of every row on the fake database, through
+  db.Oracle and its instrumented cursor
+* ``delta``: load_tlp_rows of the same rows, now stored, which only fetches
+  the rows stored and writes none of them
+
+Usage::
+
+    python -m benchmarks.tlp_load --rows 10000,100000 --duplicates 0.05 \\
+        --bad-values 0.01 --db-latency 0 --output tlp.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+from unittest import mock
+
+import automation_service.database as db
+from benchmarks.fake_oracle import FakeOracle
+from benchmarks.throughput import DATABASE_CONFIG, int_list
+from benchmarks.workbook import write_tlp_workbook
+from handlers.update_tlp import TlpUpdateHandler
+
+
+PER_ROWS = 10000
+
+
+def measure(function: Callable, *args) -> Tuple[object, float, int]:
+    """Calls the function twice, returning the result and the seconds of the first
+    call and the peak memory traced on the second one, as tracemalloc slows
+    down the code traced"""
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak_memory
+
+
+def step_result(step: str, rows: int, elapsed: float, peak_memory: int, **extra) -> dict:
+    """Returns the measures of a step normalized per 10k rows"""
+    scale = PER_ROWS / rows if rows else 0.0
+    return {
+        'step': step,
+        'rows': rows,
+        'seconds': round(elapsed, 6),
+        'peak_memory_bytes': peak_memory,
+        'seconds_per_10k_rows': round(elapsed * scale, 6),
+        'peak_memory_bytes_per_10k_rows': int(peak_memory * scale),
+        **extra,
+    }
+
+
+def get_handler(oracle: FakeOracle, logger: logging.Logger) -> TlpUpdateHandler:
+    """Returns the handler connected to the fake database"""
+    handler = TlpUpdateHandler(None, None, logger, None, None)
+    handler.database = db.Oracle(logger)
+    with mock.patch('cx_Oracle.connect', oracle.connect):
+        handler.database.create_connection(**DATABASE_CONFIG)
+    return handler
+
+
+def run_tlp_load(rows: int, folder: str, duplicates: float = 0.0, bad_values: float = 0.0,
+                 db_latency: float = 0.0,
+                 logger: logging.Logger = logging.getLogger(__name__)) -> List[dict]:
+    """Measures the parse, the validation and the load of a workbook
+
+    :param rows: number of models on the workbook
+    :type rows: int
+    :param folder: folder where the workbooks are written
+    :type folder: str
+    :param duplicates: fraction of the rows repeating a model
+    :type duplicates: float
+    :param bad_values: fraction of the rows with an empty or non numeric TLP
+    :type bad_values: float
+    :param db_latency: seconds added to every database statement
+    :type db_latency: float
+    :return: measures of each step
+    """
+    valid_file = os.path.join(folder, f'TLP_{rows}.xlsx')
+    invalid_file = os.path.join(folder, f'TLP_{rows}_invalid.xlsx')
+    write_tlp_workbook(valid_file, rows, duplicates, bad_values)
+    write_tlp_workbook(invalid_file, rows, invalid=True)
+
+    oracle = FakeOracle(latency=db_latency)
+    handler = get_handler(oracle, logger)
+    commands = handler.get_insert_update_commands()
+
+    lines, elapsed, peak_memory = measure(handler.read_xls_file, valid_file)
+    results = [step_result('parse', rows, elapsed, peak_memory,
+                           file_size_bytes=os.path.getsize(valid_file))]
+
+    rejected, elapsed, peak_memory = measure(handler.read_xls_file, invalid_file)
+    results.append(step_result('validate', rows, elapsed, peak_memory,
+                               rejected=rejected is None))
+
+    def load() -> None:
+        for line in lines:
+            handler.execute_command(commands, line)
+
+    _, elapsed, peak_memory = measure(load)
+    results.append(step_result('load', rows, elapsed, peak_memory,
+                               statements=len(lines) * len(commands)))
+
+    statements = oracle.statements
+    counts, elapsed, peak_memory = measure(handler.load_tlp_rows, dict(lines))
+    results.append(step_result('delta', rows, elapsed, peak_memory,
+                               statements=(oracle.statements - statements) // 2, **counts))
+    return results
+
+
+def main(args: List[str] = None) -> dict:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int_list, default=[1000, 10000],
+                        help='comma separated row counts of the workbooks')
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help='fraction of rows repeating a previous model')
+    parser.add_argument('--bad-values', type=float, default=0.0,
+                        help='fraction of rows with an empty or non numeric TLP')
+    parser.add_argument('--db-latency', type=float, default=0.0,
+                        help='seconds added to every database statement')
+    parser.add_argument('--output', help='file where the JSON is written, defaults to stdout')
+    options = parser.parse_args(args)
+
+    logger = logging.getLogger('benchmark')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in options.rows:
+            results.extend(run_tlp_load(rows, folder, options.duplicates, options.bad_values,
+                                        options.db_latency, logger))
+
+    report = {
+        'benchmark': 'tlp_load',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'parameters': {key: value for key, value in vars(options).items() if key != 'output'},
+        'results': results,
+    }
+    content = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='UTF-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
+    return report
+
+
+if __name__ == '__main__':
+    main()
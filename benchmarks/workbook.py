@@ -0,0 +1,118 @@
+"""Generator of the TLP workbooks used by the benchmarks
+
+The workbooks are written in streaming (write only) mode, so millions of
+rows can be generated without keeping the sheet in memory.
+
+Usage::
+
+    python -m benchmarks.workbook TLP_bench.xlsx --rows 1000000 --duplicates 0.05 \\
+        --bad-values 0.01
+    python -m benchmarks.workbook TLP_invalid.xlsx --rows 1000 --invalid
+"""
+import argparse
+import io
+import random
+from typing import BinaryIO, List, Union
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+
+from handlers.update_tlp import TlpUpdateHandler
+
+
+MODEL_COLUMN = 10
+TLP_COLUMN = 16
+SHEET_NAME = 'Plan1'
+BAD_VALUES = (None, '', 'N/A', '-', -1, 'abc')
+
+
+def header_cell(sheet, value: str) -> WriteOnlyCell:
+    """Returns a cell of the header written as text, even when it looks like a formula"""
+    cell = WriteOnlyCell(sheet, value)
+    cell.data_type = 's'
+    return cell
+
+
+def tlp_columns(invalid: bool = False) -> List[str]:
+    """Returns the header expected by TlpUpdateHandler, or a header it rejects"""
+    columns = list(TlpUpdateHandler(None, None, None, None, None).columns_validation)
+    if invalid:
+        columns[0] = 'MODEL'
+    return columns
+
+
+def write_tlp_workbook(target: Union[str, BinaryIO], rows: int = 10,
+                       duplicates: float = 0.0, bad_values: float = 0.0,
+                       invalid: bool = False, seed: int = 0) -> None:
+    """Writes a TLP workbook with the layout read by TlpUpdateHandler
+
+    :param target: path or file object where the xlsx is written
+    :type target: Union[str, BinaryIO]
+    :param rows: number of models on the workbook
+    :type rows: int
+    :param duplicates: fraction of the rows repeating a model of a previous row
+    :type duplicates: float
+    :param bad_values: fraction of the rows with an empty or non numeric TLP
+    :type bad_values: float
+    :param invalid: True to write a header that fails the validation of the handler
+    :type invalid: bool
+    :param seed: seed of the random choices, the same arguments write the same rows
+    :type seed: int
+    """
+    generator = random.Random(seed)
+    columns = tlp_columns(invalid)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(SHEET_NAME)
+    sheet.append([None if column.startswith('Unnamed') else header_cell(sheet, column)
+                  for column in columns])
+    # second header line, skipped by the handler, keeps the unnamed columns on the sheet
+    sheet.append([f'H{index}' if column.startswith('Unnamed') else None
+                  for index, column in enumerate(columns)])
+
+    line = [None] * len(columns)
+    for row in range(rows):
+        model = row
+        if row and duplicates and generator.random() < duplicates:
+            model = generator.randrange(row)
+        line[MODEL_COLUMN] = f'MODEL{model:07d}'
+        if bad_values and generator.random() < bad_values:
+            line[TLP_COLUMN] = generator.choice(BAD_VALUES)
+        else:
+            line[TLP_COLUMN] = round(100 + generator.random() * 900, 2)
+        sheet.append(line)
+
+    workbook.save(target)
+
+
+def build_tlp_workbook(rows: int = 10, **options) -> bytes:
+    """Returns the content of a TLP workbook, see write_tlp_workbook for the options
+
+    :param rows: number of models on the workbook
+    :type rows: int
+    :return: content of the xlsx file
+    """
+    content = io.BytesIO()
+    write_tlp_workbook(content, rows, **options)
+    return content.getvalue()
+
+
+def main(args: List[str] = None) -> None:
+    """Entry point of the generator"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='path of the xlsx, the handler expects TLP_*.xlsx')
+    parser.add_argument('--rows', type=int, default=10000, help='number of models')
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help='fraction of rows repeating a previous model')
+    parser.add_argument('--bad-values', type=float, default=0.0,
+                        help='fraction of rows with an empty or non numeric TLP')
+    parser.add_argument('--invalid', action='store_true',
+                        help='write a header rejected by the handler')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random choices')
+    options = parser.parse_args(args)
+
+    write_tlp_workbook(options.output, options.rows, options.duplicates, options.bad_values,
+                       options.invalid, options.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,22 @@
 from __future__ import absolute_import
 
 import logging
+from typing import List, Tuple
 
 import jira
 
 import automation_service.database as db
 import automation_service.email as email
-from handlers.jira_handler import JiraHandler, JiraHandlerData, Status
+from automation_service import resilience
+from automation_service import tracing
+from handlers.jira_handler import BatchJiraHandler, JiraHandlerData, Status
 
 
-class CreditHoldHandler(JiraHandler):
-    """Handles the Credit hold requests"""
+class CreditHoldHandler(BatchJiraHandler):
+    """Handles the Credit hold requests, the tickets of a batch are looked up
+    and changed on the database together"""
+    ticket_fields = ('customfield_11700', 'customfield_11701')
+
     def __init__(self, ticket, database_config: dict, logger: logging.Logger,
                  jira_session: jira.JIRA, lookup_code: str) -> None:
         super().__init__(ticket=ticket, database_config=database_config,
@@ -33,16 +39,57 @@ class CreditHoldHandler(JiraHandler):
         """
         Runs the credit hold handler.
         """
+        requests = []
+        for ticket in self.tickets:
+            with self.ticket_scope(ticket):
+                self.set_status(Status.TAKE.value)
+                self.set_status(Status.ANALYZE_THE_PROBLEM.value)
+                self.set_status(Status.WORK_IN_LOCAL_SOLUTION.value)
+
+                operation = ticket.fields.customfield_11700.value
+                include_flag = 'Y' if operation == 'Incluir' else 'N'
+                requests.append((ticket, ticket.fields.customfield_11701, include_flag))
+
+        statuses = self.credit_hold_include_many(
+            [(client_code, include_flag) for _, client_code, include_flag in requests])
+
+        for (ticket, client_code, _), status in zip(requests, statuses):
+            with self.ticket_scope(ticket):
+                self.client_code = client_code
+                self.finish_ticket(status)
+                if status != "error":
+                    self.record_outcome(status)
+
+    @staticmethod
+    def entity_key(ticket: jira.Issue) -> tuple:
+        """
+        Returns the client code and the operation of the ticket.
+        """
+        fields = ticket.fields
+        return fields.customfield_11701, fields.customfield_11700.value
+
+    @staticmethod
+    def ordering_key(ticket: jira.Issue) -> tuple:
+        """
+        Returns the row of the client on lge_code_lookup.
+        """
+        return 'CREDIT_HOLD', ticket.fields.customfield_11701
+
+    def apply_outcome(self, outcome: str) -> None:
+        """
+        Finishes the ticket with the outcome of another ticket of the same client
+        and operation.
+        """
         self.set_status(Status.TAKE.value)
         self.set_status(Status.ANALYZE_THE_PROBLEM.value)
         self.set_status(Status.WORK_IN_LOCAL_SOLUTION.value)
+        self.finish_ticket(outcome)
 
-        self.client_code = self.ticket.fields.customfield_11701
-        operation = self.ticket.fields.customfield_11700.value
-
-        include_flag = 'Y' if operation == 'Incluir' else 'N'
-        status = self.credit_hold_include(include_flag)
-
+    def finish_ticket(self, status: str) -> None:
+        """
+        Comments the outcome on the current ticket and resolves it, or sends the
+        error email.
+        """
         self.include_comment(self.possible_outcomes[status])
         if status == "error":
             message_body = "Erro ao incluir cliente na lista de credit hold do tms"
@@ -56,8 +103,12 @@ class CreditHoldHandler(JiraHandler):
 
             message = message_builder.build()
             sender = email.EmailSender(port=25, smtp_server='lgekrhqmh01.lge.com',
-                                       sender_email='brtms@lge.com', )
-            sender.send_email(receiver_email_list, message)
+                                       sender_email='brtms@lge.com',
+                                       breaker=resilience.get_breaker(resilience.SMTP))
+            try:
+                sender.send_email(receiver_email_list, message)
+            except (*email.SMTP_ERRORS, resilience.CircuitBreakerOpen) as error:
+                self.logger.error("Error sending email: %s", error)
             return
 
         self.include_comment("Credit Hold processado, ticket finalizado.")
@@ -79,10 +130,10 @@ class CreditHoldHandler(JiraHandler):
             and code = :client_code"""
 
         credit_hold_query = """
-            select enabled
+            select code, enabled
             from   lge_code_lookup
             where  class = 'CREDIT_HOLD'
-            and    code = :client_code"""
+            and    code in ({binds})"""
 
         return credit_hold_query, update_credit_hold_command, insert_credit_hold_command
 
@@ -93,27 +144,67 @@ class CreditHoldHandler(JiraHandler):
         self.database.connection.commit()
         return True
 
+    @tracing.traced('credit_hold.credit_hold_include')
     def credit_hold_include(self, include_flag: str) -> bool:
         """
         Checks if a client has a credit hold.
         """
-        # self.connection = self.database.create_connection()
-        cursor = self.database.get_cursor()
-        credit_hold_query, update_credit_hold_command, insert_credit_hold_command = \
-            self.set_database_commands()
+        return self.credit_hold_include_many([(self.client_code, include_flag)])[0]
 
-        cursor.execute(credit_hold_query, client_code=self.client_code)
-        enabled = cursor.fetchone()
+    @tracing.traced('credit_hold.credit_hold_include_many')
+    def credit_hold_include_many(self, requests: List[Tuple[str, str]]) -> List[str]:
+        """
+        Includes or removes the clients of the credit hold with one query and
+        one array DML of each command.
+
+        The requests are applied in order, so two tickets of the same client
+        get the outcomes they would have one after the other.
 
-        if not enabled and include_flag == 'Y':
-            self.execute_command(insert_credit_hold_command, self.client_code, include_flag)
-            return "created"
+        :param requests: client code and include flag ('Y' or 'N') of each ticket
+        :type requests: List[Tuple[str, str]]
+        :return: outcome of each request
+        """
+        if not requests:
+            return []
 
-        if enabled[0] == include_flag:
-            return "exists" if include_flag == 'Y' else "deactivated"
+        cursor = self.database.get_cursor()
+        credit_hold_query, update_credit_hold_command, insert_credit_hold_command = \
+            self.set_database_commands()
 
-        self.execute_command(update_credit_hold_command, self.client_code, include_flag)
-        return "updated"
+        codes = list(dict.fromkeys(client_code for client_code, _ in requests))
+        binds = {f'code_{index}': client_code for index, client_code in enumerate(codes)}
+        cursor.execute(credit_hold_query.format(binds=', '.join(f':{name}' for name in binds)),
+                       binds)
+        stored = dict(cursor.fetchall())
+
+        current = dict(stored)
+        statuses = []
+        for client_code, include_flag in requests:
+            enabled = current.get(client_code)
+            if enabled is None and include_flag == 'Y':
+                statuses.append("created")
+            elif enabled is None:
+                self.logger.error("Client %s is not on the credit hold", client_code)
+                statuses.append("error")
+                continue
+            elif enabled == include_flag:
+                statuses.append("exists" if include_flag == 'Y' else "deactivated")
+            else:
+                statuses.append("updated")
+            current[client_code] = include_flag
+
+        inserts = [{'client_code': code, 'enabled': enabled}
+                   for code, enabled in current.items() if code not in stored]
+        updates = [{'client_code': code, 'enabled': enabled}
+                   for code, enabled in current.items()
+                   if code in stored and stored[code] != enabled]
+        if inserts:
+            cursor.executemany(insert_credit_hold_command, inserts)
+        if updates:
+            cursor.executemany(update_credit_hold_command, updates)
+        if inserts or updates:
+            self.database.connection.commit()
+        return statuses
 
 
 def initialize(handlers_holder: JiraHandlerData) -> None:
@@ -2,17 +2,22 @@
 from __future__ import absolute_import
 
 import configparser
+import hashlib
 import logging
 import sys
 import threading
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 
 import jira
 
 import automation_service.database as db
+from automation_service import context
+from automation_service import resilience
+from automation_service import tracing
 
 
 class Status(Enum):
@@ -25,7 +30,17 @@ class Status(Enum):
 
 # TODO: Improve the logging
 class JiraHandler(ABC, threading.Thread):
-    """Handler base class"""
+    """Handler base class
+
+    The tickets are snapshots (see snapshot.TicketSnapshot) with the key, the
+    summary, the fields listed on `ticket_fields` and the expands listed on
+    `ticket_expand`, all fetched by the search of the service, so the handler
+    does not need to fetch the ticket again.
+    """
+    dependencies = (resilience.JIRA, resilience.ORACLE)
+    ticket_fields: Tuple[str, ...] = ()
+    ticket_expand: Tuple[str, ...] = ()
+
     def __init__(self, ticket: jira.Issue, database_config: configparser.ConfigParser,
                  logger: logging.Logger, jira_session: jira.JIRA, lookup_code: str) -> None:
         threading.Thread.__init__(self)
@@ -39,10 +54,15 @@ class JiraHandler(ABC, threading.Thread):
             self.set_database_connection()
         self.mail_list_lookup_code = lookup_code
         self.handler_type = None
+        self.journal = None
+        self.spool = None
+        self.outcomes: Dict[str, object] = {}
 
+    @tracing.traced('handler.set_database_connection')
     def set_database_connection(self) -> None:
         """Set database connection"""
-        self.database = db.Oracle(self.logger)
+        self.database = db.Oracle(self.logger,
+                                  breaker=resilience.get_breaker(resilience.ORACLE))
         try:
             self.database.create_connection(
                 user=self.database_config['user'],
@@ -58,20 +78,129 @@ class JiraHandler(ABC, threading.Thread):
     def run(self) -> None:
         """Method to be implemented by subclasses."""
 
+    @staticmethod
+    def entity_key(ticket: jira.Issue) -> object:
+        """
+        Returns the key of the entity changed by the ticket, the tickets with the
+        same key share one execution and its outcome (see coalesce.Coalescer),
+        None to always run the ticket. A handler that defines it must define
+        `apply_outcome(outcome)` too, which applies to the ticket the outcome
+        recorded by another ticket of the same key instead of running it.
+        """
+        return None
+
+    @staticmethod
+    def ordering_key(ticket: jira.Issue) -> object:
+        """
+        Returns the key of the rows changed by the ticket, the tickets with the
+        same key run one at a time in the order they arrive (see
+        ordering.KeySequencer), None to run the ticket in parallel.
+        """
+        return None
+
+    @staticmethod
+    def ticket_attachment(ticket: jira.Issue) -> object:
+        """
+        Returns the attachment of the ticket downloaded by the handler, it is
+        downloaded ahead while the ticket waits for a slot (see
+        prefetch.AttachmentPrefetcher), None when the handler downloads none.
+        """
+        return None
+
+    def record_outcome(self, outcome: object) -> None:
+        """
+        Records the outcome of the current ticket, shared with the tickets of
+        the same entity key.
+        """
+        self.outcomes[self.ticket.key] = outcome
+
+    def step_done(self, step: str) -> bool:
+        """
+        Checks on the journal if the step was completed by a previous run of the ticket.
+        """
+        if not self.journal:
+            return False
+        return self.journal.is_step_done(self.ticket.key, step)
+
+    def record_step(self, step: str) -> None:
+        """
+        Records the completion of a step on the journal.
+        """
+        if self.journal:
+            self.journal.step(self.ticket.key, step)
+
     def set_status(self, transition_id: int) -> None:
         """
         Sets the status of a ticket.
         """
+        step = f'transition:{transition_id}'
+        if self.step_done(step):
+            return
+
         try:
-            self.jira_session.transition_issue(self.ticket, transition_id)
+            with tracing.span('handler.set_status', transition=transition_id):
+                self.jira_session.transition_issue(self.ticket, transition_id)
+            self.record_step(step)
         except jira.exceptions.JIRAError:
-            self.logger.error(f"[{self.ticket.key}]: Error on transition of status")
+            self.logger.error("Error on transition of status")
 
     def include_comment(self, comment: str) -> None:
         """
         Adds a comment to a ticket.
         """
-        self.jira_session.add_comment(self.ticket, comment)
+        step = f'comment:{hashlib.sha1(comment.encode("UTF-8")).hexdigest()}'
+        if self.step_done(step):
+            return
+
+        with tracing.span('handler.include_comment'):
+            self.jira_session.add_comment(self.ticket, comment)
+        self.record_step(step)
+
+
+class BatchJiraHandler(JiraHandler):
+    """Handler base class of the handlers that process many tickets on one run
+
+    The service gathers the tickets routed to the handler on the same poll,
+    up to `batch_size`, and starts a single handler with all of them, so the
+    handler can look them up and change them with one database round trip.
+    Each ticket is still commented and transitioned on its own inside
+    `ticket_scope`, the failure of a ticket is recorded on `failed` and does
+    not end the others.
+
+    The handler also accepts a single ticket, handled as a batch of one.
+    """
+    batch_size = 20
+
+    def __init__(self, ticket: List[jira.Issue], database_config: configparser.ConfigParser,
+                 logger: logging.Logger, jira_session: jira.JIRA, lookup_code: str) -> None:
+        tickets = list(ticket) if isinstance(ticket, (list, tuple)) else \
+            [ticket] if ticket is not None else []
+        super().__init__(ticket=tickets[0] if tickets else None,
+                         database_config=database_config, logger=logger,
+                         jira_session=jira_session, lookup_code=lookup_code)
+        self.tickets: List[jira.Issue] = tickets
+        self.failed: Dict[str, Exception] = {}
+
+    @contextmanager
+    def ticket_scope(self, ticket: jira.Issue) -> Iterator[jira.Issue]:
+        """
+        Makes the ticket the current one of the handler while inside the block,
+        an error is recorded as the failure of the ticket and is not raised.
+
+        The block is traced as a `handler.run` span on the trace of the ticket,
+        so the tickets of a batch are reported by handler type as the others.
+        """
+        previous, self.ticket = self.ticket, ticket
+        with context.bind(issue_key=ticket.key):
+            try:
+                with tracing.span('handler.run',
+                                  handler=context.get('handler_type', type(self).__name__)):
+                    yield ticket
+            except Exception as error: # pylint: disable=broad-except
+                self.logger.exception("Ticket %s failed", ticket.key)
+                self.failed[ticket.key] = error
+            finally:
+                self.ticket = previous
 
 
 @dataclass
@@ -81,7 +210,15 @@ class JiraHandlerData:
     handlers: Dict[str, str]
 
     def add_handler(self, handler: JiraHandler) -> None:
-        """Add a handler to the list"""
+        """Add a handler to the list
+
+        :raises TypeError: if the handler defines `entity_key` without
+            `apply_outcome`, needed to share the outcomes of its tickets
+        """
+        if getattr(handler, 'entity_key', None) not in (None, JiraHandler.entity_key) and \
+                not callable(getattr(handler, 'apply_outcome', None)):
+            raise TypeError(f'{getattr(handler, "__name__", handler)} defines entity_key '
+                            'without apply_outcome')
         class_name = handler(None, None, None, None, None).__class__.__name__
         self.handlers_classes[class_name] = handler
 
@@ -3,20 +3,32 @@ from __future__ import absolute_import
 import logging
 import os
 import re
+from typing import Dict, List
 
 import jira
 import pandas
 
+from automation_service import content_cache
+from automation_service import metrics
+from automation_service import tracing
+from automation_service.prefetch import download_attachment
 from handlers.jira_handler import JiraHandler, JiraHandlerData, Status
 
 
+TLP_CHUNK_SIZE = 1000
+TLP_SET_VALUES = ('LGBR', 'TMS', 'Y')
+
+
 class TlpUpdateHandler(JiraHandler):
     """Halndles the tlp requests"""
+    ticket_fields = ('attachment',)
+
     def __init__(self, ticket, database_config: dict, logger: logging.Logger,
                  jira_session: jira.JIRA, lookup_code: str) -> None:
         super().__init__(ticket=ticket, database_config=database_config,
                          logger=logger, jira_session=jira_session, lookup_code=lookup_code)
         self.valid_file = False
+        self.digest = None
         self.columns_validation = [
             'MODEL_CODE', 'CBM', 'WEIGHT', 'HEIGHT', 'WIDTH', 'DEPTH',
             '=ARRUMAR(SUBSTITUIR(F1;CARACT(160);CARACT(32)))', 'Unnamed: 7',
@@ -26,11 +38,17 @@ class TlpUpdateHandler(JiraHandler):
         ]
 
     def run(self) -> None:
-        """Runs the main execution steps"""
-        attach_filename = self.download_tlp_file()
+        """Runs the main execution steps
+
+        A TLP file already parsed, found on the cache by its attachment or by
+        its content, is not parsed again (see content_cache.ContentCache), and
+        the load only writes the models whose stored rows differ.
+        """
+        entry = self.cached_tlp_file()
+        attach_filename = None if entry else self.download_tlp_file()
 
         if not self.valid_file:
-            self.logger.error(f"[{self.ticket.key}]: File is not valid")
+            self.logger.error("File is not valid")
             self.include_comment("Arquivo não é valido")
             return
 
@@ -38,20 +56,92 @@ class TlpUpdateHandler(JiraHandler):
         self.set_status(Status.ANALYZE_THE_PROBLEM.value)
         self.set_status(Status.WORK_IN_LOCAL_SOLUTION.value)
 
-        tlp_file = self.read_xls_file(attach_filename)
-        if not tlp_file:
-            self.logger.error(f"[{self.ticket.key}]: File is not valid")
-            self.include_comment("Arquivo não é valido")
-            return
+        if entry is None:
+            entry = content_cache.CACHE.lookup(type(self).__name__, self.digest,
+                                               self.ticket_attachment(self.ticket).id)
+        if entry is None:
+            tlp_file = self.read_xls_file(attach_filename)
+            if not tlp_file:
+                self.logger.error("File is not valid")
+                self.include_comment("Arquivo não é valido")
+                return
+            entry = content_cache.CACHE.store(type(self).__name__, self.digest, dict(tlp_file),
+                                              self.ticket_attachment(self.ticket).id)
 
-        commands = self.get_insert_update_commands()
-        for line in tlp_file:
-            self.execute_command(commands, line)
+        counts = self.load_tlp_rows(entry.rows)
 
-        self.include_comment("Tlp processado, ticket finalizado.")
+        self.include_comment(
+            "Tlp processado, ticket finalizado. "
+            f"Criados: {counts['created']}, alterados: {counts['changed']}, "
+            f"sem alteração: {counts['unchanged']}.")
         self.set_status(Status.RESOLVE.value)
 
-        os.remove(attach_filename)
+        if attach_filename:
+            os.remove(attach_filename)
+
+    def load_tlp_rows(self, rows: Dict[str, object]) -> Dict[str, int]:
+        """Writes on the database only the models of the TLP file that are new or changed
+
+        The rows stored of the models of the file are fetched in chunks of
+        `TLP_CHUNK_SIZE` binds, the models missing are inserted and the ones
+        with another tlp, or that are not the ones set by the update, are
+        updated, with one array DML of each command and one commit.
+
+        :param rows: tlp of each model of the file
+        :type rows: Dict[str, object]
+        :return: number of models created, changed and unchanged
+        """
+        with tracing.span('tlp.load_rows', rows=len(rows)) as span:
+            stored = self.fetch_stored_tlp(list(rows))
+            inserts, updates = [], []
+            for model, tlp in rows.items():
+                if model not in stored:
+                    inserts.append({'model': model, 'tlp': tlp})
+                elif any(values != (tlp,) + TLP_SET_VALUES for values in stored[model]):
+                    updates.append({'model': model, 'tlp': tlp})
+
+            command_update, command_insert = self.get_insert_update_commands()
+            cursor = self.database.get_cursor()
+            if updates:
+                cursor.executemany(command_update, updates)
+            if inserts:
+                cursor.executemany(command_insert, inserts)
+            if inserts or updates:
+                self.database.connection.commit()
+
+            counts = {'created': len(inserts), 'changed': len(updates),
+                      'unchanged': len(rows) - len(inserts) - len(updates)}
+            if span:
+                span.set(**counts)
+        self.logger.info("TLP loaded, %s created, %s changed, %s unchanged",
+                         counts['created'], counts['changed'], counts['unchanged'])
+        return counts
+
+    def fetch_stored_tlp(self, models: List[str]) -> Dict[str, List[tuple]]:
+        """Fetches the rows stored of the models, with chunked IN-lists
+
+        :param models: models of the file
+        :type models: List[str]
+        :return: tlp, div_code, final_user_id and use_yn of the rows of each model stored
+        """
+        cursor = self.database.get_cursor()
+        stored = {}
+        for start in range(0, len(models), TLP_CHUNK_SIZE):
+            binds = {f'model_{index}': model
+                     for index, model in enumerate(models[start:start + TLP_CHUNK_SIZE])}
+            cursor.execute(self.get_stored_tlp_query().format(
+                binds=', '.join(f':{name}' for name in binds)), binds)
+            for model, *values in cursor.fetchall():
+                stored.setdefault(model, []).append(tuple(values))
+        return stored
+
+    @staticmethod
+    def get_stored_tlp_query() -> str:
+        """Returns the query of the rows stored of a chunk of models, the binds of
+        the models go on `{binds}`"""
+        return """select model, tlp, div_code, final_user_id, use_yn
+                    from tb_ocs_tlp
+                   where model in ({binds})"""
 
     @staticmethod
     def get_insert_update_commands() -> str:
@@ -89,6 +179,7 @@ class TlpUpdateHandler(JiraHandler):
             cursor.execute(command, tlp=commands_args[1], model=commands_args[0])
         self.database.connection.commit()
 
+    @tracing.traced('tlp.read_xls_file')
     def read_xls_file(self, excel_file) -> list:
         """ Function to extract TLP data from an excel file and returns a list with these values.
 
@@ -109,27 +200,51 @@ class TlpUpdateHandler(JiraHandler):
 
         return excel_lines
 
+    @staticmethod
+    def ticket_attachment(ticket) -> object:
+        """Returns the TLP file of the ticket, None if its first attachment is not a TLP file"""
+        attachments = getattr(ticket.fields, 'attachment', None) or []
+        if attachments and TlpUpdateHandler.validate_tlp_file_name(attachments[0].filename):
+            return attachments[0]
+        return None
+
+    def cached_tlp_file(self) -> content_cache.CacheEntry:
+        """Returns the rows of the TLP file of the ticket when its attachment is on
+        the cache, None when the file must be downloaded"""
+        attachment = self.ticket_attachment(self.ticket)
+        if attachment is None:
+            return None
+        entry = content_cache.CACHE.lookup(type(self).__name__, attachment_id=attachment.id)
+        self.valid_file = entry is not None
+        return entry
+
+    @tracing.traced('tlp.download_tlp_file')
     def download_tlp_file(self) -> str:
-        """Downloads file from the ticket"""
-        issue = self.jira_session.search_issues(
-            f'key = {self.ticket.key}', json_result=True,
-            fields="key, attachment"
-        )
+        """Downloads file from the ticket
 
-        attachment = self.jira_session.attachment(
-            issue['issues'][0]['fields']['attachment'][0]['id']
-        )
+        The metadata of the attachments comes with the ticket (see
+        `ticket_fields`), and the content is taken from the prefetch spool
+        when it was downloaded while the ticket waited for a slot.
+        """
+        attachment = self.ticket_attachment(self.ticket)
+        self.valid_file = attachment is not None
+        if not self.valid_file:
+            return None
 
-        self.attach = attachment.get()
-        attach_filename = attachment.filename
-        self.valid_file = self.validate_tlp_file_name(attach_filename)
+        self.attach = self.spool.take(self.ticket.key, attachment.id) if self.spool else None
+        if self.attach is None:
+            if self.spool:
+                metrics.PREFETCH.inc(event='missed')
+            self.attach = download_attachment(self.jira_session, attachment)
+        else:
+            metrics.PREFETCH.inc(event='taken')
+        self.digest = content_cache.content_digest(self.attach)
 
-        if self.valid_file:
-            with open(attach_filename, 'wb') as file_object:
-                file_object.write(self.attach)
+        attach_filename = attachment.filename
+        with open(attach_filename, 'wb') as file_object:
+            file_object.write(self.attach)
 
-            return attach_filename
-        return None
+        return attach_filename
 
     @staticmethod
     def validate_tlp_file_name(file_name) -> None:
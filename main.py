@@ -1,11 +1,26 @@
 """Program to read tickets from JIRA and automate the process of solving the issues"""
 import configparser
 import logging
+import sys
 import time
 from typing import List
 
 from automation_service.jira_service import JiraService, JiraProcess
-from automation_service.config import set_logger, get_config
+from automation_service.config import set_logger, get_log_options, stop_logger
+from automation_service.coalesce import Coalescer, DEFAULT_COALESCE_WINDOW
+from automation_service import content_cache
+from automation_service import config_store
+from automation_service.config_store import ConfigStore, DEFAULT_WATCH_INTERVAL
+from automation_service.journal import DEFAULT_MAX_FAILURES, WorkJournal
+from automation_service.prefetch import AttachmentPrefetcher, AttachmentSpool, \
+    DEFAULT_PREFETCH_DEPTH, DEFAULT_SPOOL_BYTES
+from automation_service.rate_limiter import RateLimiter
+from automation_service.recorder import TrafficRecorder
+from automation_service import resilience
+from automation_service import tracing
+from automation_service import webhook
+from automation_service.webhook import WebhookServer
+from automation_service.metrics import MetricsServer
 
 
 PROCESS_QUEUE: List[JiraProcess] = []
@@ -13,7 +28,11 @@ SLEEP_TIME: int = 1
 PROCESS_QUEUE_SIZE: int = 1
 LOGGER = logging.getLogger(__name__)
 SERVICE: JiraService = None
+JOURNAL: WorkJournal = None
+WEBHOOK: WebhookServer = None
+METRICS: MetricsServer = None
 CONFIG: configparser.ConfigParser = None
+CONFIG_STORE: ConfigStore = None
 
 
 def main():
@@ -21,11 +40,15 @@ def main():
     global LOGGER # pylint: disable=global-statement
     global CONFIG # pylint: disable=global-statement
     global PROCESS_QUEUE_SIZE # pylint: disable=global-statement
+    global CONFIG_STORE # pylint: disable=global-statement
     try:
         # main service execution
-        LOGGER = set_logger()
-        CONFIG = get_config('config.ini', LOGGER)
-        PROCESS_QUEUE_SIZE = int(CONFIG['SETUP']['process_queue_size'])
+        CONFIG_STORE = ConfigStore('config.ini', 'config_handlers.json', logger=LOGGER)
+        CONFIG = CONFIG_STORE.snapshot().config
+        LOGGER = set_logger(**get_log_options(CONFIG['SETUP']))
+        CONFIG_STORE.logger = LOGGER
+        config_store.share_store(CONFIG_STORE, 'config.ini')
+        PROCESS_QUEUE_SIZE = CONFIG_STORE.snapshot().process_queue_size
         LOGGER.info('Starting the service')
         start_service(CONFIG['JIRA'], CONFIG['ORACLE'])
         wait_service()
@@ -33,6 +56,7 @@ def main():
         kill_processes()
     finally:
         LOGGER.info('Ending service')
+        stop_logger()
 
 def wait_service():
     """Wait for the service to finish"""
@@ -44,25 +68,98 @@ def wait_service():
 
 def check_processes():
     """Check the processes on the queue"""
-    for queue_item in PROCESS_QUEUE:
-        if not queue_item.process.is_alive():
-            LOGGER.info("Process %s ended", queue_item.issue_key)
-            PROCESS_QUEUE.remove(queue_item)
+    SERVICE.reap_processes()
 
 
 def start_service(jira_config: dict, database_config: dict):
     """Start the service"""
     global SERVICE # pylint: disable=global-statement
+    global JOURNAL # pylint: disable=global-statement
+    global WEBHOOK # pylint: disable=global-statement
+    global METRICS # pylint: disable=global-statement
+    JOURNAL = WorkJournal(
+        journal_file=CONFIG['SETUP'].get('journal_file', 'journal.db'),
+        logger=LOGGER,
+        max_failures=int(CONFIG['SETUP'].get('journal_max_failures',
+                                             str(DEFAULT_MAX_FAILURES)))
+    )
+    tracing.configure(CONFIG['SETUP'].get('trace_file', ''), LOGGER)
+    resilience.BREAKERS.configure(resilience.JIRA, jira_config, LOGGER)
+    resilience.BREAKERS.configure(resilience.ORACLE, database_config, LOGGER)
+    resilience.BREAKERS.configure(
+        resilience.SMTP, CONFIG['SMTP'] if CONFIG.has_section('SMTP') else {}, LOGGER)
+    limiter = RateLimiter(
+        rate=float(jira_config.get('rate_limit', '5')),
+        burst=int(jira_config.get('rate_burst', '10')),
+        logger=LOGGER
+    )
+    content_cache.CACHE.configure(
+        max_entries=int(CONFIG['SETUP'].get('content_cache_entries',
+                                            str(content_cache.DEFAULT_CACHE_ENTRIES))),
+        max_rows=int(CONFIG['SETUP'].get('content_cache_rows',
+                                         str(content_cache.DEFAULT_CACHE_ROWS)))
+    )
+    webhook_enabled = CONFIG['SETUP'].getboolean('webhook_enabled', False)
+    webhook_host = CONFIG['SETUP'].get('webhook_host', webhook.DEFAULT_HOST)
+    webhook_token = CONFIG['SETUP'].get('webhook_token', '')
+    if webhook_enabled:
+        try:
+            webhook.check_binding(webhook_host, webhook_token)
+        except ValueError as error:
+            LOGGER.error("Invalid webhook configuration: %s", error)
+            sys.exit(1)
+    snapshot = CONFIG_STORE.snapshot()
+    prefetch_depth = int(CONFIG['SETUP'].get('prefetch_depth', str(DEFAULT_PREFETCH_DEPTH)))
     SERVICE = JiraService(
         logger=LOGGER,
         jira_config=jira_config,
         database_config=database_config,
         PROCESS_QUEUE=PROCESS_QUEUE,
         PROCESS_QUEUE_SIZE=PROCESS_QUEUE_SIZE,
-        sleep_time=int(CONFIG['SETUP']['sleep_time']),
-        mail_list_lookup_code=CONFIG['SETUP']['mail_list_lookup_code']
+        sleep_time=snapshot.sleep_time,
+        min_sleep_time=snapshot.min_sleep_time,
+        reconcile_interval=float(CONFIG['SETUP'].get('reconcile_interval', '300')) \
+            if webhook_enabled else None,
+        mail_list_lookup_code=CONFIG['SETUP']['mail_list_lookup_code'],
+        journal=JOURNAL,
+        limiter=limiter,
+        breakers=resilience.BREAKERS,
+        recorder=TrafficRecorder(
+            jira_config['record_file'], jira_config['server'],
+            secrets=(jira_config['user'], jira_config['password']), logger=LOGGER
+        ) if jira_config.get('record_file') else None,
+        config_store=CONFIG_STORE,
+        dispatch_policy=snapshot.dispatch_policy,
+        coalescer=Coalescer(
+            window=float(CONFIG['SETUP'].get('coalesce_window', str(DEFAULT_COALESCE_WINDOW)))),
+        prefetcher=AttachmentPrefetcher(
+            AttachmentSpool(int(CONFIG['SETUP'].get('prefetch_spool_bytes',
+                                                    str(DEFAULT_SPOOL_BYTES)))),
+            logger=LOGGER, depth=prefetch_depth
+        ) if prefetch_depth > 0 else None
     )
     SERVICE.start()
+    CONFIG_STORE.watch(
+        float(CONFIG['SETUP'].get('config_watch_interval', str(DEFAULT_WATCH_INTERVAL))))
+
+    if webhook_enabled:
+        WEBHOOK = WebhookServer(
+            host=webhook_host,
+            port=int(CONFIG['SETUP'].get('webhook_port', '8080')),
+            on_issue=SERVICE.submit_issue,
+            token=webhook_token,
+            logger=LOGGER
+        )
+        WEBHOOK.start()
+
+    if CONFIG['SETUP'].getboolean('metrics_enabled', False):
+        METRICS = MetricsServer(
+            host=CONFIG['SETUP'].get('metrics_host', '127.0.0.1'),
+            port=int(CONFIG['SETUP'].get('metrics_port', '9100')),
+            collect=SERVICE.collect_metrics,
+            logger=LOGGER
+        )
+        METRICS.start()
 
 
 def kill_processes():
@@ -72,6 +169,14 @@ def kill_processes():
         LOGGER.info("Process %s killed", queue_item.issue_key)
         PROCESS_QUEUE.remove(queue_item)
 
+    if WEBHOOK:
+        WEBHOOK.stop()
+    if METRICS:
+        METRICS.stop()
+    if tracing.TRACER.exporter:
+        tracing.TRACER.exporter.flush()
+    if CONFIG_STORE:
+        CONFIG_STORE.stop()
     SERVICE.stop()
 
 
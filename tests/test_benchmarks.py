@@ -0,0 +1,130 @@
+"""Tests for the package benchmarks"""
+import json
+
+from automation_service import loader
+from benchmarks import logging_overhead
+from benchmarks import replay
+from benchmarks import throughput
+from benchmarks import tlp_load
+from benchmarks import workbook
+from benchmarks.fake_oracle import FakeOracle
+from handlers import jira_handler
+from handlers.update_tlp import TlpUpdateHandler
+
+
+def test_fake_oracle_credit_hold():
+    """Tests the credit hold table kept by the fake database"""
+    oracle = FakeOracle()
+    cursor = oracle.connect('user', 'password', 'dsn', threaded=True).cursor()
+
+    cursor.execute("select enabled from lge_code_lookup where code = :client_code",
+                   client_code='C1')
+    assert cursor.fetchone() is None
+
+    cursor.execute("insert into lge_code_lookup (code, enabled) values (:client_code, :enabled)",
+                   client_code='C1', enabled='Y')
+    cursor.execute("select enabled from lge_code_lookup where code = :client_code",
+                   client_code='C1')
+    assert cursor.fetchone() == ('Y',)
+    assert oracle.statements == 3
+
+
+def test_fake_oracle_tlp():
+    """Tests the tlp of the models kept by the fake database"""
+    oracle = FakeOracle()
+    cursor = oracle.connect('user', 'password', 'dsn', threaded=True).cursor()
+    command_update, command_insert = TlpUpdateHandler.get_insert_update_commands()
+
+    cursor.execute(command_insert, model='M1', tlp=10)
+    cursor.execute(command_insert, model='M1', tlp=20)
+    cursor.execute(command_update, model='M2', tlp=30)
+    cursor.execute(TlpUpdateHandler.get_stored_tlp_query().format(binds=':model_0, :model_1'),
+                   {'model_0': 'M1', 'model_1': 'M2'})
+    assert cursor.fetchall() == [('M1', 10, 'LGBR', 'TMS', 'Y')]
+
+
+def test_percentile():
+    """Tests the nearest rank percentile"""
+    assert throughput.percentile([], 0.5) == 0.0
+    assert throughput.percentile([3, 1, 2, 4], 0.5) == 2
+    assert throughput.percentile(list(range(1, 101)), 0.99) == 99
+
+
+def test_throughput_benchmark(tmp_path):
+    """Tests a small run of the service against the fake Jira and database"""
+    output = tmp_path / 'results.json'
+    report = throughput.main(['--queue-sizes', '2', '--backlogs', '4', '--jira-latency', '0',
+                              '--db-latency', '0', '--connect-latency', '0', '--tlp-rows', '3',
+                              '--timeout', '30', '--output', str(output)])
+
+    result = report['results'][0]
+    assert result['resolved'] == 4
+    assert not result['timed_out']
+    assert result['throughput'] > 0
+    assert result['db_connections'] == 4
+    assert json.loads(output.read_text(encoding='UTF-8')) == report
+
+
+def test_record_and_replay(tmp_path):
+    """Tests that a recorded run is served back to the service by the replay server"""
+    record_file = tmp_path / 'jira.jsonl'
+    result = throughput.run_benchmark(2, 4, ['credit_hold', 'tlp'], tlp_rows=3, timeout=30,
+                                      record_file=str(record_file))
+    assert result.resolved == 4
+
+    exchanges = replay.load_exchanges(str(record_file))
+    result = replay.run_replay(exchanges, throughput.PLUGINS, throughput.BenchmarkService.handlers,
+                               queue_size=2, time_scale=0, idle_timeout=2, timeout=30)
+    assert result.replayed == len(exchanges)
+    assert result.issues == 4
+    assert result.unmatched == 0
+
+
+def test_replay_default_handlers():
+    """Tests that the replay defaults to a handlers file of the package that routes
+    to the handler classes of its plugins"""
+    handlers_file = replay.default_handlers_file()
+    with open(handlers_file, encoding='UTF-8') as handlers:
+        config_handlers = json.load(handlers)
+
+    holder = jira_handler.JiraHandlerData({}, {})
+    loader.load_handlers(config_handlers['plugins'], holder)
+    assert set(config_handlers['handlers'].values()) <= set(holder.handlers_classes)
+
+
+def test_write_tlp_workbook(tmp_path):
+    """Tests the workbooks generated with duplicates, bad values and an invalid header"""
+    handler = TlpUpdateHandler(None, None, None, None, None)
+    valid_file = str(tmp_path / 'TLP_valid.xlsx')
+    workbook.write_tlp_workbook(valid_file, rows=200, duplicates=0.2, bad_values=0.1, seed=1)
+
+    lines = handler.read_xls_file(valid_file)
+    assert len(lines) == 200
+    assert len({model for model, _ in lines}) < 200
+    assert any(not isinstance(tlp, float) for _, tlp in lines)
+
+    invalid_file = str(tmp_path / 'TLP_invalid.xlsx')
+    workbook.write_tlp_workbook(invalid_file, rows=5, invalid=True)
+    assert handler.read_xls_file(invalid_file) is None
+
+
+def test_tlp_load_benchmark(tmp_path):
+    """Tests the measures of the steps of the TLP handler"""
+    results = tlp_load.run_tlp_load(20, str(tmp_path))
+
+    assert [result['step'] for result in results] == ['parse', 'validate', 'load', 'delta']
+    assert results[1]['rejected']
+    assert results[2]['statements'] == 40
+    assert (results[3]['statements'], results[3]['unchanged']) == (1, 20)
+    assert results[0]['peak_memory_bytes_per_10k_rows'] == results[0]['peak_memory_bytes'] * 500
+
+
+def test_logging_overhead_benchmark():
+    """Tests the measures of the logging calls of both modes"""
+    report = logging_overhead.main(['--threads', '2', '--messages', '50'])
+
+    assert [result['mode'] for result in report['results']] == ['sync', 'queue', 'filtered']
+    for result in report['results']:
+        assert result['messages'] == 100
+        assert result['call_p99_ns'] >= result['call_p50_ns'] > 0
+        assert result['written_seconds'] >= result['calls_seconds']
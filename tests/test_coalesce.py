@@ -0,0 +1,70 @@
+"""Tests for module automation_service.coalesce"""
+from types import SimpleNamespace
+
+from automation_service.coalesce import Coalescer
+
+
+KEY = ('CreditHoldHandler', ('C1', 'Incluir'))
+
+
+class Clock:
+    """Clock for testing"""
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_coalescer_follow():
+    """Tests that the tickets of a key wait for the ticket running it"""
+    coalescer = Coalescer()
+    assert not coalescer.follow(KEY, SimpleNamespace(key='TESTE-2'))
+
+    coalescer.lead(KEY, 'TESTE-1')
+    assert not coalescer.follow(KEY, SimpleNamespace(key='TESTE-1'))
+    follower = SimpleNamespace(key='TESTE-2')
+    assert coalescer.follow(KEY, follower)
+    assert coalescer.follow(KEY, follower)
+    assert coalescer.waiting() == 1
+
+    assert coalescer.complete(KEY, 'created') == [follower]
+    assert coalescer.waiting() == 0
+    assert coalescer.outcome(KEY) == 'created'
+    assert not coalescer.follow(KEY, follower)
+
+
+def test_coalescer_window():
+    """Tests that the outcome is kept for the window and not kept on a failure"""
+    clock = Clock()
+    coalescer = Coalescer(window=10, clock=clock)
+    coalescer.lead(KEY, 'TESTE-1')
+    coalescer.complete(KEY, 'created')
+    clock.now = 9
+    assert coalescer.outcome(KEY) == 'created'
+    clock.now = 10
+    assert coalescer.outcome(KEY) is None
+
+    coalescer.lead(KEY, 'TESTE-2')
+    coalescer.complete(KEY)
+    assert coalescer.outcome(KEY) is None
+
+    coalescer = Coalescer(window=0)
+    coalescer.lead(KEY, 'TESTE-1')
+    coalescer.complete(KEY, 'created')
+    assert coalescer.outcome(KEY) is None
+
+
+def test_coalescer_forget():
+    """Tests that the outcomes of an ordering key are dropped when another ticket
+    of the ordering key runs"""
+    coalescer = Coalescer()
+    other = ('CreditHoldHandler', ('C2', 'Incluir'))
+    coalescer.lead(KEY, 'TESTE-1')
+    coalescer.complete(KEY, 'created', order_key=('CREDIT_HOLD', 'C1'))
+    coalescer.lead(other, 'TESTE-2')
+    coalescer.complete(other, 'created', order_key=('CREDIT_HOLD', 'C2'))
+
+    coalescer.forget(('CREDIT_HOLD', 'C1'))
+    assert coalescer.outcome(KEY) is None
+    assert coalescer.outcome(other) == 'created'
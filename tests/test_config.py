@@ -1,7 +1,9 @@
 """Module to test the setup/configuration methods"""
 import configparser
+import json
 import os
 import logging
+import logging.handlers
 import uuid
 from unittest import mock
 import shutil
@@ -16,6 +18,11 @@ from automation_service.config import configdecorator
 from automation_service.config import logdecorator
 from automation_service.config import checks_log_folder
 from automation_service.config import DEFAULT_CONFIG_FILE
+from automation_service.config import QUEUE_LOGGING
+from automation_service.config import get_log_options
+from automation_service.config import stop_logger
+from automation_service import context
+from automation_service import log_handlers
 
 
 class SetLoggerMock(Exception):
@@ -63,13 +70,15 @@ def test_get_config_file_not_found(logger_mock):
         get_config('config.ini', logger_mock)
 
 
-def test_check_log_folder_if_folder_exists():
+def test_check_log_folder_if_folder_exists(tmp_path):
     """Method to test check_log_folder method"""
+    log_folder = tmp_path / 'logs'
+    log_folder.mkdir()
     with mock.patch('os.makedirs') as posix_path_mock:
-        assert checks_log_folder('logs') is False
+        assert checks_log_folder(str(log_folder)) is False
         posix_path_mock.assert_not_called()
 
-        assert checks_log_folder(str(uuid.uuid4())) is True
+        assert checks_log_folder(str(tmp_path / str(uuid.uuid4()))) is True
         posix_path_mock.assert_called_once()
 
 @mock.patch('builtins.open')
@@ -126,7 +135,58 @@ def test_set_logger_if_there_is_already_handlers():
 
     logger = set_logger()
     assert logger.handlers != []
-    assert logger.handlers.__len__() == 2
+    assert logger.handlers.__len__() == 1
+    assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+    assert [type(handler) for handler in QUEUE_LOGGING[logger.name].handlers] == \
+        [logging.StreamHandler, log_handlers.RotatingFileHandler]
+
+
+def test_set_logger_timed_rotation_and_stop(tmp_path):
+    """Method to test set_logger rotating by time and stop_logger"""
+    logger_name = str(uuid.uuid4())
+    logger = set_logger(log_folder=str(tmp_path), logger_name=logger_name, when='midnight',
+                        backup_count=3)
+    file_handler = QUEUE_LOGGING[logger_name].handlers[1]
+    assert isinstance(file_handler, log_handlers.TimedRotatingFileHandler)
+    assert file_handler.backupCount == 3
+
+    logger.info('teste %s', 'timed')
+    stop_logger(logger_name)
+    assert logger.handlers == []
+    assert logger_name not in QUEUE_LOGGING
+    assert 'teste timed' in (tmp_path / 'jira_auto_main.log').read_text(encoding='UTF-8')
+
+
+def test_get_log_options():
+    """Method to test the options of the logger read from the section SETUP"""
+    config = configparser.ConfigParser()
+    config.read_string('[SETUP]\nlog_max_bytes = 100\nlog_when =\nlog_compress = false\n')
+    assert get_log_options(config['SETUP']) == {
+        'max_bytes': 100, 'backup_count': 10, 'when': None, 'compress': False,
+        'log_format': 'text', 'level': 'DEBUG'}
+
+
+def test_set_logger_json_format(tmp_path):
+    """Method to test set_logger writing JSON lines with the context of the ticket"""
+    logger_name = str(uuid.uuid4())
+    logger = set_logger(log_folder=str(tmp_path), logger_name=logger_name,
+                        log_format='json', level='info')
+    assert logger.level == logging.INFO
+    assert isinstance(QUEUE_LOGGING[logger_name].handlers[0].formatter,
+                      log_handlers.ContextFormatter)
+
+    with context.bind(issue_key='TESTE-1', handler_type='TesteHandler'):
+        logger.debug('not written')
+        logger.info('teste %s', 'json')
+    stop_logger(logger_name)
+
+    lines = (tmp_path / 'jira_auto_main.log').read_text(encoding='UTF-8').splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry['message'] == 'teste json'
+    assert entry['issue_key'] == 'TESTE-1'
+    assert entry['handler_type'] == 'TesteHandler'
+    assert entry['level'] == 'INFO'
 
 
 @mock.patch('json.load')
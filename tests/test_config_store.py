@@ -0,0 +1,230 @@
+"""Tests for module automation_service.config_store"""
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from automation_service import config_store
+from automation_service import metrics
+from automation_service.config_store import ConfigStore, FrozenConfigParser
+
+
+CONFIG = '[SETUP]\nprocess_queue_size = {size}\nsleep_time = 30\nmin_sleep_time = 0.5\n'
+
+
+def write_files(folder, size: int = 4, handlers: dict = None) -> None:
+    """Writes the config files for testing, changing their modification time"""
+    (folder / 'config.ini').write_text(CONFIG.format(size=size), encoding='UTF-8')
+    (folder / 'config_handlers.json').write_text(json.dumps({
+        'plugins': ['handlers.credit_hold'],
+        'handlers': handlers or {'TESTE: Credit hold': 'CreditHoldHandler'},
+    }), encoding='UTF-8')
+    for name in ('config.ini', 'config_handlers.json'):
+        stat = os.stat(folder / name)
+        os.utime(folder / name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def get_store(folder) -> ConfigStore:
+    """Gets a store of the files of the folder"""
+    return ConfigStore('config.ini', 'config_handlers.json', config_folder=str(folder),
+                       logger=mock.MagicMock())
+
+
+def test_frozen_config_parser():
+    """Tests that the parser can not be changed after freeze"""
+    parser = FrozenConfigParser()
+    parser.read_string('[SETUP]\nsleep_time = 1\n')
+    parser.freeze()
+
+    assert parser['SETUP']['sleep_time'] == '1'
+    with pytest.raises(TypeError):
+        parser['SETUP']['sleep_time'] = '2'
+    with pytest.raises(TypeError):
+        parser.add_section('JIRA')
+    with pytest.raises(TypeError):
+        parser.read_string('[JIRA]\n')
+
+
+def test_config_store_snapshot(tmp_path):
+    """Tests that the files are parsed once into a snapshot"""
+    write_files(tmp_path)
+    store = get_store(tmp_path)
+
+    with mock.patch('automation_service.config_store.read_config',
+                    wraps=config_store.read_config) as read_config_mock:
+        snapshot = store.snapshot()
+        assert store.snapshot() is snapshot
+        read_config_mock.assert_called_once()
+
+    assert snapshot.version == 1
+    assert (snapshot.process_queue_size, snapshot.sleep_time, snapshot.min_sleep_time) == \
+        (4, 30, 0.5)
+    assert snapshot.plugins == ('handlers.credit_hold',)
+    assert snapshot.handlers == {'TESTE: Credit hold': 'CreditHoldHandler'}
+    assert snapshot.handlers_holder.handlers == snapshot.handlers
+    assert 'CreditHoldHandler' in snapshot.handlers_holder.handlers_classes
+    with pytest.raises(TypeError):
+        snapshot.handlers['TESTE'] = 'Teste'
+    assert store.refresh() is False
+
+
+def test_config_store_refresh(tmp_path):
+    """Tests the swap of the snapshot and the call of the subscribers"""
+    write_files(tmp_path)
+    store = get_store(tmp_path)
+    snapshot = store.snapshot()
+    subscriber = mock.MagicMock()
+    store.subscribe(subscriber)
+
+    write_files(tmp_path, size=8, handlers={'TESTE: Outro': 'CreditHoldHandler'})
+    assert store.refresh() is True
+
+    new_snapshot = store.snapshot()
+    assert new_snapshot.version == 2
+    assert new_snapshot.process_queue_size == 8
+    assert list(new_snapshot.handlers) == ['TESTE: Outro']
+    assert snapshot.process_queue_size == 4
+    subscriber.assert_called_once_with(new_snapshot)
+
+
+@pytest.mark.parametrize(
+    argnames='config,handlers',
+    argvalues=[
+        (CONFIG.format(size=0), None),
+        (CONFIG.format(size='x'), None),
+        ('[SETUP', None),
+        (CONFIG.format(size=2), '{"plugins": "handlers.credit_hold", "handlers": {}}'),
+        (CONFIG.format(size=2), '{"handlers": {}}'),
+        (CONFIG.format(size=2), '{'),
+        (CONFIG.format(size=2), '{"plugins": [], "handlers": {}, '
+                                '"limits": {"CreditHoldHandler": {"max_running": 0}}}'),
+        (CONFIG.format(size=2), '{"plugins": [], "handlers": {}, '
+                                '"limits": {"CreditHoldHandler": {"slots": 1}}}'),
+    ],
+    ids=['Queue size zero', 'Queue size not a number', 'Invalid ini', 'Plugins not a list',
+         'Plugins missing', 'Invalid json', 'Limit zero', 'Unknown limit'],
+)
+def test_config_store_refresh_invalid(tmp_path, config: str, handlers: str):
+    """Tests that an invalid change keeps the current snapshot"""
+    write_files(tmp_path)
+    store = get_store(tmp_path)
+    snapshot = store.snapshot()
+    subscriber = mock.MagicMock()
+    store.subscribe(subscriber)
+
+    write_files(tmp_path)
+    (tmp_path / 'config.ini').write_text(config, encoding='UTF-8')
+    if handlers:
+        (tmp_path / 'config_handlers.json').write_text(handlers, encoding='UTF-8')
+
+    assert store.refresh() is False
+    assert store.snapshot() is snapshot
+    subscriber.assert_not_called()
+    store.logger.error.assert_called_once()
+
+    assert store.refresh() is False
+    store.logger.error.assert_called_once()
+
+
+def test_config_store_refresh_plugin_error(tmp_path):
+    """Tests that a snapshot whose plugins fail to load is rejected before the swap"""
+    write_files(tmp_path)
+    store = get_store(tmp_path)
+    snapshot = store.snapshot()
+    subscriber = mock.MagicMock()
+    store.subscribe(subscriber)
+    rejected = metrics.CONFIG_RELOADS.get(outcome='rejected')
+    applied = metrics.CONFIG_RELOADS.get(outcome='applied')
+
+    write_files(tmp_path, size=8)
+    with mock.patch('automation_service.loader.load_module',
+                    side_effect=SyntaxError('invalid syntax')):
+        assert store.refresh() is False
+
+    assert store.snapshot() is snapshot
+    subscriber.assert_not_called()
+    store.logger.error.assert_called_once()
+    assert metrics.CONFIG_RELOADS.get(outcome='rejected') == rejected + 1
+    assert metrics.CONFIG_RELOADS.get(outcome='applied') == applied
+
+
+def test_config_store_file_not_found(tmp_path):
+    """Tests that the program ends without the config files"""
+    with pytest.raises(SystemExit):
+        get_store(tmp_path).snapshot()
+
+
+def test_config_store_watch(tmp_path):
+    """Tests that the watcher swaps the snapshot in"""
+    write_files(tmp_path)
+    store = get_store(tmp_path)
+    store.snapshot()
+    with mock.patch.object(store, 'refresh') as refresh_mock:
+        store.watch(0.01)
+        store.watch(0.01)
+        for _ in range(100):
+            if refresh_mock.call_count:
+                break
+            store._stop.wait(0.01)
+        store.stop()
+
+    refresh_mock.assert_called()
+    assert not store.watcher.is_alive()
+
+
+def test_get_store():
+    """Tests that the callers of a file share the store"""
+    store = config_store.get_store('config.ini.example')
+    assert config_store.get_store('config.ini.example') is store
+    assert store.handlers_path is None
+    assert store.snapshot().config.sections() == ['JIRA', 'ORACLE', 'SETUP']
+    assert store.watcher.is_alive()
+
+
+def test_get_store_watched(tmp_path):
+    """Tests that the callers of get_store get the changes of the file"""
+    write_files(tmp_path)
+    store = config_store.get_store('config.ini', str(tmp_path), watch_interval=0.01)
+    try:
+        assert store.snapshot().process_queue_size == 4
+        write_files(tmp_path, size=8)
+        for _ in range(200):
+            if store.snapshot().process_queue_size == 8:
+                break
+            store._stop.wait(0.01)
+        assert config_store.get_store('config.ini', str(tmp_path)).snapshot() \
+            .process_queue_size == 8
+    finally:
+        store.stop()
+        config_store.STORES.pop(('config.ini', str(tmp_path)))
+
+
+def test_share_store(tmp_path):
+    """Tests that get_store returns the store of the service once it is shared"""
+    write_files(tmp_path)
+    previous = config_store.get_store('config.ini', str(tmp_path))
+    store = get_store(tmp_path)
+    config_store.share_store(store, 'config.ini', str(tmp_path))
+    try:
+        assert config_store.get_store('config.ini', str(tmp_path)) is store
+        assert not previous.watcher.is_alive()
+    finally:
+        config_store.STORES.pop(('config.ini', str(tmp_path)))
+
+
+def test_config_store_refresh_plugin_changed(tmp_path):
+    """Tests that a change of the source of a plugin produces a new snapshot"""
+    write_files(tmp_path)
+    plugin_file = tmp_path / 'plugin.py'
+    plugin_file.write_text('VERSION = 1\n', encoding='UTF-8')
+    store = get_store(tmp_path)
+    with mock.patch('automation_service.loader.module_file', return_value=str(plugin_file)):
+        snapshot = store.snapshot()
+        assert store.refresh() is False
+
+        plugin_file.write_text('VERSION = 22\n', encoding='UTF-8')
+        assert store.refresh() is True
+
+    assert store.snapshot().version == snapshot.version + 1
+    assert store.snapshot().handlers == snapshot.handlers
@@ -0,0 +1,44 @@
+"""Tests for module automation_service.content_cache"""
+import pytest
+
+from automation_service.content_cache import ContentCache, content_digest
+
+
+def test_content_cache_lookup():
+    """Tests the lookup of the files by their content and by their attachment"""
+    cache = ContentCache()
+    digest = content_digest(b'file')
+    assert cache.lookup('tlp', digest) is None
+    entry = cache.store('tlp', digest, {'M1': 1.0}, attachment_id=10)
+
+    assert cache.lookup('tlp', digest) is entry
+    assert cache.lookup('tlp', attachment_id='10') is entry
+    assert cache.lookup('other', digest) is None
+    assert cache.lookup('tlp', attachment_id='11') is None
+    assert cache.lookup('tlp', digest, attachment_id='11') is entry
+    assert cache.lookup('tlp', attachment_id='11') is entry
+
+
+def test_content_cache_eviction():
+    """Tests the LRU eviction by the number of files and of rows"""
+    cache = ContentCache(max_entries=2, max_rows=5)
+    cache.store('tlp', 'a', {'M1': 1}, attachment_id='1')
+    cache.store('tlp', 'b', {'M2': 2})
+    cache.lookup('tlp', 'a')
+    cache.store('tlp', 'c', {'M3': 3})
+    assert [digest for _, digest in cache.entries] == ['a', 'c']
+
+    cache.store('tlp', 'd', {f'M{index}': index for index in range(4)})
+    assert [digest for _, digest in cache.entries] == ['c', 'd']
+    assert cache.rows == 5
+    assert cache.lookup('tlp', attachment_id='1') is None
+    cache.store('tlp', 'e', {'M9': 9})
+    assert [digest for _, digest in cache.entries] == ['d', 'e']
+    cache.store('tlp', 'f', {f'M{index}': index for index in range(6)})
+    assert [digest for _, digest in cache.entries] == ['d', 'e']
+
+    cache.configure(max_entries=0, max_rows=5)
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        cache.configure(max_entries=-1, max_rows=5)
+
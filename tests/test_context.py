@@ -0,0 +1,26 @@
+"""Tests for module automation_service.context"""
+import threading
+
+from automation_service import context
+
+
+def test_bind():
+    """Tests that the values are bound only inside the block"""
+    assert context.get('issue_key') is None
+    with context.bind(issue_key='TESTE-1', handler_type='CreditHoldHandler'):
+        assert context.get('issue_key') == 'TESTE-1'
+        with context.bind(issue_key='TESTE-2'):
+            assert context.get('issue_key') == 'TESTE-2'
+            assert context.get('handler_type') == 'CreditHoldHandler'
+        assert context.get('issue_key') == 'TESTE-1'
+    assert context.get('issue_key') is None
+
+
+def test_bind_is_per_thread():
+    """Tests that the context of a thread is not seen by the others"""
+    values = []
+    with context.bind(issue_key='TESTE-1'):
+        thread = threading.Thread(target=lambda: values.append(context.get('issue_key')))
+        thread.start()
+        thread.join()
+    assert values == [None]
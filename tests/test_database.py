@@ -7,6 +7,8 @@ import cx_Oracle
 import pytest
 
 from automation_service.database import Oracle, get_mail_list
+from automation_service import metrics
+from automation_service.resilience import CircuitBreakerOpen
 
 class CursorMock:
     """Mock class for cursor."""
@@ -330,3 +332,42 @@ def test_reconnect_to_database(logger_mock, mock_oracle):
     mock_oracle.side_effect = ConnectionError('')
     ret = oracle.reconnect_to_database()
     assert ret is None
+
+
+@mock.patch('cx_Oracle.connect')
+@mock.patch.object(logging, 'Logger')
+def test_oracle_connection_breaker_open(logger_mock, mock_connect):
+    """Test that the connection is not attempted while the breaker is open."""
+    breaker = mock.MagicMock()
+    breaker.call.side_effect = CircuitBreakerOpen('oracle')
+    oracle = Oracle(logger_mock, breaker=breaker)
+
+    assert oracle.create_connection('user', 'password', 'host', 'port', 'sid') is None
+    mock_connect.assert_not_called()
+    logger_mock.error.assert_called_once()
+
+
+@mock.patch.object(logging, 'Logger')
+def test_get_mail_list_without_connection(logger_mock):
+    """Test get_mail_list when the command can not be executed."""
+    oracle = Oracle(logger_mock)
+    oracle.command_execution = mock.MagicMock(return_value=None)
+
+    assert get_mail_list('teste', oracle) == []
+
+
+@mock.patch('cx_Oracle.connect')
+@mock.patch.object(logging, 'Logger')
+def test_get_cursor_records_statement_latency(logger_mock, mock_oracle):
+    """Test that the statements executed on the cursor are timed."""
+    oracle = Oracle(logger_mock)
+    oracle.create_connection('user', 'password', 'host', 'port', 'sid')
+    statement = "select enabled from lge_metrics_test where code = :code"
+    before = metrics.ORACLE_STATEMENT_DURATION.count(statement='select lge_metrics_test')
+
+    cursor = oracle.get_cursor()
+    cursor.execute(statement, code='teste')
+
+    oracle.connection.cursor.return_value.execute.assert_called_once_with(statement, code='teste')
+    assert metrics.ORACLE_STATEMENT_DURATION.count(
+        statement='select lge_metrics_test') == before + 1
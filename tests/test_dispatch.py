@@ -0,0 +1,157 @@
+"""Tests for module automation_service.dispatch"""
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from automation_service import dispatch
+from automation_service.dispatch import DispatchKey, DispatchPolicy, DispatchQueue
+
+
+HANDLERS = {'TESTE: Credit hold': 'CreditHoldHandler', 'TESTE: TLP': 'TlpUpdateHandler'}
+
+
+def get_ticket(key: str, priority: str = 'Medium', created: str = '2024-01-10T10:00:00.000+0000',
+               duedate: str = None, summary: str = 'TESTE: Credit hold') -> SimpleNamespace:
+    """Gets a ticket for testing"""
+    return SimpleNamespace(key=key, fields=SimpleNamespace(
+        priority=SimpleNamespace(name=priority), created=created, duedate=duedate,
+        summary=summary))
+
+
+class Clock:
+    """Clock for testing"""
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def pop_all(queue: DispatchQueue) -> list:
+    """Returns the keys of the tickets in the order they are taken"""
+    keys = []
+    while queue:
+        keys.append(queue.pop().key)
+    return keys
+
+
+def test_parse_timestamp():
+    """Tests the dates and datetimes of Jira"""
+    assert dispatch.parse_timestamp('2024-01-10') == 1704844800.0
+    assert dispatch.parse_timestamp('2024-01-10T01:00:00.000+0100') == 1704844800.0
+    assert dispatch.parse_timestamp('teste') is None
+    assert dispatch.parse_timestamp(None) is None
+
+
+def test_dispatch_policy_from_config():
+    """Tests the policy read from the section SETUP"""
+    policy = DispatchPolicy.from_config({
+        'dispatch_order': 'handler, SLA', 'dispatch_queue_size': '5', 'priority_aging': '0',
+        'handler_priority': 'TlpUpdateHandler: 1, CreditHoldHandler: 2', 'sla_field': '',
+        'search_prefetch': '1',
+    })
+    assert policy.order == (DispatchKey.HANDLER, DispatchKey.SLA)
+    assert policy.handler_ranks == {'TlpUpdateHandler': 1, 'CreditHoldHandler': 2}
+    assert (policy.size, policy.aging_interval, policy.sla_field) == (5, 0, 'duedate')
+    assert DispatchPolicy.from_config({}) == DispatchPolicy()
+    assert [policy.search_size(slots) for slots in (0, 2, 10)] == [1, 3, 5]
+    assert [policy.search_size(2, waiting) for waiting in (1, 10)] == [4, 5]
+
+    for config in ({'dispatch_order': 'teste'}, {'dispatch_queue_size': '0'},
+                   {'handler_priority': 'CreditHoldHandler'}, {'search_prefetch': '-1'}):
+        with pytest.raises(ValueError):
+            DispatchPolicy.from_config(config)
+
+
+def test_dispatch_queue_order():
+    """Tests the order by priority, due date and age"""
+    queue = DispatchQueue(DispatchPolicy(aging_interval=0))
+    queue.refresh([
+        get_ticket('T-1', priority='Low'),
+        get_ticket('T-2', created='2024-01-01T10:00:00.000+0000'),
+        get_ticket('T-3', duedate='2024-02-01'),
+        get_ticket('T-4', priority='Highest', created=None),
+        get_ticket('T-5', priority=None),
+        get_ticket('T-6'),
+    ], HANDLERS)
+
+    assert [ticket.key for ticket in queue.peek(2)] == ['T-4', 'T-3']
+    assert len(queue) == 6
+    assert pop_all(queue) == ['T-4', 'T-3', 'T-2', 'T-6', 'T-1', 'T-5']
+    assert queue.pop() is None
+    assert queue.peek(2) == []
+
+
+def test_dispatch_queue_handler_order():
+    """Tests the order by the rank of the handlers"""
+    queue = DispatchQueue(DispatchPolicy(order=(DispatchKey.HANDLER, DispatchKey.AGE),
+                                         handler_ranks={'TlpUpdateHandler': 0}))
+    queue.refresh([get_ticket('T-1'), get_ticket('T-2', summary='TESTE: TLP'),
+                   get_ticket('T-3', summary='TESTE: Outro')], HANDLERS)
+    assert pop_all(queue) == ['T-2', 'T-1', 'T-3']
+
+
+def test_dispatch_queue_aging():
+    """Tests that a low priority waiting long enough goes ahead of a new high priority"""
+    clock = Clock()
+    queue = DispatchQueue(DispatchPolicy(aging_interval=60), clock=clock)
+    queue.refresh([get_ticket('T-1', priority='Lowest')], HANDLERS)
+
+    clock.now = 150
+    queue.refresh([get_ticket('T-1', priority='Lowest'), get_ticket('T-2', priority='Medium'),
+                   get_ticket('T-3', priority='Highest')], HANDLERS)
+    assert queue.candidates['T-1'].enqueued_at == 0
+    assert pop_all(queue) == ['T-3', 'T-1', 'T-2']
+
+
+def test_dispatch_queue_refresh_and_bound():
+    """Tests that the search replaces the tickets and the least urgent are dropped"""
+    queue = DispatchQueue(DispatchPolicy(size=2, aging_interval=0))
+    queue.refresh([get_ticket('T-1', priority='Low'), get_ticket('T-2', priority='High'),
+                   get_ticket('T-3', priority='Medium')], HANDLERS)
+    assert sorted(queue.candidates) == ['T-2', 'T-3']
+
+    queue.refresh([get_ticket('T-4')], HANDLERS)
+    assert 'T-4' in queue and len(queue) == 1
+    assert queue.candidates['T-4'].due == math.inf
+
+    queue.configure(DispatchPolicy(size=1, priorities=('Medium',)))
+    assert queue.candidates['T-4'].priority_rank == 0
+
+
+def test_dispatch_queue_on_drop():
+    """Tests that the tickets dropped by the bound or by a search are given to on_drop"""
+    dropped = []
+    queue = DispatchQueue(DispatchPolicy(size=2, aging_interval=0),
+                          on_drop=lambda ticket: dropped.append(ticket.key))
+    queue.refresh([get_ticket('T-1', priority='Low'), get_ticket('T-2', priority='High')],
+                  HANDLERS)
+    queue.add(get_ticket('T-3', priority='Highest'), 'CreditHoldHandler')
+    assert dropped == ['T-1']
+
+    queue.refresh([], HANDLERS)
+    assert dropped == ['T-1', 'T-2']
+
+    queue.configure(DispatchPolicy(size=1))
+    queue.add(get_ticket('T-4', priority='Lowest'), 'CreditHoldHandler')
+    assert dropped == ['T-1', 'T-2', 'T-4']
+    assert list(queue.candidates) == ['T-3']
+
+
+def test_dispatch_queue_add_and_accept():
+    """Tests the tickets put outside the search and the tickets refused by the pools"""
+    queue = DispatchQueue(DispatchPolicy(aging_interval=0))
+    queue.refresh([get_ticket('T-1', priority='High'),
+                   get_ticket('T-2', priority='Low', summary='TESTE: TLP')], HANDLERS)
+    queue.add(get_ticket('T-3', priority='Highest'), 'CreditHoldHandler')
+    assert queue.waiting() == {'CreditHoldHandler': 2, 'TlpUpdateHandler': 1}
+
+    queue.refresh([], HANDLERS)
+    assert list(queue.candidates) == ['T-3']
+
+    queue.add(get_ticket('T-4', priority='Low', summary='TESTE: TLP'), 'TlpUpdateHandler')
+    ticket = queue.pop(lambda candidate: candidate.handler_type != 'CreditHoldHandler')
+    assert ticket.key == 'T-4'
+    assert queue.pop(lambda candidate: False) is None
+    assert 'T-3' in queue
@@ -1,11 +1,16 @@
 """Module to test the handlers, very basic tests on this case."""
+from benchmarks import workbook
 from handlers import jira_handler
 from handlers import credit_hold
 from handlers import update_tlp
 from handlers import user_handlers
+from automation_service import content_cache
+from automation_service import prefetch
+from automation_service import snapshot
 from typing import Callable
 import threading
 import pytest
+from unittest import mock
 
 @pytest.mark.parametrize(
     argnames='module,handler_class',
@@ -24,3 +29,272 @@ def test_jira_handler(module, handler_class):
     assert issubclass(handler_class, threading.Thread)
     assert hasattr(handler_class, 'run')
     assert callable(getattr(handler_class, 'run'))
+
+
+def test_add_handler_requires_apply_outcome():
+    """Test that a handler that defines entity_key must define apply_outcome."""
+    holder = jira_handler.JiraHandlerData({}, {})
+    base = {'run': lambda self: None}
+    entity_key = staticmethod(lambda ticket: ticket.key)
+
+    with pytest.raises(TypeError):
+        holder.add_handler(type('EntityHandler', (jira_handler.JiraHandler,),
+                                {**base, 'entity_key': entity_key}))
+
+    holder.add_handler(type('SharedHandler', (jira_handler.JiraHandler,), {
+        **base, 'entity_key': entity_key, 'apply_outcome': lambda self, outcome: None}))
+    holder.add_handler(credit_hold.CreditHoldHandler)
+    assert list(holder.handlers_classes) == ['SharedHandler', 'CreditHoldHandler']
+
+
+def test_jira_handler_skips_steps_done_on_journal():
+    """Test that transitions and comments recorded on the journal are not repeated."""
+    handler = credit_hold.CreditHoldHandler(mock.MagicMock(key='TESTE-1'), None,
+                                            mock.MagicMock(), mock.MagicMock(), None)
+    handler.journal = mock.MagicMock()
+    handler.journal.is_step_done.return_value = True
+    handler.set_status(jira_handler.Status.TAKE.value)
+    handler.include_comment('teste')
+    handler.jira_session.transition_issue.assert_not_called()
+    handler.jira_session.add_comment.assert_not_called()
+
+    handler.journal.is_step_done.return_value = False
+    handler.set_status(jira_handler.Status.TAKE.value)
+    handler.jira_session.transition_issue.assert_called_once()
+    handler.journal.step.assert_called_once_with('TESTE-1', 'transition:101')
+
+
+def get_credit_hold_ticket(key: str, client_code: str, operation: str) -> mock.MagicMock:
+    """Gets a credit hold ticket for testing"""
+    ticket = mock.MagicMock(key=key)
+    ticket.fields.customfield_11701 = client_code
+    ticket.fields.customfield_11700.value = operation
+    return ticket
+
+
+def test_batch_handler_ticket_scope():
+    """Test that the failure of a ticket of a batch does not end the others."""
+    tickets = [mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')]
+    handler = credit_hold.CreditHoldHandler(tickets, None, mock.MagicMock(),
+                                            mock.MagicMock(), None)
+    assert handler.tickets == tickets
+    assert credit_hold.CreditHoldHandler(None, None, None, None, None).tickets == []
+
+    done = []
+    for ticket in handler.tickets:
+        with handler.ticket_scope(ticket):
+            assert handler.ticket is ticket
+            if ticket.key == 'TESTE-1':
+                raise ValueError('teste')
+            done.append(ticket.key)
+
+    assert done == ['TESTE-2']
+    assert list(handler.failed) == ['TESTE-1']
+    assert handler.ticket is tickets[0]
+
+
+def test_credit_hold_include_many():
+    """Test that the clients of a batch are looked up and changed together."""
+    handler = credit_hold.CreditHoldHandler([], None, mock.MagicMock(), mock.MagicMock(), None)
+    handler.database = mock.MagicMock()
+    cursor = handler.database.get_cursor.return_value
+    cursor.fetchall.return_value = [('C2', 'Y'), ('C3', 'N')]
+
+    statuses = handler.credit_hold_include_many(
+        [('C1', 'Y'), ('C2', 'Y'), ('C3', 'Y'), ('C4', 'N'), ('C1', 'N')])
+
+    assert statuses == ['created', 'exists', 'updated', 'error', 'updated']
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1] == {
+        'code_0': 'C1', 'code_1': 'C2', 'code_2': 'C3', 'code_3': 'C4'}
+    insert, update = cursor.executemany.call_args_list
+    assert insert[0][1] == [{'client_code': 'C1', 'enabled': 'N'}]
+    assert update[0][1] == [{'client_code': 'C3', 'enabled': 'Y'}]
+    handler.database.connection.commit.assert_called_once()
+
+
+def test_credit_hold_run_batch():
+    """Test that each ticket of a batch gets its own comment and transition."""
+    tickets = [get_credit_hold_ticket('TESTE-1', 'C1', 'Incluir'),
+               get_credit_hold_ticket('TESTE-2', 'C2', 'Incluir')]
+    handler = credit_hold.CreditHoldHandler(tickets, None, mock.MagicMock(),
+                                            mock.MagicMock(), None)
+    handler.database = mock.MagicMock()
+    handler.database.get_cursor.return_value.fetchall.return_value = [('C2', 'Y')]
+
+    handler.run()
+
+    comments = [call[0] for call in handler.jira_session.add_comment.call_args_list]
+    assert comments[0] == (tickets[0], handler.possible_outcomes['created'])
+    assert comments[2] == (tickets[1], handler.possible_outcomes['exists'])
+    resolved = [call[0][0] for call in handler.jira_session.transition_issue.call_args_list
+                if call[0][1] == jira_handler.Status.RESOLVE.value]
+    assert resolved == tickets
+    assert handler.failed == {}
+
+
+def test_credit_hold_shared_outcome():
+    """Test the entity key and the outcome shared by the tickets of the same client."""
+    ticket = get_credit_hold_ticket('TESTE-1', 'C1', 'Incluir')
+    assert credit_hold.CreditHoldHandler.entity_key(ticket) == ('C1', 'Incluir')
+    assert jira_handler.JiraHandler.entity_key(ticket) is None
+
+    handler = credit_hold.CreditHoldHandler(ticket, None, mock.MagicMock(),
+                                            mock.MagicMock(), None)
+    handler.database = mock.MagicMock()
+    handler.database.get_cursor.return_value.fetchall.return_value = []
+    handler.run()
+    assert handler.outcomes == {'TESTE-1': 'created'}
+
+    follower = get_credit_hold_ticket('TESTE-2', 'C1', 'Incluir')
+    handler = credit_hold.CreditHoldHandler(follower, None, mock.MagicMock(),
+                                            mock.MagicMock(), None)
+    handler.apply_outcome('created')
+    handler.jira_session.add_comment.assert_any_call(
+        follower, handler.possible_outcomes['created'])
+    handler.jira_session.transition_issue.assert_called_with(
+        follower, jira_handler.Status.RESOLVE.value)
+    assert credit_hold.CreditHoldHandler.ordering_key(follower) == ('CREDIT_HOLD', 'C1')
+    assert jira_handler.JiraHandler.ordering_key(follower) is None
+
+
+def test_tlp_download_uses_ticket_attachments(tmp_path, monkeypatch):
+    """Test that the TLP file is downloaded with the attachment of the ticket snapshot."""
+    monkeypatch.chdir(tmp_path)
+    ticket = snapshot.TicketSnapshot('TESTE-1', fields={'attachment': [
+        {'id': '10', 'filename': 'TLP_1.xlsx',
+         'content': 'https://jira.local/secure/attachment/10/TLP_1.xlsx'}]})
+    handler = update_tlp.TlpUpdateHandler(ticket, None, mock.MagicMock(), mock.MagicMock(), None)
+    handler.jira_session._session.get.return_value.content = b'tlp'
+
+    assert handler.download_tlp_file() == 'TLP_1.xlsx'
+    assert handler.valid_file
+    assert (tmp_path / 'TLP_1.xlsx').read_bytes() == b'tlp'
+    handler.jira_session._session.get.assert_called_once_with(
+        'https://jira.local/secure/attachment/10/TLP_1.xlsx', headers={'Accept': '*/*'})
+    handler.jira_session.search_issues.assert_not_called()
+    handler.jira_session.attachment.assert_not_called()
+
+    handler.ticket = snapshot.TicketSnapshot('TESTE-2', fields={'attachment': [
+        {'id': '11', 'filename': 'notes.txt', 'content': 'https://jira.local/11'}]})
+    assert handler.download_tlp_file() is None
+    assert not handler.valid_file
+    handler.ticket = snapshot.TicketSnapshot('TESTE-3')
+    assert handler.download_tlp_file() is None
+    assert handler.jira_session._session.get.call_count == 1
+
+
+def test_tlp_download_takes_prefetched_file(tmp_path, monkeypatch):
+    """Test that the TLP file prefetched on the spool is not downloaded again."""
+    monkeypatch.chdir(tmp_path)
+    ticket = snapshot.TicketSnapshot('TESTE-1', fields={'attachment': [
+        {'id': '10', 'filename': 'TLP_1.xlsx', 'content': 'https://jira.local/10'}]})
+    assert update_tlp.TlpUpdateHandler.ticket_attachment(ticket).id == '10'
+    assert jira_handler.JiraHandler.ticket_attachment(ticket) is None
+
+    handler = update_tlp.TlpUpdateHandler(ticket, None, mock.MagicMock(), mock.MagicMock(), None)
+    handler.spool = prefetch.AttachmentSpool(directory=str(tmp_path / 'spool'))
+    (tmp_path / 'spool').mkdir()
+    handler.spool.put('TESTE-1', '10', b'tlp')
+
+    assert handler.download_tlp_file() == 'TLP_1.xlsx'
+    assert (tmp_path / 'TLP_1.xlsx').read_bytes() == b'tlp'
+    handler.jira_session._session.get.assert_not_called()
+    assert len(handler.spool) == 0
+
+
+def get_tlp_handler(key: str, attachment_id: str, content: bytes) -> update_tlp.TlpUpdateHandler:
+    """Gets a TLP handler for testing, downloading the content informed"""
+    ticket = snapshot.TicketSnapshot(key, fields={'attachment': [
+        {'id': attachment_id, 'filename': f'TLP_{key}.xlsx', 'content': 'https://jira.local/1'}]})
+    handler = update_tlp.TlpUpdateHandler(ticket, None, mock.MagicMock(), mock.MagicMock(), None)
+    handler.jira_session._session.get.return_value.content = content
+    handler.database = mock.MagicMock()
+    return handler
+
+
+def test_tlp_cached_file(tmp_path, monkeypatch):
+    """Test that a TLP file uploaded again is not parsed, and is only written when
+    the database does not hold its values."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(content_cache, 'CACHE', content_cache.ContentCache())
+    content = workbook.build_tlp_workbook(3)
+
+    first = get_tlp_handler('TESTE-1', '10', content)
+    first.run()
+    cursor = first.database.get_cursor.return_value
+    assert cursor.execute.call_count == 1
+    inserted = cursor.executemany.call_args[0][1]
+    assert len(inserted) == 3
+
+    again = get_tlp_handler('TESTE-2', '11', content)
+    again.database.get_cursor.return_value.fetchall.return_value = [
+        (row['model'], row['tlp']) + update_tlp.TLP_SET_VALUES for row in inserted]
+    with mock.patch.object(again, 'read_xls_file') as read_xls_file:
+        again.run()
+    read_xls_file.assert_not_called()
+    again.database.get_cursor.return_value.execute.assert_called_once()
+    again.database.get_cursor.return_value.executemany.assert_not_called()
+    again.jira_session.transition_issue.assert_called_with(
+        again.ticket, jira_handler.Status.RESOLVE.value)
+
+    repair = get_tlp_handler('TESTE-5', '13', content)
+    repair.run()
+    assert repair.database.get_cursor.return_value.executemany.call_args[0][1] == inserted
+
+    other = get_tlp_handler('TESTE-3', '12', workbook.build_tlp_workbook(2, seed=1))
+    other.run()
+    same_attachment = get_tlp_handler('TESTE-4', '10', b'')
+    same_attachment.run()
+    same_attachment.jira_session._session.get.assert_not_called()
+    assert same_attachment.database.get_cursor.return_value.executemany.call_count == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_tlp_load_delta(monkeypatch):
+    """Test that only the models new or changed are written, and the counts are commented."""
+    monkeypatch.setattr(update_tlp, 'TLP_CHUNK_SIZE', 2)
+    handler = update_tlp.TlpUpdateHandler(None, None, mock.MagicMock(), mock.MagicMock(), None)
+    handler.database = mock.MagicMock()
+    cursor = handler.database.get_cursor.return_value
+    cursor.fetchall.side_effect = [
+        [('M1', 10, 'LGBR', 'TMS', 'Y'), ('M2', 20, 'LGBR', 'TMS', 'Y')],
+        [('M3', 30, 'LGBR', 'TMS', 'N')],
+    ]
+
+    counts = handler.load_tlp_rows({'M1': 10, 'M2': 25, 'M3': 30, 'M4': 40})
+
+    assert counts == {'created': 1, 'changed': 2, 'unchanged': 1}
+    assert [call[0][1] for call in cursor.execute.call_args_list] == [
+        {'model_0': 'M1', 'model_1': 'M2'}, {'model_0': 'M3', 'model_1': 'M4'}]
+    assert 'in (:model_0, :model_1)' in cursor.execute.call_args[0][0]
+    update, insert = cursor.executemany.call_args_list
+    assert update[0][1] == [{'model': 'M2', 'tlp': 25}, {'model': 'M3', 'tlp': 30}]
+    assert insert[0][1] == [{'model': 'M4', 'tlp': 40}]
+    handler.database.connection.commit.assert_called_once()
+
+    cursor.fetchall.side_effect = [[('M1', 10, 'LGBR', 'TMS', 'Y')]]
+    assert handler.load_tlp_rows({'M1': 10}) == {'created': 0, 'changed': 0, 'unchanged': 1}
+    assert cursor.executemany.call_count == 2
+    handler.database.connection.commit.assert_called_once()
+
+
+def test_tlp_comment_counts(tmp_path, monkeypatch):
+    """Test that the Jira comment reports the models created, changed and unchanged."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(content_cache, 'CACHE', content_cache.ContentCache())
+    content = workbook.build_tlp_workbook(3)
+    handler = get_tlp_handler('TESTE-1', '10', content)
+    handler.run()
+    handler.jira_session.add_comment.assert_called_with(
+        handler.ticket, "Tlp processado, ticket finalizado. "
+        "Criados: 3, alterados: 0, sem alteração: 0.")
+
+    again = get_tlp_handler('TESTE-2', '10', content)
+    again.database.get_cursor.return_value.fetchall.return_value = [
+        (row['model'], row['tlp']) + update_tlp.TLP_SET_VALUES
+        for row in handler.database.get_cursor.return_value.executemany.call_args[0][1]]
+    again.run()
+    again.jira_session.add_comment.assert_called_with(
+        again.ticket, "Tlp processado, ticket finalizado. "
+        "Criados: 0, alterados: 0, sem alteração: 3.")
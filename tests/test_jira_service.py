@@ -6,6 +6,14 @@ import jira
 import requests
 
 from automation_service import jira_service
+from automation_service import metrics
+from automation_service import resilience
+from automation_service import trace_report
+from automation_service import tracing
+from automation_service.config_store import ConfigSnapshot, FrozenConfigParser
+from automation_service.dispatch import DispatchPolicy
+from automation_service.pools import HandlerLimit
+from automation_service.snapshot import TicketSnapshot
 from handlers import jira_handler
 
 
@@ -19,9 +27,10 @@ DATABASE_CONFIG = {}
 
 
 class MockHandler(mock.MagicMock):
-    """Class to mock jira handler"""
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+    """Class to mock jira handler, the arguments of the handlers are not passed
+    to MagicMock, where the ticket would be taken as the spec"""
+    def __init__(self, *args, **kwargs) -> None: # pylint: disable=unused-argument
+        super().__init__()
 
     def start(self):
         """Start mock handler"""
@@ -42,6 +51,7 @@ def get_jira_instance(
         mail_list_lookup_code='teste',
         PROCESS_QUEUE_SIZE=process_queue_size,
         sleep_time=60,
+        breakers=resilience.CircuitBreakers(),
     )
     return service
 
@@ -86,6 +96,11 @@ def test_jira_service_run(
     ):
     """Method to test Jira service run"""
     service = get_jira_instance(mock_logger)
+    mock_get_config_handler_file.return_value = {
+        'plugins': ['handlers.credit_hold'],
+        'handlers': {'TESTE: Credit hold': 'CreditHoldHandler'},
+        'limits': {'CreditHoldHandler': {'max_running': 2}},
+    }
 
     with mock.patch.object(service, '_service_loop') as mock_service_loop:
         service.run()
@@ -100,6 +115,97 @@ def test_jira_service_run(
         assert isinstance(service.handlers_holder, jira_handler.JiraHandlerData)
 
         mock_service_loop.assert_called_once()
+        assert service.pools.utilisation()['CreditHoldHandler']['max_running'] == 2
+
+
+@mock.patch('automation_service.loader.load_handlers')
+@mock.patch('logging.Logger')
+def test_jira_service_run_config_store(mock_logger: mock.MagicMock,
+                                       mock_load_handlers: mock.MagicMock):
+    """Method to test Jira service run following the snapshots of the config store"""
+    service = get_jira_instance(mock_logger)
+    store = mock.MagicMock()
+    store.snapshot.return_value = get_snapshot(process_queue_size=3)
+    service.config_store = store
+
+    with mock.patch.object(service, '_service_loop') as mock_service_loop:
+        service.run()
+
+    mock_load_handlers.assert_called_once_with(('handlers.credit_hold',),
+                                               service.handlers_holder)
+    store.subscribe.assert_called_once_with(service.apply_config)
+    assert service.process_queue_size == 3
+    assert service.config_version == 1
+    mock_service_loop.assert_called_once()
+
+
+def get_snapshot(version: int = 1, process_queue_size: int = 2, sleep_time: int = 30,
+                 min_sleep_time: float = 2, handlers: dict = None,
+                 handlers_holder: jira_handler.JiraHandlerData = None) -> ConfigSnapshot:
+    """Gets a snapshot of the configuration for testing"""
+    parser = FrozenConfigParser()
+    parser.read_string(f'[SETUP]\nprocess_queue_size = {process_queue_size}\n'
+                       f'sleep_time = {sleep_time}\nmin_sleep_time = {min_sleep_time}\n')
+    return ConfigSnapshot(version, parser.freeze(), ('handlers.credit_hold',),
+                          handlers or {'TESTE: Credit hold': 'CreditHoldHandler'},
+                          handlers_holder=handlers_holder)
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_apply_config(mock_logger: mock.MagicMock):
+    """Tests the swap of the routing, queue size and sleep times"""
+    running = jira_service.JiraProcess(mock.MagicMock(), mock.MagicMock(), 'TESTE-1')
+    running.process.is_alive.return_value = True
+    service = get_jira_instance(mock_logger, process_queue=[running, mock.MagicMock()],
+                                process_queue_size=4)
+    service.apply_config(get_snapshot(handlers={'TESTE: Credit hold': 'CreditHoldHandler'}))
+    holder = service.handlers_holder
+    assert service._get_handler('TESTE: Outro') is None
+    assert service._free_slots() == 0
+
+    service.apply_config(get_snapshot(version=2, process_queue_size=1, sleep_time=10,
+                                      min_sleep_time=20,
+                                      handlers={'TESTE: Outro': 'CreditHoldHandler'}))
+
+    assert service.handlers_holder is not holder
+    assert service._get_handler('TESTE: Outro').__name__ == 'CreditHoldHandler'
+    assert service._get_handler('TESTE: Credit hold') is None
+    assert service._check_queue_size() is True
+    assert service.process_queue[0] is running
+    assert (service.sleep_time, service.scheduler.min_interval,
+            service.scheduler.max_interval) == (10, 10, 10)
+    assert service.config_version == 2
+    assert service.scheduler.event.is_set()
+
+
+@mock.patch('automation_service.loader.load_handlers')
+@mock.patch('logging.Logger')
+def test_jira_service_apply_config_loaded(mock_logger: mock.MagicMock,
+                                          mock_load_handlers: mock.MagicMock):
+    """Tests that the handlers loaded by the store with the snapshot are swapped in"""
+    service = get_jira_instance(mock_logger)
+    holder = jira_handler.JiraHandlerData({}, {'TESTE: Outro': 'CreditHoldHandler'})
+    service.apply_config(get_snapshot(version=2, handlers_holder=holder))
+
+    mock_load_handlers.assert_not_called()
+    assert service.handlers_holder is holder
+    assert service.config_version == 2
+
+
+@mock.patch('automation_service.loader.load_handlers')
+@mock.patch('logging.Logger')
+def test_jira_service_apply_config_error(mock_logger: mock.MagicMock,
+                                         mock_load_handlers: mock.MagicMock):
+    """Tests that the routing is kept when the plugins of the snapshot fail to load"""
+    service = get_jira_instance(mock_logger)
+    holder = service.handlers_holder = mock.MagicMock()
+    mock_load_handlers.side_effect = ModuleNotFoundError('handlers.teste')
+
+    with pytest.raises(ModuleNotFoundError):
+        service.apply_config(get_snapshot(process_queue_size=1))
+
+    assert service.handlers_holder is holder
+    assert service.process_queue_size == 10
 
 
 @mock.patch('logging.Logger')
@@ -116,8 +222,8 @@ def test_jira_service_stop(mock_logger: mock.MagicMock):
 
 @pytest.mark.parametrize(
     argnames='queue_size,max_queue_size,result,info_call_count',
-    argvalues=[(10, 10, True, 1), (1, 0, False, 0)],
-    ids=['Full', 'Empty'],
+    argvalues=[(10, 10, True, 1), (1, 0, True, 1), (0, 1, False, 0)],
+    ids=['Full', 'Above size', 'Empty'],
 )
 @mock.patch('logging.Logger')
 def test_jira_service_check_queue_size(
@@ -194,7 +300,7 @@ def test_jira_service_service_loop_check_queue_list_empty(mock_logger: mock.Magi
 
         mock_check_queue_size.return_value = False
         service._loop_message = _loop_message
-        service.connection.search_issues.return_value = []
+        service.connection.search_issues.return_value = {'issues': []}
         service._service_loop()
 
         assert mock_set_jira_connection.call_count == 1
@@ -224,7 +330,8 @@ def test_jira_service_service_loop_check_queue_list_not_empty(mock_logger: mock.
 
         mock_check_queue_size.return_value = False
         service._loop_message = _loop_message
-        service.connection.search_issues.return_value = [mock.MagicMock()]
+        service.connection.search_issues.return_value = {
+            'issues': [{'key': 'TESTE-1', 'fields': {'summary': 'teste'}}]}
         service._service_loop()
 
         assert mock_set_jira_connection.call_count == 1
@@ -260,7 +367,8 @@ def test_jira_service_service_loop_check_queue_list_not_empty_but_no_slot_on_que
         service.mock_check_queue_size = mock_check_queue_size
         mock_check_queue_size.side_effect = check_queue_size
         service._loop_message = _loop_message
-        service.connection.search_issues.return_value = [mock.MagicMock()]
+        service.connection.search_issues.return_value = {
+            'issues': [{'key': 'TESTE-1', 'fields': {'summary': 'teste'}}]}
         service._service_loop()
 
         assert mock_set_jira_connection.call_count == 1
@@ -297,7 +405,7 @@ def test_jira_service_create_process_no_handler_found(mock_logger: mock.MagicMoc
     with mock.patch.object(service, '_get_handler') as mock_get_handler:
         mock_get_handler.return_value = None
         ticket = mock.MagicMock()
-        service._create_process(ticket=ticket)
+        assert service._create_process(ticket=ticket) is False
         mock_get_handler.assert_called_once()
 
         assert service.process_queue == []
@@ -311,12 +419,14 @@ def test_jira_service_create_process_runtime_error(mock_logger: mock.MagicMock):
         handler = MockHandler
         mock_get_handler.return_value = handler
         ticket = mock.MagicMock()
+        service.connection = mock.MagicMock()
         service._create_process(ticket=ticket)
         mock_get_handler.assert_called_once()
 
         assert service.process_queue.__len__() == 0
         assert service.logger.error.call_count == 1
-        assert ticket.comment.call_count == 1
+        service.connection.add_comment.assert_called_once_with(
+            ticket, 'Process error: Mock handler start')
 
 
 @pytest.mark.parametrize(
@@ -382,11 +492,9 @@ def test_jira_service_get_handler_key_error(
     argvalues=[(True, 60, True), (False, 60, False)],
     ids=['Sleep', 'No Sleep'],
 )
-@mock.patch('time.sleep')
 @mock.patch('logging.Logger')
 def test_jira_service_loop_message(
         mock_logger: mock.MagicMock,
-        mock_sleep: mock.MagicMock,
         sleep_value: bool,
         sleep_time: int,
         result: bool
@@ -396,8 +504,9 @@ def test_jira_service_loop_message(
 
     service.sleep_time = sleep_time
     service.sleep = sleep_value
-    service._loop_message()
-    assert mock_sleep.called is result
+    with mock.patch.object(service.scheduler, 'wait') as mock_wait:
+        service._loop_message()
+        assert mock_wait.called is result
     assert mock_logger.info.call_count == 1
 
 
@@ -444,3 +553,716 @@ def test_jira_service_set_jira_connection_error_on_jira(
     service.set_jira_connection()
     assert service.connection is None
     assert mock_logger.error.called is True
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_create_process_skips_finished_ticket(mock_logger: mock.MagicMock):
+    """Tests that tickets finished on the journal are not dispatched again"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.journal = mock.MagicMock()
+    service.journal.is_done.return_value = True
+    with mock.patch.object(service, '_get_handler') as mock_get_handler:
+        assert service._create_process(ticket=mock.MagicMock()) is False
+        mock_get_handler.assert_not_called()
+        assert service.process_queue == []
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_create_process_records_dispatch(mock_logger: mock.MagicMock):
+    """Tests that the dispatch is recorded on the journal"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.journal = mock.MagicMock()
+    service.journal.is_done.return_value = False
+    service.journal.is_step_done.return_value = False
+    handler = mock.MagicMock(__name__='MockHandler')
+    with mock.patch.object(service, '_get_handler') as mock_get_handler:
+        mock_get_handler.return_value = handler
+        ticket = mock.MagicMock(key='TESTE-1')
+        service._create_process(ticket=ticket)
+
+        service.journal.dispatch.assert_called_once_with('TESTE-1', 'MockHandler')
+        service.journal.step.assert_called_once_with('TESTE-1', 'assign')
+        assert service.process_queue.__len__() == 1
+        handler.return_value.start.assert_called_once()
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_supervised_run(mock_logger: mock.MagicMock):
+    """Tests that the end of the handler is recorded on the journal"""
+    service = get_jira_instance(mock_logger)
+    service.journal = mock.MagicMock()
+    run = mock.MagicMock()
+    queue_item = jira_service.JiraProcess(mock.MagicMock(run=run), None, 'TESTE-1')
+
+    with mock.patch.object(service.scheduler, 'wake') as mock_wake:
+        service._supervised_run(queue_item)()
+        run.assert_called_once()
+        service.journal.finish.assert_called_once_with('TESTE-1')
+        assert queue_item.status == 'finished'
+        mock_wake.assert_called_once()
+
+    run.side_effect = ValueError('teste')
+    queue_item = jira_service.JiraProcess(mock.MagicMock(run=run), None, 'TESTE-2')
+    service._supervised_run(queue_item)()
+    service.journal.fail.assert_called_once_with('TESTE-2', 'teste')
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_supervised_run_span(mock_logger: mock.MagicMock):
+    """Tests that the run of the handler is traced with the issue key"""
+    service = get_jira_instance(mock_logger)
+    queue_item = jira_service.JiraProcess(mock.MagicMock(), None, 'TESTE-1')
+    exporter = mock.MagicMock()
+
+    with mock.patch.object(tracing.TRACER, 'exporter', exporter):
+        service._supervised_run(queue_item, 'MockHandler')()
+
+    span = exporter.export.call_args[0][0]
+    assert (span.name, span.trace_id) == ('handler.run', 'TESTE-1')
+    assert span.attributes == {'handler': 'MockHandler'}
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_reap_processes(mock_logger: mock.MagicMock):
+    """Tests that the ended processes are removed from the queue"""
+    running = jira_service.JiraProcess(mock.MagicMock(), None, 'TESTE-1')
+    finished = jira_service.JiraProcess(mock.MagicMock(), None, 'TESTE-2', 'finished')
+    dead = jira_service.JiraProcess(mock.MagicMock(), None, 'TESTE-3')
+    dead.process.is_alive.return_value = False
+    service = get_jira_instance(mock_logger, process_queue=[running, finished, dead])
+
+    service.reap_processes()
+    assert service.process_queue == [running]
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_resume_from_journal(mock_logger: mock.MagicMock):
+    """Tests that the unfinished tickets are dispatched again"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.connection = mock.MagicMock()
+    service.pending_resume = [('TESTE-1', 'CreditHoldHandler')]
+    service.connection.issue.return_value.raw = {
+        'key': 'TESTE-1', 'fields': {'summary': 'teste', 'description': 'teste'}}
+    with mock.patch.object(service, '_create_process') as mock_create_process:
+        service._resume_from_journal()
+
+        service.connection.issue.assert_called_once_with(
+            'TESTE-1', fields='summary,priority,created,duedate', expand=None)
+        mock_create_process.assert_called_once_with(
+            TicketSnapshot('TESTE-1', fields={'summary': 'teste'}), resumed=True)
+        assert service.pending_resume == []
+
+
+@pytest.mark.parametrize(
+    argnames='error',
+    argvalues=[requests.exceptions.ConnectionError('reset'),
+               jira.exceptions.JIRAError(status_code=503, text='unavailable')],
+    ids=['Connection error', 'Server error'],
+)
+@mock.patch('logging.Logger')
+def test_jira_service_resume_from_journal_postponed(mock_logger: mock.MagicMock,
+                                                    error: Exception):
+    """Tests that a ticket that can not be fetched is kept to be resumed later"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.connection = mock.MagicMock()
+    service.journal = mock.MagicMock()
+    service.breakers.configure(resilience.JIRA, {'retry_attempts': '2', 'retry_base_delay': '0'})
+    service.pending_resume = [('TESTE-1', 'CreditHoldHandler'), ('TESTE-2', 'CreditHoldHandler')]
+    service.connection.issue.side_effect = error
+
+    with mock.patch.object(service, '_create_process') as mock_create_process:
+        service._resume_from_journal()
+
+    mock_create_process.assert_not_called()
+    assert service.connection.issue.call_count == 2
+    assert service.pending_resume == [('TESTE-1', 'CreditHoldHandler'),
+                                      ('TESTE-2', 'CreditHoldHandler')]
+    service.journal.fail.assert_not_called()
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_resume_from_journal_not_found(mock_logger: mock.MagicMock):
+    """Tests that a ticket that does not exist anymore is recorded as failed"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.connection = mock.MagicMock()
+    service.journal = mock.MagicMock()
+    service.pending_resume = [('TESTE-1', 'CreditHoldHandler')]
+    service.connection.issue.side_effect = jira.exceptions.JIRAError(status_code=404)
+
+    service._resume_from_journal()
+
+    assert service.pending_resume == []
+    service.journal.fail.assert_called_once()
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_search_tickets_breaker_open(mock_logger: mock.MagicMock):
+    """Tests that the search is skipped while the Jira breaker is open"""
+    service = get_jira_instance(mock_logger)
+    service.connection = mock.MagicMock()
+    service.breakers.configure(resilience.JIRA, {'breaker_threshold': '1'}).record_failure()
+
+    assert service._search_tickets() == []
+    service.connection.search_issues.assert_not_called()
+    assert service.breaker_states() == {'jira': 'open'}
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_search_tickets_error(mock_logger: mock.MagicMock):
+    """Tests that the connection is dropped when the search fails"""
+    service = get_jira_instance(mock_logger)
+    service.breakers.configure(resilience.JIRA, {'retry_attempts': '1'})
+    service.connection = mock.MagicMock()
+    service.connection.search_issues.side_effect = jira.exceptions.JIRAError('teste')
+
+    assert service._search_tickets() == []
+    assert service.connection is None
+    assert mock_logger.error.called is True
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_create_process_dependency_unavailable(mock_logger: mock.MagicMock):
+    """Tests that the ticket is postponed while a dependency of the handler is down"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.breakers.configure(resilience.ORACLE, {'breaker_threshold': '1'}).record_failure()
+    handler = mock.MagicMock(__name__='MockHandler', dependencies=(resilience.ORACLE,))
+    with mock.patch.object(service, '_get_handler') as mock_get_handler:
+        mock_get_handler.return_value = handler
+        assert service._create_process(ticket=mock.MagicMock()) is False
+
+        handler.assert_not_called()
+        assert service.process_queue == []
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_submit_issue(mock_logger: mock.MagicMock):
+    """Tests the issues received by the webhook"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.handlers_holder = jira_handler.JiraHandlerData({}, {'teste': 'Mock'})
+    issue = {'key': 'TESTE-1', 'fields': {'summary': 'teste'}}
+
+    assert service.submit_issue(issue) is True
+    assert service.submit_issue(issue) is False
+    assert service.submit_issue({'key': 'TESTE-2', 'fields': {'summary': 'error'}}) is False
+    assert list(service.pending_issues) == [issue]
+
+    service.process_queue.append(jira_service.JiraProcess(None, None, 'TESTE-3'))
+    assert service.submit_issue({'key': 'TESTE-3', 'fields': {'summary': 'teste'}}) is False
+    assert service.submit_issue(
+        {'key': 'TESTE-4) OR (key = X-1', 'fields': {'summary': 'teste'}}) is False
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_dispatch_pending_issues(mock_logger: mock.MagicMock):
+    """Tests that the issues received by the webhook are dispatched when they
+    still match the master query"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.search_query = 'project = TESTE and assignee in (EMPTY) ORDER BY updated DESC'
+    service.connection = mock.MagicMock()
+    service.connection.search_issues.return_value = {'issues': [
+        {'key': 'TESTE-1', 'fields': {'summary': 'teste'}}]}
+    for issue_key in ('TESTE-1', 'TESTE-2'):
+        service.pending_issues.append({'key': issue_key, 'fields': {'summary': 'teste'}})
+        service.pending_keys.add(issue_key)
+    with mock.patch.object(service, '_create_process') as mock_create_process:
+        mock_create_process.return_value = True
+        assert service._dispatch_pending_issues() == 1
+
+        ticket = mock_create_process.call_args[0][0]
+        assert isinstance(ticket, TicketSnapshot)
+        assert ticket.key == 'TESTE-1'
+        mock_create_process.assert_called_once()
+        assert service.pending_keys == set()
+        assert not service.pending_issues
+
+    assert service.connection.search_issues.call_args[0][0] == \
+        '(project = TESTE and assignee in (EMPTY)) AND key in (TESTE-1, TESTE-2)'
+    assert service.connection.search_issues.call_args[1]['maxResults'] == 2
+    assert service.last_search is None
+
+
+@mock.patch('time.monotonic')
+@mock.patch('logging.Logger')
+def test_jira_service_search_due(mock_logger: mock.MagicMock, mock_monotonic: mock.MagicMock):
+    """Tests the reconciliation search when the tickets are received by the webhook"""
+    service = get_jira_instance(mock_logger)
+    assert service._search_due()
+
+    service.reconcile_interval = 300
+    assert service._search_due()
+    service.last_search = 1000
+    mock_monotonic.return_value = 1100
+    assert not service._search_due()
+    mock_monotonic.return_value = 1300
+    assert service._search_due()
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_poll_metrics(mock_logger: mock.MagicMock):
+    """Tests the counters of tickets found, dispatched and skipped"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.connection = mock.MagicMock()
+    before = {event: metrics.TICKETS.get(event=event)
+              for event in ('found', 'dispatched', 'skipped')}
+    with mock.patch.object(service, '_search_tickets') as mock_search_tickets, \
+        mock.patch.object(service, '_create_process') as mock_create_process:
+        mock_search_tickets.return_value = [mock.MagicMock(), mock.MagicMock()]
+        mock_create_process.side_effect = [True, False]
+        service._poll()
+
+    assert metrics.TICKETS.get(event='found') == before['found'] + 2
+    assert metrics.TICKETS.get(event='dispatched') == before['dispatched'] + 1
+    assert metrics.TICKETS.get(event='skipped') == before['skipped'] + 1
+
+    service.collect_metrics()
+    assert metrics.QUEUE_SIZE.get() == 10
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_poll_dispatch_queue(mock_logger: mock.MagicMock):
+    """Tests that the free slots go to the most urgent tickets, the others wait"""
+    service = get_jira_instance(mock_logger, process_queue=[], process_queue_size=1)
+    service.connection = mock.MagicMock()
+    low, high = mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')
+    low.fields.priority.name, high.fields.priority.name = 'Low', 'High'
+
+    def create_process(ticket):
+        service.process_queue.append(ticket)
+        return True
+
+    with mock.patch.object(service, '_search_tickets') as mock_search_tickets, \
+        mock.patch.object(service, '_create_process') as mock_create_process:
+        mock_search_tickets.return_value = [low, high]
+        mock_create_process.side_effect = create_process
+        service._poll()
+        mock_create_process.assert_called_once_with(high)
+        assert 'TESTE-1' in service.dispatch_queue
+
+        service.process_queue.clear()
+        service._poll()
+
+    mock_search_tickets.assert_called_once()
+    mock_create_process.assert_called_with(low)
+    assert len(service.dispatch_queue) == 0
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_create_process_pool_full(mock_logger: mock.MagicMock):
+    """Tests that a ticket waits on the dispatch queue while the pool of its handler is full"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.pools.configure({'MockHandler': HandlerLimit(max_running=1)})
+    handler = mock.MagicMock(__name__='MockHandler')
+    with mock.patch.object(service, '_get_handler') as mock_get_handler:
+        mock_get_handler.return_value = handler
+        assert service._create_process(mock.MagicMock(key='TESTE-1')) is True
+        assert service._create_process(mock.MagicMock(key='TESTE-2')) is False
+
+    handler.return_value.start.assert_called_once()
+    assert 'TESTE-2' in service.dispatch_queue
+    assert service.dispatch_queue.waiting() == {'MockHandler': 1}
+
+    service.collect_metrics()
+    assert metrics.POOL_RUNNING.get(handler='MockHandler') == 1
+    assert metrics.POOL_LIMIT.get(handler='MockHandler') == 1
+    assert metrics.POOL_WAITING.get(handler='MockHandler') == 1
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_supervised_run_releases_pool(mock_logger: mock.MagicMock):
+    """Tests that the slot and the database connection are given back when the run ends"""
+    service = get_jira_instance(mock_logger)
+    service.pools.configure({'MockHandler': HandlerLimit(max_running=1, max_connections=1)})
+    assert service.pools.acquire('MockHandler', uses_database=True)
+    process = mock.MagicMock()
+    queue_item = jira_service.JiraProcess(process, None, 'TESTE-1')
+
+    service._supervised_run(queue_item, 'MockHandler', uses_database=True)()
+
+    process.database.close_connection.assert_called_once()
+    assert service.pools.utilisation()['MockHandler']['running'] == 0
+    assert service.pools.utilisation()['MockHandler']['connections'] == 0
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_dispatch_candidates_pools(mock_logger: mock.MagicMock):
+    """Tests that a full pool does not block the tickets of the other handler types"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.handlers_holder = jira_handler.JiraHandlerData(
+        {}, {'slow': 'SlowHandler', 'fast': 'FastHandler'})
+    service.pools.configure({'SlowHandler': HandlerLimit(max_running=1)})
+    service.pools.acquire('SlowHandler')
+    slow, fast = mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')
+    slow.fields.summary, fast.fields.summary = 'slow', 'fast'
+    slow.fields.priority.name, fast.fields.priority.name = 'High', 'Low'
+    service.dispatch_queue.refresh([slow, fast], service.handlers_holder.handlers)
+
+    with mock.patch.object(service, '_create_process') as mock_create_process:
+        mock_create_process.return_value = True
+        assert service._dispatch_candidates() == 1
+
+    mock_create_process.assert_called_once_with(fast)
+    assert 'TESTE-1' in service.dispatch_queue
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_poll_search_size(mock_logger: mock.MagicMock):
+    """Tests that the search fetches the free slots plus the prefetch margin"""
+    service = get_jira_instance(mock_logger, process_queue=[mock.MagicMock()],
+                                process_queue_size=3)
+    service.connection = mock.MagicMock()
+    service.connection.search_issues.return_value = {
+        'issues': [{'key': f'TESTE-{index}', 'fields': {}} for index in range(4)]}
+    before = metrics.TICKETS.get(event='unused')
+
+    def create_process(ticket):
+        service.process_queue.append(ticket)
+        return True
+
+    with mock.patch.object(service, '_create_process') as mock_create_process, \
+        mock.patch.object(service, 'reap_processes'):
+        mock_create_process.side_effect = create_process
+        service._poll()
+
+    service.connection.search_issues.assert_called_once_with(
+        '', maxResults=4, fields=['summary', 'priority', 'created', 'duedate'],
+        expand=None, json_result=True)
+    assert mock_create_process.call_count == 2
+    assert len(service.dispatch_queue) == 2
+    assert metrics.TICKETS.get(event='unused') == before + 2
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_poll_search_size_blocked(mock_logger: mock.MagicMock):
+    """Tests that the tickets blocked on a full pool do not hide the tickets of
+    the other handler types from the search"""
+    service = get_jira_instance(mock_logger, process_queue=[], process_queue_size=5)
+    service.connection = mock.MagicMock()
+    service.handlers_holder = jira_handler.JiraHandlerData(
+        {}, {'slow': 'SlowHandler', 'fast': 'FastHandler'})
+    service.pools.configure({'SlowHandler': HandlerLimit(max_running=1)})
+    unassigned = [{'key': f'SLOW-{index}', 'fields': {'summary': 'slow'}}
+                  for index in range(20)] + [{'key': 'FAST-1', 'fields': {'summary': 'fast'}}]
+    service.connection.search_issues.side_effect = \
+        lambda *args, maxResults, **kwargs: {'issues': unassigned[:maxResults]}
+
+    def create_process(ticket):
+        service.pools.acquire(service.handlers_holder.handlers[ticket.fields.summary])
+        service.process_queue.append(ticket)
+        unassigned[:] = [issue for issue in unassigned if issue['key'] != ticket.key]
+        return True
+
+    with mock.patch.object(service, '_create_process') as mock_create_process, \
+        mock.patch.object(service, 'reap_processes'):
+        mock_create_process.side_effect = create_process
+        for _ in range(4):
+            service._poll()
+
+    assert [call[1]['maxResults'] for call in
+            service.connection.search_issues.call_args_list] == [7, 12, 18, 24]
+    assert [ticket.key for ticket in service.process_queue] == ['SLOW-0', 'FAST-1']
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_batch_handler(mock_logger: mock.MagicMock):
+    """Tests that the tickets of a batch handler gathered on a poll run on one process"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.connection = mock.MagicMock()
+    service.journal = mock.MagicMock()
+    service.journal.is_done.return_value = False
+    process = mock.MagicMock()
+    handler = type('BatchHandler', (jira_handler.BatchJiraHandler,),
+                   {'batch_size': 5, 'run': lambda self: None})
+    service.connection.search_issues.return_value = {
+        'issues': [{'key': f'TESTE-{index}', 'fields': {'summary': 'teste'}}
+                   for index in range(3)]}
+    tickets = [TicketSnapshot(f'TESTE-{index}', fields={'summary': 'teste'})
+               for index in range(3)]
+
+    with mock.patch.object(service, '_get_handler') as mock_get_handler, \
+        mock.patch.object(handler, '__new__') as mock_new:
+        mock_get_handler.return_value = handler
+        mock_new.return_value = process
+        service._poll()
+
+    assert mock_new.call_count == 1
+    assert mock_new.call_args[0][1] == tickets
+    process.start.assert_called_once()
+    assert [item.process for item in service.process_queue] == [process] * 3
+    assert [item.status for item in service.process_queue] == ['running'] * 3
+
+    process.failed = {'TESTE-1': ValueError('teste')}
+    process.run()
+    service.journal.fail.assert_called_once_with('TESTE-1', 'teste')
+    assert service.journal.finish.call_count == 2
+    service.reap_processes()
+    assert service.process_queue == []
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_batch_handler_batch_size(mock_logger: mock.MagicMock):
+    """Tests that a batch is started when it reaches the batch size"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    handler = type('BatchHandler', (jira_handler.BatchJiraHandler,), {'batch_size': 2})
+
+    with mock.patch.object(service, '_get_handler') as mock_get_handler, \
+        mock.patch.object(service, '_start_batch') as mock_start_batch:
+        mock_get_handler.return_value = handler
+        assert service._create_process(mock.MagicMock(key='TESTE-1'))
+        mock_start_batch.assert_not_called()
+        assert service.process_queue[0].status == 'batched'
+        service.reap_processes()
+        assert len(service.process_queue) == 1
+
+        service._create_process(mock.MagicMock(key='TESTE-2'))
+        mock_start_batch.assert_called_once_with('BatchHandler')
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_batch_handler_trace(mock_logger: mock.MagicMock, tmp_path):
+    """Tests that the tickets of a batch are traced and reported by handler type"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    service.journal = mock.MagicMock()
+
+    def run(self) -> None:
+        for _ in range(2):
+            for ticket in self.tickets:
+                with self.ticket_scope(ticket), tracing.span('handler.set_status'):
+                    pass
+
+    handler = type('BatchHandler', (jira_handler.BatchJiraHandler,), {'run': run})
+    process = handler([mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')],
+                      None, mock_logger, mock.MagicMock(), None)
+    queue_items = [jira_service.JiraProcess(process, None, ticket.key)
+                   for ticket in process.tickets]
+    tracer = tracing.Tracer(tracing.JsonlExporter(str(tmp_path / 'spans.jsonl')))
+
+    with mock.patch.object(tracing, 'TRACER', tracer):
+        service._supervised_batch_run(queue_items, 'CreditHoldHandler', False, process.run)()
+    tracer.exporter.flush()
+
+    with open(tracer.exporter.trace_file, encoding='UTF-8') as trace_file:
+        spans = trace_report.load_spans(trace_file)
+    result = trace_report.breakdown(spans)
+    assert list(result) == ['CreditHoldHandler']
+    assert result['CreditHoldHandler']['tickets'] == 2
+    assert 'handler.set_status' in result['CreditHoldHandler']
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_coalesce(mock_logger: mock.MagicMock):
+    """Tests that the tickets of the same entity share the execution of the first one"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    handler = type('EntityHandler', (jira_handler.JiraHandler,), {
+        'entity_key': staticmethod(lambda ticket: ticket.fields.customfield_11701),
+        'run': lambda self: self.record_outcome('created'),
+        'apply_outcome': mock.MagicMock(),
+    })
+    leader, follower = mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')
+    leader.fields.customfield_11701 = follower.fields.customfield_11701 = 'C1'
+
+    with mock.patch.object(service, '_get_handler') as mock_get_handler, \
+        mock.patch.object(handler, 'start') as mock_start:
+        mock_get_handler.return_value = handler
+        assert service._create_process(leader) is True
+        assert service._create_process(follower) is False
+        assert mock_start.call_count == 1
+        assert service.coalescer.waiting() == 1
+
+        service.process_queue[0].process.run()
+        assert 'TESTE-2' in service.dispatch_queue
+        assert service.coalescer.outcome(('EntityHandler', 'C1')) == 'created'
+
+        before = metrics.TICKETS.get(event='coalesced')
+        service.reap_processes()
+        assert service._create_process(service.dispatch_queue.pop()) is True
+        assert metrics.TICKETS.get(event='coalesced') == before + 1
+
+    process = service.process_queue[0].process
+    assert process.database_config is None
+    assert service.process_queue[0].entity is None
+    process.run()
+    handler.apply_outcome.assert_called_once_with('created')
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_coalesce_stale_outcome(mock_logger: mock.MagicMock):
+    """Tests that an outcome is not shared after another ticket of its ordering key ran"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    handler = type('EntityHandler', (jira_handler.JiraHandler,), {
+        'entity_key': staticmethod(lambda ticket: tuple(ticket.fields.customfield_11701)),
+        'ordering_key': staticmethod(lambda ticket: ticket.fields.customfield_11701[0]),
+        'run': lambda self: self.record_outcome(self.ticket.fields.customfield_11701[1]),
+        'apply_outcome': mock.MagicMock(),
+    })
+    tickets = [mock.MagicMock(key=f'TESTE-{index}') for index in range(4)]
+    for ticket, operation in zip(tickets, ('Incluir', 'Excluir', 'Incluir', 'Incluir')):
+        ticket.fields.customfield_11701 = ('C1', operation)
+
+    with mock.patch.object(service, '_get_handler') as mock_get_handler, \
+        mock.patch.object(handler, 'start'):
+        mock_get_handler.return_value = handler
+        for ticket in tickets[:2]:
+            assert service._create_process(ticket) is True
+            service.process_queue[-1].process.run()
+            service.reap_processes()
+
+        assert service.coalescer.outcome(('EntityHandler', ('C1', 'Incluir'))) is None
+        assert service._create_process(tickets[2]) is True
+        assert service.process_queue[0].entity == ('EntityHandler', ('C1', 'Incluir'))
+        assert service._create_process(tickets[3]) is False
+        assert service.sequencer.key_of('TESTE-2') == 'C1'
+
+        service.process_queue[0].process.run()
+        service.reap_processes()
+        assert service._create_process(service.dispatch_queue.pop()) is True
+
+    assert service.process_queue[0].entity is None
+    assert service.sequencer.key_of('TESTE-3') == 'C1'
+    service.process_queue[0].process.run()
+    handler.apply_outcome.assert_called_once_with('Incluir')
+    assert service.sequencer.key_of('TESTE-3') is None
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_ordering_key(mock_logger: mock.MagicMock):
+    """Tests that the tickets of the same ordering key run one at a time"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    handler = type('OrderedHandler', (jira_handler.JiraHandler,), {
+        'ordering_key': staticmethod(lambda ticket: ticket.fields.customfield_11701),
+        'run': lambda self: None,
+    })
+    first, second, other = (mock.MagicMock(key=f'TESTE-{index}') for index in range(3))
+    first.fields.customfield_11701 = second.fields.customfield_11701 = 'C1'
+    other.fields.customfield_11701 = 'C2'
+
+    with mock.patch.object(service, '_get_handler') as mock_get_handler, \
+        mock.patch.object(handler, 'start') as mock_start:
+        mock_get_handler.return_value = handler
+        assert service._create_process(first) is True
+        assert service._create_process(second) is False
+        assert service._create_process(other) is True
+        assert mock_start.call_count == 2
+        assert len(service.sequencer) == 1
+
+        service.process_queue[0].process.run()
+        assert 'TESTE-1' in service.dispatch_queue
+        service.reap_processes()
+        assert service._dispatch_candidates() == 1
+
+    assert [item.issue_key for item in service.process_queue] == ['TESTE-1']
+    assert service.sequencer.key_of('TESTE-1') == 'C1'
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_abandon_order(mock_logger: mock.MagicMock):
+    """Tests that a ticket given the key but not started hands it to the next one"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    first, second = mock.MagicMock(key='TESTE-1'), mock.MagicMock(key='TESTE-2')
+    service.sequencer.acquire('C1', first)
+    service.sequencer.acquire('C1', second)
+
+    service._abandon_order(first)
+
+    assert service.sequencer.key_of('TESTE-2') == 'C1'
+    assert 'TESTE-2' in service.dispatch_queue
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_dispatch_queue_drop_releases_order(mock_logger: mock.MagicMock):
+    """Tests that a ticket holding an ordering key dropped from the dispatch queue
+    hands the key to the next ticket"""
+    service = get_jira_instance(mock_logger)
+    service.dispatch_queue.configure(DispatchPolicy(size=1))
+    first, second, other = (mock.MagicMock(key=f'TESTE-{index}') for index in range(1, 4))
+    first.fields.priority.name, other.fields.priority.name = 'Low', 'High'
+    second.fields.priority.name = 'Highest'
+    service.sequencer.acquire('C1', first)
+    service.sequencer.acquire('C1', second)
+    service.dispatch_queue.add(first, 'MockHandler')
+
+    service.dispatch_queue.add(other, 'OtherHandler')
+
+    assert 'TESTE-1' not in service.dispatch_queue
+    assert service.sequencer.key_of('TESTE-1') is None
+    assert service.sequencer.key_of('TESTE-2') == 'C1'
+    assert 'TESTE-2' in service.dispatch_queue
+    assert len(service.sequencer) == 0
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_snapshot_fields(mock_logger: mock.MagicMock):
+    """Tests that the tickets keep the base fields and the fields of their handler"""
+    service = get_jira_instance(mock_logger)
+    handler = type('FieldsHandler', (jira_handler.JiraHandler,),
+                   {'ticket_fields': ('customfield_1',), 'run': lambda self: None})
+    service.handlers_holder = jira_handler.JiraHandlerData(
+        {'FieldsHandler': handler}, {'teste': 'FieldsHandler'})
+    assert service._search_fields() == [
+        'summary', 'priority', 'created', 'duedate', 'customfield_1']
+
+    fields = {'summary': 'teste', 'customfield_1': 'C1', 'customfield_2': 'C2'}
+    ticket = service._snapshot({'key': 'TESTE-1', 'fields': fields})
+    assert ticket.fields.raw == {'summary': 'teste', 'customfield_1': 'C1'}
+    ticket = service._snapshot({'key': 'TESTE-2', 'fields': {**fields, 'summary': 'outro'}})
+    assert ticket.fields.raw == {'summary': 'outro'}
+    assert service._search_expand() is None
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_search_expand(mock_logger: mock.MagicMock):
+    """Tests that the expands declared by the handlers are fetched by the search"""
+    service = get_jira_instance(mock_logger)
+    handler = type('ExpandHandler', (jira_handler.JiraHandler,),
+                   {'ticket_expand': ('changelog',), 'run': lambda self: None})
+    service.handlers_holder = jira_handler.JiraHandlerData(
+        {'ExpandHandler': handler}, {'teste': 'ExpandHandler'})
+    service.connection = mock.MagicMock()
+    service.connection.search_issues.return_value = {'issues': [
+        {'key': 'TESTE-1', 'fields': {'summary': 'teste'},
+         'changelog': {'total': 0}, 'renderedFields': {}}]}
+
+    tickets = service._search_tickets(10)
+
+    assert service.connection.search_issues.call_args[1]['expand'] == 'changelog'
+    assert tickets[0].expanded.raw == {'changelog': {'total': 0}}
+    assert tickets[0].expanded.changelog.total == 0
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_set_ticket_assignee_snapshot(mock_logger: mock.MagicMock):
+    """Tests that a snapshot is assigned through the Jira resource of its key"""
+    service = get_jira_instance(mock_logger)
+    service.connection = mock.MagicMock()
+    ticket = TicketSnapshot('TESTE-1', '10001', url='http://jira/rest/api/2/issue/10001')
+    with mock.patch('jira.Issue') as mock_issue:
+        service.set_ticket_assignee(ticket, 'teste')
+
+    assert mock_issue.call_args[1]['raw'] == {
+        'key': 'TESTE-1', 'id': '10001', 'self': 'http://jira/rest/api/2/issue/10001'}
+    mock_issue.return_value.update.assert_called_once_with(
+        fields={"assignee": {"name": "teste"}})
+
+
+@mock.patch('logging.Logger')
+def test_jira_service_prefetch(mock_logger: mock.MagicMock):
+    """Tests that the attachments of the next tickets are prefetched and the ones
+    of the tickets that left the dispatch queue are evicted"""
+    service = get_jira_instance(mock_logger, process_queue=[])
+    handler = type('AttachmentHandler', (jira_handler.JiraHandler,), {
+        'ticket_attachment': staticmethod(lambda ticket: ticket.fields.attachment[0]),
+        'run': lambda self: None})
+    service.handlers_holder = jira_handler.JiraHandlerData(
+        {'AttachmentHandler': handler}, {'teste': 'AttachmentHandler', 'outro': 'Outro'})
+    service.prefetcher = mock.MagicMock(depth=2)
+    tickets = [TicketSnapshot(f'TESTE-{index}', fields={
+        'summary': 'teste', 'attachment': [{'id': str(index)}]}) for index in range(3)]
+    other = TicketSnapshot('TESTE-9', fields={'summary': 'outro'})
+    service.dispatch_queue.refresh([other] + tickets, service.handlers_holder.handlers)
+
+    service._prefetch()
+
+    jobs = service.prefetcher.schedule.call_args[0][0]
+    assert [(issue_key, attachment.id) for issue_key, attachment in jobs] == [('TESTE-0', '0')]
+    keep = service.prefetcher.spool.retain.call_args[0][0]
+    assert keep('TESTE-2')
+    assert not keep('TESTE-5')
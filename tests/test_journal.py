@@ -0,0 +1,92 @@
+"""Tests for module automation_service.journal"""
+import uuid
+from unittest import mock
+
+from automation_service.journal import WorkJournal
+
+
+def get_journal(tmp_path, journal_file: str = None) -> WorkJournal:
+    """Gets a journal instance for testing"""
+    return WorkJournal(
+        journal_file=journal_file or f'{uuid.uuid4()}.db',
+        journal_folder=str(tmp_path),
+        logger=mock.MagicMock()
+    )
+
+
+def test_journal_wal_mode(tmp_path):
+    """Tests that the journal is created in WAL mode"""
+    journal = get_journal(tmp_path)
+    mode = journal.connection.execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_journal_dispatch_step_finish(tmp_path):
+    """Tests the lifecycle of a ticket on the journal"""
+    journal = get_journal(tmp_path)
+
+    journal.dispatch('TESTE-1', 'CreditHoldHandler')
+    assert journal.unfinished() == [('TESTE-1', 'CreditHoldHandler')]
+    assert not journal.is_done('TESTE-1')
+
+    journal.step('TESTE-1', 'transition:101')
+    assert journal.is_step_done('TESTE-1', 'transition:101')
+    assert not journal.is_step_done('TESTE-1', 'transition:71')
+
+    journal.finish('TESTE-1')
+    assert journal.is_done('TESTE-1')
+    assert journal.unfinished() == []
+    assert not journal.is_step_done('TESTE-1', 'transition:101')
+
+
+def test_journal_reload_after_restart(tmp_path):
+    """Tests that the state is rebuilt from the file after a restart"""
+    journal_file = f'{uuid.uuid4()}.db'
+    journal = get_journal(tmp_path, journal_file)
+    journal.dispatch('TESTE-1', 'CreditHoldHandler')
+    journal.step('TESTE-1', 'transition:101')
+    journal.dispatch('TESTE-2', 'TlpUpdateHandler')
+    journal.fail('TESTE-2', 'error')
+    journal.close()
+
+    journal = get_journal(tmp_path, journal_file)
+    assert journal.unfinished() == [('TESTE-1', 'CreditHoldHandler')]
+    assert journal.is_step_done('TESTE-1', 'transition:101')
+    assert not journal.is_done('TESTE-2')
+    assert journal.failures == {'TESTE-2': 1}
+
+
+def test_journal_failed_retried(tmp_path):
+    """Tests that a failed ticket is processed again, keeping its steps, until
+    it fails max_failures times"""
+    journal = WorkJournal(journal_file=f'{uuid.uuid4()}.db', journal_folder=str(tmp_path),
+                          logger=mock.MagicMock(), max_failures=2)
+    journal.dispatch('TESTE-1', 'CreditHoldHandler')
+    journal.step('TESTE-1', 'transition:101')
+    journal.fail('TESTE-1', 'ORA-03113')
+    assert not journal.is_done('TESTE-1')
+    assert journal.unfinished() == []
+    assert journal.is_step_done('TESTE-1', 'transition:101')
+
+    journal.dispatch('TESTE-1', 'CreditHoldHandler')
+    journal.fail('TESTE-1', 'ORA-03113')
+    assert journal.is_done('TESTE-1')
+    journal.logger.warning.assert_called_once()
+
+    journal.dispatch('TESTE-2', 'CreditHoldHandler')
+    journal.fail('TESTE-2', 'ORA-03113')
+    journal.dispatch('TESTE-2', 'CreditHoldHandler')
+    journal.finish('TESTE-2')
+    assert journal.is_done('TESTE-2')
+    assert 'TESTE-2' not in journal.failures
+
+
+def test_journal_is_append_only(tmp_path):
+    """Tests that every event is a new row on the journal"""
+    journal = get_journal(tmp_path)
+    journal.dispatch('TESTE-1', 'CreditHoldHandler')
+    journal.step('TESTE-1', 'assign')
+    journal.finish('TESTE-1')
+
+    rows = journal.connection.execute('select event from journal order by id').fetchall()
+    assert [row[0] for row in rows] == ['dispatched', 'step', 'finished']
@@ -1,4 +1,6 @@
 """Tests for module automation_service.loader"""
+import os
+import sys
 from unittest import mock
 
 import pytest
@@ -30,3 +32,89 @@ def test_load_handlers(mock_handler: mock.MagicMock) -> None:
     assert isinstance(holder.handlers_classes, dict)
     assert holder.handlers_classes != {} # pylint: disable=use-implicit-booleaness-not-comparison
     assert mock_handler.call_count == 1
+
+
+PLUGIN_SOURCE = '''
+VERSION = {version}
+
+
+class PluginHandler:
+    """Handler of the plugin for testing"""
+    def __init__(self, *args) -> None:
+        self.args = args
+
+    def version(self) -> int:
+        """Returns the version of the module"""
+        return VERSION
+
+
+def initialize(handlers_holder) -> None:
+    """Initializes the handler of the plugin"""
+    handlers_holder.add_handler(PluginHandler)
+'''
+
+
+@pytest.fixture(name='plugin')
+def fixture_plugin(tmp_path, monkeypatch):
+    """Writes a plugin module on a folder of sys.path"""
+    module_name = f'plugin_{tmp_path.name}'
+    plugin_file = tmp_path / f'{module_name}.py'
+
+    def write(version) -> None:
+        plugin_file.write_text(PLUGIN_SOURCE.format(version=version), encoding='UTF-8')
+        stat = plugin_file.stat()
+        os.utime(plugin_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    write(1)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield module_name, write
+    sys.modules.pop(module_name, None)
+    loader.MODULE_SIGNATURES.pop(module_name, None)
+
+
+def test_load_handlers_reload(plugin) -> None:
+    """Tests that a changed plugin is reloaded on a new module, keeping the old version"""
+    module_name, write = plugin
+    holder = jira_handler.JiraHandlerData({}, {})
+    loader.load_handlers([module_name], holder)
+    old_class = holder.handlers_classes['PluginHandler']
+    old_module = sys.modules[module_name]
+
+    same_holder = jira_handler.JiraHandlerData({}, {})
+    loader.load_handlers([module_name], same_holder)
+    assert same_holder.handlers_classes['PluginHandler'] is old_class
+
+    write(22)
+    new_holder = jira_handler.JiraHandlerData({}, {})
+    loader.load_handlers([module_name], new_holder)
+    new_class = new_holder.handlers_classes['PluginHandler']
+
+    assert new_class is not old_class
+    assert new_class().version() == 22
+    assert old_class().version() == 1
+    assert sys.modules[module_name] is not old_module
+    assert holder.handlers_classes['PluginHandler'] is old_class
+
+
+def test_load_handlers_reload_error(plugin) -> None:
+    """Tests that a plugin with errors does not replace the loaded version"""
+    module_name, write = plugin
+    loader.load_handlers([module_name], jira_handler.JiraHandlerData({}, {}))
+    old_module = sys.modules[module_name]
+
+    write('(')
+    with pytest.raises(SyntaxError):
+        loader.load_handlers([module_name], jira_handler.JiraHandlerData({}, {}))
+    assert sys.modules[module_name] is old_module
+
+    write(3)
+    holder = jira_handler.JiraHandlerData({}, {})
+    loader.load_handlers([module_name], holder)
+    assert holder.handlers_classes['PluginHandler']().version() == 3
+
+
+def test_module_file() -> None:
+    """Tests the source file of the modules"""
+    assert loader.module_file('automation_service.loader') == loader.__file__
+    assert loader.module_file('automation_service.not_found') is None
+    assert loader.file_signature(None) is None
@@ -0,0 +1,124 @@
+"""Tests for module automation_service.log_handlers"""
+import gzip
+import json
+import logging
+import sys
+from unittest import mock
+
+from automation_service import context
+from automation_service import log_handlers
+
+
+def get_record(message: str) -> logging.LogRecord:
+    """Gets a record for testing"""
+    return logging.LogRecord('teste', logging.INFO, __file__, 1, message, None, None)
+
+
+def test_rotating_file_handler_compress(tmp_path):
+    """Tests that the rotated files are compressed on the background"""
+    log_file = tmp_path / 'teste.log'
+    handler = log_handlers.RotatingFileHandler(str(log_file), maxBytes=50, backupCount=2)
+    for index in range(4):
+        handler.emit(get_record(f'message {index} ' + 'x' * 40))
+    handler.close()
+    log_handlers.COMPRESSOR.join()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ['teste.log', 'teste.log.1.gz', 'teste.log.2.gz']
+    with gzip.open(tmp_path / 'teste.log.1.gz', 'rt') as rotated:
+        assert rotated.read().startswith('message 2')
+    assert log_file.read_text().startswith('message 3')
+
+
+def test_rotating_file_handler_quick_rotations(tmp_path):
+    """Tests that quick rotations do not share the temporary file and wait for
+    the pending compression before shifting the backups"""
+    log_file = tmp_path / 'teste.log'
+    handler = log_handlers.RotatingFileHandler(str(log_file), maxBytes=20, backupCount=3)
+    with mock.patch.object(log_handlers.COMPRESSOR, 'submit',
+                           wraps=log_handlers.COMPRESSOR.submit) as submit, \
+            mock.patch.object(log_handlers.COMPRESSOR, 'join',
+                              wraps=log_handlers.COMPRESSOR.join) as join:
+        for message in ('first message', 'second message', 'third message'):
+            handler.emit(get_record(message))
+        handler.close()
+        log_handlers.COMPRESSOR.join()
+
+    pending = [call.args[0] for call in submit.call_args_list]
+    assert len(set(pending)) == 2
+    assert join.call_count == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ['teste.log', 'teste.log.1.gz', 'teste.log.2.gz']
+    with gzip.open(tmp_path / 'teste.log.2.gz', 'rt') as rotated:
+        assert rotated.read() == 'first message\n'
+    with gzip.open(tmp_path / 'teste.log.1.gz', 'rt') as rotated:
+        assert rotated.read() == 'second message\n'
+
+
+def test_rotating_file_handler_without_compression(tmp_path):
+    """Tests the rotation without compression"""
+    log_file = tmp_path / 'teste.log'
+    handler = log_handlers.RotatingFileHandler(str(log_file), maxBytes=10, backupCount=1,
+                                               compress=False)
+    handler.emit(get_record('first message'))
+    handler.emit(get_record('second message'))
+    handler.close()
+
+    assert (tmp_path / 'teste.log.1').read_text() == 'first message\n'
+
+
+def test_queue_logging(tmp_path):
+    """Tests that the records are written by the listener"""
+    log_file = tmp_path / 'teste.log'
+    file_handler = logging.FileHandler(str(log_file))
+    queue_logging = log_handlers.QueueLogging([file_handler])
+    logger = logging.getLogger('teste_queue_logging')
+    logger.addHandler(queue_logging.handler)
+    logger.propagate = False
+
+    logger.warning('teste %s', 'queue')
+    queue_logging.stop()
+    logger.removeHandler(queue_logging.handler)
+
+    assert log_file.read_text() == 'teste queue\n'
+    assert queue_logging.handlers == [file_handler]
+
+
+def test_context_queue_handler():
+    """Tests that the context of the thread is stamped on the record, unformatted"""
+    handler = log_handlers.ContextQueueHandler(None)
+    record = logging.LogRecord('teste', logging.INFO, __file__, 1, 'teste %s', ('args',), None)
+    with context.bind(issue_key='TESTE-1', handler_type='TesteHandler'):
+        prepared = handler.prepare(record)
+
+    assert prepared.issue_key == 'TESTE-1'
+    assert prepared.handler_type == 'TesteHandler'
+    assert prepared.msg == 'teste %s'
+    assert prepared.args == ('args',)
+
+
+def test_context_formatter():
+    """Tests the prefix of the issue key on the text format"""
+    formatter = log_handlers.ContextFormatter('%(context)s%(message)s')
+    record = get_record('teste')
+    assert formatter.format(record) == 'teste'
+
+    record.issue_key = 'TESTE-1'
+    assert formatter.format(record) == '[TESTE-1]: teste'
+
+
+def test_json_formatter():
+    """Tests the JSON line of a record with an exception"""
+    record = get_record('teste')
+    record.issue_key = 'TESTE-1'
+    record.handler_type = None
+    try:
+        raise ValueError('erro')
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    entry = json.loads(log_handlers.JsonFormatter().format(record))
+    assert entry['message'] == 'teste'
+    assert entry['issue_key'] == 'TESTE-1'
+    assert 'handler_type' not in entry
+    assert entry['exception'].endswith('ValueError: erro')
@@ -0,0 +1,110 @@
+"""Tests for module automation_service.metrics"""
+import http.client
+from unittest import mock
+
+import pytest
+
+from automation_service import metrics
+
+
+def test_counter():
+    """Tests the counter with labels"""
+    counter = metrics.Counter('teste_total', 'Teste', ('event',))
+    counter.inc(event='found')
+    counter.inc(2, event='found')
+
+    assert counter.get(event='found') == 3
+    assert counter.render() == '\n'.join([
+        '# HELP teste_total Teste',
+        '# TYPE teste_total counter',
+        'teste_total{event="found"} 3',
+    ])
+    with pytest.raises(ValueError):
+        counter.inc(other='found')
+
+
+def test_gauge():
+    """Tests the gauge without labels"""
+    gauge = metrics.Gauge('teste', 'Teste')
+    gauge.set(10)
+    gauge.set(4)
+    assert gauge.render().splitlines()[-1] == 'teste 4'
+
+
+def test_histogram():
+    """Tests the cumulative buckets of the histogram"""
+    histogram = metrics.Histogram('teste_seconds', 'Teste', ('handler',), buckets=(1, 5))
+    histogram.observe(0.5, handler='Mock')
+    histogram.observe(3, handler='Mock')
+    histogram.observe(10, handler='Mock')
+
+    assert histogram.count(handler='Mock') == 3
+    assert histogram.samples() == [
+        'teste_seconds_bucket{handler="Mock",le="1"} 1',
+        'teste_seconds_bucket{handler="Mock",le="5"} 2',
+        'teste_seconds_bucket{handler="Mock",le="+Inf"} 3',
+        'teste_seconds_sum{handler="Mock"} 13.5',
+        'teste_seconds_count{handler="Mock"} 3',
+    ]
+
+
+def test_histogram_time():
+    """Tests the observation of the time spent on a block"""
+    histogram = metrics.Histogram('teste_seconds', 'Teste')
+    with histogram.time():
+        pass
+    assert histogram.count() == 1
+
+
+def test_escape_label_value():
+    """Tests the escape of the label values"""
+    assert metrics.escape_label_value('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+@pytest.mark.parametrize(
+    argnames='path,result',
+    argvalues=[('/rest/api/2/issue/TESTE-12/transitions', '/rest/api/2/issue/{id}/transitions'),
+               ('/rest/api/2/attachment/1234', '/rest/api/2/attachment/{id}'),
+               ('/secure/attachment/1234/TLP_1.xlsx', '/secure/attachment/{id}/{filename}'),
+               ('/rest/api/2/search?jql=x', '/rest/api/2/search')],
+    ids=['Issue key', 'Attachment id', 'Attachment content', 'Query string'],
+)
+def test_endpoint_label(path: str, result: str):
+    """Tests the endpoint label of the Jira calls"""
+    assert metrics.endpoint_label(path) == result
+
+
+@pytest.mark.parametrize(
+    argnames='statement,result',
+    argvalues=[('select enabled\n from lge_code_lookup where', 'select lge_code_lookup'),
+               ('  update tb_ocs_tlp set tlp = :tlp', 'update tb_ocs_tlp'),
+               ('insert into tb_ocs_tlp (model,tlp)', 'insert tb_ocs_tlp'),
+               ('delete from tb_ocs_tlp', 'delete tb_ocs_tlp')],
+    ids=['Select', 'Update', 'Insert', 'Delete'],
+)
+def test_statement_label(statement: str, result: str):
+    """Tests the statement label of the Oracle statements"""
+    assert metrics.statement_label(statement) == result
+
+
+def test_metrics_server():
+    """Tests the metrics endpoint"""
+    registry = metrics.Registry()
+    registry.counter('teste_total', 'Teste').inc()
+    collect = mock.MagicMock()
+    server = metrics.MetricsServer('127.0.0.1', 0, registry=registry, collect=collect,
+                                   logger=mock.MagicMock())
+    server.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+        connection.request('GET', '/metrics')
+        response = connection.getresponse()
+        assert response.status == 200
+        assert response.getheader('Content-Type') == metrics.CONTENT_TYPE
+        assert 'teste_total 1' in response.read().decode('UTF-8')
+        collect.assert_called_once()
+
+        connection.request('GET', '/other')
+        assert connection.getresponse().status == 404
+    finally:
+        server.stop()
@@ -0,0 +1,34 @@
+"""Tests for module automation_service.ordering"""
+from types import SimpleNamespace
+
+from automation_service.ordering import KeySequencer
+
+
+def get_ticket(key: str) -> SimpleNamespace:
+    """Gets a ticket for testing"""
+    return SimpleNamespace(key=key)
+
+
+def test_key_sequencer_order():
+    """Tests that the tickets of a key run one at a time in the order they arrive"""
+    sequencer = KeySequencer()
+    first, second, third = get_ticket('TESTE-1'), get_ticket('TESTE-2'), get_ticket('TESTE-3')
+
+    assert sequencer.acquire('C1', first)
+    assert sequencer.acquire('C2', get_ticket('TESTE-4'))
+    assert not sequencer.acquire('C1', second)
+    assert not sequencer.acquire('C1', third)
+    assert not sequencer.acquire('C1', second)
+    assert len(sequencer) == 2
+
+    assert sequencer.release('C1') is second
+    assert sequencer.key_of('TESTE-1') is None
+    assert sequencer.key_of('TESTE-2') == 'C1'
+    assert sequencer.acquire('C1', second)
+    assert not sequencer.acquire('C1', first)
+
+    assert sequencer.release('C1') is third
+    assert sequencer.release('C1') is first
+    assert sequencer.release('C1') is None
+    assert len(sequencer) == 0
+    assert sequencer.acquire('C1', second)
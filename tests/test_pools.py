@@ -0,0 +1,61 @@
+"""Tests for module automation_service.pools"""
+import pytest
+
+from automation_service.pools import HandlerLimit, HandlerPools, parse_limits
+
+
+def test_parse_limits():
+    """Tests the limits of config_handlers.json"""
+    limits = parse_limits({'CreditHoldHandler': {'max_running': 2, 'max_connections': 1},
+                           'TlpUpdateHandler': {}})
+    assert limits['CreditHoldHandler'] == HandlerLimit(2, 1)
+    assert limits['TlpUpdateHandler'] == HandlerLimit()
+
+
+@pytest.mark.parametrize(
+    argnames='data',
+    argvalues=[
+        ['CreditHoldHandler'],
+        {'CreditHoldHandler': 2},
+        {'CreditHoldHandler': {'max_running': 0}},
+        {'CreditHoldHandler': {'max_running': '2'}},
+        {'CreditHoldHandler': {'slots': 2}},
+    ],
+    ids=['Not a mapping', 'Limit not a mapping', 'Zero', 'Not an integer', 'Unknown limit'],
+)
+def test_parse_limits_invalid(data):
+    """Tests the invalid limits"""
+    with pytest.raises(ValueError):
+        parse_limits(data)
+
+
+def test_handler_pools_acquire_release():
+    """Tests that each handler type has its own slots"""
+    pools = HandlerPools({'CreditHoldHandler': HandlerLimit(max_running=2, max_connections=1)})
+
+    assert pools.acquire('CreditHoldHandler', uses_database=True)
+    assert not pools.acquire('CreditHoldHandler', uses_database=True)
+    assert pools.acquire('CreditHoldHandler', uses_database=False)
+    assert not pools.available('CreditHoldHandler', uses_database=False)
+    assert pools.acquire('TlpUpdateHandler')
+    assert pools.available('TlpUpdateHandler')
+
+    assert pools.utilisation()['CreditHoldHandler'] == {
+        'running': 2, 'max_running': 2, 'connections': 1, 'max_connections': 1}
+
+    pools.release('CreditHoldHandler', uses_database=True)
+    assert pools.available('CreditHoldHandler', uses_database=True)
+
+
+def test_handler_pools_configure():
+    """Tests that the tickets running keep their slots when the limits change"""
+    pools = HandlerPools({'CreditHoldHandler': HandlerLimit(max_running=3)})
+    pools.acquire('CreditHoldHandler')
+    pools.acquire('CreditHoldHandler')
+
+    pools.configure({'CreditHoldHandler': HandlerLimit(max_running=1)})
+    assert pools.utilisation()['CreditHoldHandler']['running'] == 2
+    assert not pools.available('CreditHoldHandler')
+
+    pools.configure({})
+    assert pools.available('CreditHoldHandler')
@@ -0,0 +1,79 @@
+"""Tests for module automation_service.prefetch"""
+import time
+from unittest import mock
+
+from automation_service.prefetch import AttachmentPrefetcher, AttachmentSpool
+from automation_service.snapshot import FieldValues
+
+
+def get_attachment(attachment_id: str, size: int) -> FieldValues:
+    """Gets the attachment of a ticket for testing"""
+    return FieldValues({'id': attachment_id, 'filename': f'TLP_{attachment_id}.xlsx',
+                        'size': size, 'content': f'https://jira.local/{attachment_id}'})
+
+
+def test_attachment_spool(tmp_path):
+    """Tests that the spool keeps the attachments within its budget"""
+    spool = AttachmentSpool(max_bytes=10, directory=str(tmp_path))
+
+    assert spool.put('TESTE-1', '1', b'123456')
+    assert not spool.put('TESTE-2', '2', b'123456')
+    assert spool.put('TESTE-2', '2', b'1234')
+    assert (len(spool), spool.size, spool.free_bytes()) == (2, 10, 0)
+    assert 'TESTE-1' in spool
+
+    assert spool.take('TESTE-1', '9') is None
+    assert spool.take('TESTE-1', '1') == b'123456'
+    assert spool.take('TESTE-1', '1') is None
+    assert spool.size == 4
+    assert not (tmp_path / 'TESTE-1_1').exists()
+
+    assert spool.retain(lambda issue_key: issue_key != 'TESTE-2') == 1
+    assert len(spool) == 0
+    assert not spool.discard('TESTE-2')
+
+    spool.put('TESTE-3', '3', b'1')
+    spool.clear()
+    assert (len(spool), spool.size) == (0, 0)
+    assert not tmp_path.exists()
+
+
+def test_attachment_prefetcher_prefetch(tmp_path):
+    """Tests that only the attachments that fit and match their metadata are spooled"""
+    spool = AttachmentSpool(max_bytes=10, directory=str(tmp_path))
+    download = mock.MagicMock(side_effect=lambda attachment: b'x' * attachment.size)
+    prefetcher = AttachmentPrefetcher(spool, mock.MagicMock(), download=download)
+
+    assert prefetcher.prefetch('TESTE-1', get_attachment('1', 6))
+    assert not prefetcher.prefetch('TESTE-1', get_attachment('1', 6))
+    assert not prefetcher.prefetch('TESTE-2', get_attachment('2', 6))
+    assert download.call_count == 1
+
+    download.side_effect = [b'12', ConnectionError('offline'), None]
+    assert not prefetcher.prefetch('TESTE-3', get_attachment('3', 3))
+    assert not prefetcher.prefetch('TESTE-3', get_attachment('3', 3))
+    assert not prefetcher.prefetch('TESTE-3', get_attachment('3', 3))
+    assert list(spool.entries) == ['TESTE-1']
+
+
+def test_attachment_prefetcher_schedule(tmp_path):
+    """Tests that the background thread downloads the first tickets of the last schedule"""
+    spool = AttachmentSpool(max_bytes=100, directory=str(tmp_path))
+    spool.put('TESTE-1', '1', b'1')
+    download = mock.MagicMock(side_effect=lambda attachment: b'x' * attachment.size)
+    prefetcher = AttachmentPrefetcher(spool, mock.MagicMock(), depth=2, download=download)
+
+    prefetcher.schedule([('TESTE-1', get_attachment('1', 1)), ('TESTE-2', get_attachment('2', 2)),
+                         ('TESTE-3', get_attachment('3', 3))])
+    assert list(prefetcher.pending) == ['TESTE-2']
+
+    prefetcher.start()
+    deadline = time.monotonic() + 5
+    while 'TESTE-2' not in spool and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spool.take('TESTE-2', '2') == b'xx'
+
+    prefetcher.stop()
+    prefetcher.join(5)
+    assert not prefetcher.is_alive()
+    assert not tmp_path.exists()
@@ -0,0 +1,154 @@
+"""Tests for module automation_service.rate_limiter"""
+import io
+from unittest import mock
+
+import pytest
+import requests
+
+from automation_service import context
+from automation_service import rate_limiter
+from automation_service import resilience
+
+
+def get_response(status_code: int, headers: dict = None) -> requests.Response:
+    """Gets a response for testing"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'')
+    response.headers.update(headers or {})
+    return response
+
+
+def get_request() -> requests.PreparedRequest:
+    """Gets a request for testing"""
+    return requests.Request('GET', 'http://jira.local/rest/api/2/issue/TESTE-1').prepare()
+
+
+def test_rate_limiter_burst():
+    """Tests that the calls inside the burst do not wait"""
+    limiter = rate_limiter.RateLimiter(rate=1, burst=3, logger=mock.MagicMock())
+    with mock.patch('time.sleep') as mock_sleep:
+        for _ in range(3):
+            assert limiter.acquire() == 0
+        mock_sleep.assert_not_called()
+
+
+def test_rate_limiter_waits_when_empty():
+    """Tests that the caller waits for a token when the bucket is empty"""
+    limiter = rate_limiter.RateLimiter(rate=1000, burst=1, logger=mock.MagicMock())
+    limiter.acquire()
+    assert limiter.acquire() > 0
+
+
+def test_rate_limiter_throttled():
+    """Tests that a 429 reduces the rate and blocks the callers"""
+    limiter = rate_limiter.RateLimiter(rate=10, burst=10, logger=mock.MagicMock())
+    limiter.on_throttled(0.01)
+
+    assert limiter.rate == 5
+    assert limiter.throttled == 1
+    assert limiter.acquire() > 0
+
+
+def test_rate_limiter_adapts_to_latency():
+    """Tests the rate adaptation to the latency"""
+    limiter = rate_limiter.RateLimiter(rate=10, min_rate=1, latency_target=1,
+                                       logger=mock.MagicMock())
+    limiter.on_success(5)
+    assert limiter.rate == 5
+    limiter.on_success(0.1)
+    assert limiter.rate == 5.5
+    for _ in range(100):
+        limiter.on_success(0.1)
+    assert limiter.rate == 10
+
+
+@pytest.mark.parametrize(
+    argnames='value,result',
+    argvalues=[('10', 10.0), ('', None), ('teste', None),
+               ('Wed, 21 Oct 2015 07:28:00 GMT', 0.0)],
+    ids=['Seconds', 'Empty', 'Invalid', 'Date'],
+)
+def test_parse_retry_after(value: str, result: float):
+    """Tests the parse of the Retry-After header"""
+    assert rate_limiter.parse_retry_after(value) == result
+
+
+def test_call_accounting():
+    """Tests the counters per ticket and per handler type"""
+    accounting = rate_limiter.CallAccounting()
+    accounting.record('TESTE-1', 'CreditHoldHandler')
+    accounting.record('TESTE-1', 'CreditHoldHandler')
+    accounting.record()
+
+    assert accounting.snapshot() == {
+        'per_ticket': {'TESTE-1': 2},
+        'per_handler_type': {'CreditHoldHandler': 2, 'JiraService': 1},
+    }
+    assert accounting.pop_ticket('TESTE-1') == 2
+    assert accounting.pop_ticket('TESTE-1') == 0
+
+
+@mock.patch('requests.adapters.HTTPAdapter.send')
+def test_jira_http_adapter_retries_throttled(mock_send: mock.MagicMock):
+    """Tests that the adapter retries after a 429 and counts every call"""
+    limiter = rate_limiter.RateLimiter(rate=1000, burst=10, logger=mock.MagicMock())
+    accounting = rate_limiter.CallAccounting()
+    adapter = rate_limiter.JiraHttpAdapter(limiter, accounting)
+    mock_send.side_effect = [get_response(429, {'Retry-After': '0'}), get_response(200)]
+
+    with context.bind(issue_key='TESTE-1', handler_type='TlpUpdateHandler'):
+        response = adapter.send(get_request())
+
+    assert response.status_code == 200
+    assert mock_send.call_count == 2
+    assert limiter.throttled == 1
+    assert accounting.snapshot()['per_ticket'] == {'TESTE-1': 2}
+
+
+@mock.patch('requests.adapters.HTTPAdapter.send')
+def test_jira_http_adapter_gives_up(mock_send: mock.MagicMock):
+    """Tests that the adapter returns the 429 after the retries"""
+    limiter = rate_limiter.RateLimiter(rate=1000, burst=10, logger=mock.MagicMock())
+    adapter = rate_limiter.JiraHttpAdapter(limiter, max_throttled_retries=1)
+    mock_send.return_value = get_response(429, {'Retry-After': '0'})
+
+    assert adapter.send(get_request()).status_code == 429
+    assert mock_send.call_count == 2
+
+
+def test_mount():
+    """Tests that the adapter is mounted for http and https"""
+    session = requests.Session()
+    rate_limiter.mount(session, rate_limiter.RateLimiter())
+    assert isinstance(session.get_adapter('https://jira.local'), rate_limiter.JiraHttpAdapter)
+    assert isinstance(session.get_adapter('http://jira.local'), rate_limiter.JiraHttpAdapter)
+
+
+@mock.patch('requests.adapters.HTTPAdapter.send')
+def test_jira_http_adapter_breaker(mock_send: mock.MagicMock):
+    """Tests that the adapter feeds the breaker and refuses calls while it is open"""
+    breaker = resilience.CircuitBreaker('jira', failure_threshold=1, logger=mock.MagicMock())
+    adapter = rate_limiter.JiraHttpAdapter(rate_limiter.RateLimiter(), breaker=breaker)
+    mock_send.return_value = get_response(503)
+
+    assert adapter.send(get_request()).status_code == 503
+    assert breaker.state is resilience.BreakerState.OPEN
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        adapter.send(get_request())
+    assert mock_send.call_count == 1
+
+
+@mock.patch('requests.adapters.HTTPAdapter.send')
+def test_jira_http_adapter_recorder(mock_send: mock.MagicMock):
+    """Tests that every exchange, including the throttled ones, is recorded"""
+    recorder = mock.MagicMock()
+    adapter = rate_limiter.JiraHttpAdapter(rate_limiter.RateLimiter(rate=1000, burst=10),
+                                           recorder=recorder)
+    mock_send.side_effect = [get_response(429, {'Retry-After': '0'}), get_response(200)]
+    request = get_request()
+
+    adapter.send(request)
+    assert [call.args[1].status_code for call in recorder.record.call_args_list] == [429, 200]
+    assert recorder.record.call_args.args[0] is request
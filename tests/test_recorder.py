@@ -0,0 +1,64 @@
+"""Tests for module automation_service.recorder"""
+import base64
+import io
+import json
+
+import requests
+
+from automation_service import recorder
+
+
+def get_response(content: bytes, content_type: str, status_code: int = 200) -> requests.Response:
+    """Gets a response for testing"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(content)
+    response.headers.update({'Content-Type': content_type, 'Set-Cookie': 'JSESSIONID=1'})
+    return response
+
+
+def read_exchanges(record_file) -> list:
+    """Reads the exchanges recorded"""
+    return [json.loads(line) for line in record_file.read_text(encoding='UTF-8').splitlines()]
+
+
+def test_scrub_json():
+    """Tests that the sensitive keys are scrubbed at any level"""
+    assert recorder.scrub_json({'user': {'password': 'x', 'name': 'a'}, 'apiToken': 'y',
+                                'items': [{'secret': 1}]}) == \
+        {'user': {'password': '***', 'name': 'a'}, 'apiToken': '***', 'items': [{'secret': '***'}]}
+
+
+def test_record_json(tmp_path):
+    """Tests the record of a JSON exchange with the credentials scrubbed"""
+    record_file = tmp_path / 'traffic' / 'jira.jsonl'
+    traffic = recorder.TrafficRecorder(str(record_file), 'https://jira.local/',
+                                       secrets=('robot', 's3cr3t'))
+    request = requests.Request(
+        'PUT', 'https://jira.local/rest/api/2/issue/TESTE-1?notifyUsers=false&token=abc',
+        json={'fields': {'assignee': {'name': 'robot'}}},
+        auth=('robot', 's3cr3t')).prepare()
+    body = {'self': 'https://jira.local/rest/api/2/issue/TESTE-1', 'password': 's3cr3t'}
+    traffic.record(request, get_response(json.dumps(body).encode(), 'application/json'), 0.25)
+
+    exchange = read_exchanges(record_file)[0]
+    assert exchange['method'] == 'PUT'
+    assert exchange['path'] == '/rest/api/2/issue/TESTE-1?notifyUsers=false&token=%2A%2A%2A'
+    assert json.loads(exchange['request_body']) == {'fields': {'assignee': {'name': '***'}}}
+    assert json.loads(exchange['body']) == {'self': '{base_url}/rest/api/2/issue/TESTE-1',
+                                            'password': '***'}
+    assert exchange['headers'] == {'Content-Type': 'application/json'}
+    assert exchange['latency'] == 0.25
+    assert 's3cr3t' not in record_file.read_text(encoding='UTF-8')
+
+
+def test_record_binary(tmp_path):
+    """Tests that the binary content, e.g. attachments, is recorded as base64"""
+    record_file = tmp_path / 'jira.jsonl'
+    traffic = recorder.TrafficRecorder(str(record_file), 'https://jira.local')
+    request = requests.Request('GET', 'https://jira.local/secure/attachment/1/TLP_A.xlsx').prepare()
+    traffic.record(request, get_response(b'\x00\x01', 'application/octet-stream'), 0.1)
+
+    exchange = read_exchanges(record_file)[0]
+    assert base64.b64decode(exchange['body_base64']) == b'\x00\x01'
+    assert exchange['request_body'] is None
@@ -0,0 +1,96 @@
+"""Tests for module automation_service.resilience"""
+from unittest import mock
+
+import pytest
+
+from automation_service import resilience
+
+
+def failing_function(*args, **kwargs):
+    """Function to simulate a dependency failure"""
+    raise ConnectionError('teste')
+
+
+def test_retry_policy_delays():
+    """Tests the exponential backoff of the retry policy"""
+    policy = resilience.RetryPolicy(max_attempts=5, base_delay=1, max_delay=4, jitter=False)
+    assert list(policy.delays()) == [1, 2, 4, 4]
+
+    policy.jitter = True
+    assert all(0 <= delay <= 4 for delay in policy.delays())
+
+
+@mock.patch('time.sleep')
+def test_retry_policy_call(mock_sleep: mock.MagicMock):
+    """Tests that the call is retried until it succeeds"""
+    function = mock.MagicMock(side_effect=[ConnectionError('teste'), 'ok'])
+    policy = resilience.RetryPolicy(max_attempts=3)
+    assert policy.call(function, 1, retry_on=(ConnectionError,)) == 'ok'
+    assert function.call_count == 2
+    assert mock_sleep.call_count == 1
+
+
+@mock.patch('time.sleep')
+def test_retry_policy_call_gives_up(mock_sleep: mock.MagicMock):
+    """Tests that the error is raised after the last attempt"""
+    policy = resilience.RetryPolicy(max_attempts=3)
+    with pytest.raises(ConnectionError):
+        policy.call(failing_function, retry_on=(ConnectionError,))
+    assert mock_sleep.call_count == 2
+
+
+def test_retry_policy_does_not_retry_other_errors():
+    """Tests that errors not informed are raised at once"""
+    function = mock.MagicMock(side_effect=ValueError('teste'))
+    with pytest.raises(ValueError):
+        resilience.RetryPolicy().call(function, retry_on=(ConnectionError,))
+    assert function.call_count == 1
+
+
+def test_circuit_breaker_opens():
+    """Tests that the breaker opens after the threshold"""
+    breaker = resilience.CircuitBreaker('teste', failure_threshold=2, reset_timeout=60,
+                                        logger=mock.MagicMock())
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing_function, errors=(ConnectionError,))
+
+    assert breaker.state is resilience.BreakerState.OPEN
+    assert not breaker.available()
+    function = mock.MagicMock()
+    with pytest.raises(resilience.CircuitBreakerOpen):
+        breaker.call(function)
+    function.assert_not_called()
+
+
+def test_circuit_breaker_half_open():
+    """Tests the trial call after the reset timeout"""
+    breaker = resilience.CircuitBreaker('teste', failure_threshold=1, reset_timeout=0,
+                                        logger=mock.MagicMock())
+    breaker.record_failure()
+    assert breaker.state is resilience.BreakerState.HALF_OPEN
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker._state is resilience.BreakerState.OPEN # pylint: disable=protected-access
+
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state is resilience.BreakerState.CLOSED
+
+
+def test_circuit_breakers_configure():
+    """Tests the creation of the breakers from the config"""
+    breakers = resilience.CircuitBreakers()
+    breaker = breakers.configure('jira', {'retry_attempts': '5', 'breaker_threshold': '2',
+                                          'breaker_reset_timeout': '10'})
+    assert breaker.failure_threshold == 2
+    assert breaker.reset_timeout == 10
+    assert breaker.retry_policy.max_attempts == 5
+    assert breakers.get('jira') is breaker
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breakers.states() == {'jira': 'open'}
+    assert not breakers.available(['jira', 'oracle'])
+    assert breakers.available(['oracle'])
@@ -0,0 +1,50 @@
+"""Tests for module automation_service.scheduler"""
+import threading
+
+import pytest
+
+from automation_service.scheduler import PollScheduler
+
+
+@pytest.mark.parametrize(
+    argnames='dispatched,free_slots,interval,result',
+    argvalues=[(3, 2, 8, 1), (0, 2, 8, 16), (0, 2, 40, 60), (3, 0, 1, 60)],
+    ids=['Work found', 'Empty search', 'Max interval', 'Queue full'],
+)
+def test_poll_scheduler_record_result(dispatched: int, free_slots: int,
+                                      interval: float, result: float):
+    """Tests the adaptation of the interval to the result of the search"""
+    scheduler = PollScheduler(min_interval=1, max_interval=60, backoff=2, jitter=0)
+    scheduler.interval = interval
+    assert scheduler.record_result(dispatched, free_slots) == result
+    assert scheduler.next_wait() == result
+
+
+def test_poll_scheduler_jitter():
+    """Tests that the jitter stays inside its fraction of the interval"""
+    scheduler = PollScheduler(min_interval=10, max_interval=10, jitter=0.1)
+    for _ in range(100):
+        assert 9 <= scheduler.next_wait() <= 11
+
+
+def test_poll_scheduler_wake():
+    """Tests that wake interrupts the wait"""
+    scheduler = PollScheduler(min_interval=60, max_interval=60, jitter=0)
+    timer = threading.Timer(0.01, scheduler.wake)
+    timer.start()
+    assert scheduler.wait() is True
+    assert not scheduler.event.is_set()
+
+    scheduler.interval = 0
+    assert scheduler.wait() is False
+
+
+def test_poll_scheduler_configure():
+    """Tests that the interval is kept inside the new bounds"""
+    scheduler = PollScheduler(min_interval=1, max_interval=60, jitter=0)
+    scheduler.interval = 40
+    scheduler.configure(min_interval=2, max_interval=30)
+    assert (scheduler.min_interval, scheduler.max_interval, scheduler.interval) == (2, 30, 30)
+
+    scheduler.configure(min_interval=50, max_interval=10)
+    assert (scheduler.min_interval, scheduler.interval) == (10, 10)
@@ -0,0 +1,49 @@
+"""Tests for module automation_service.snapshot"""
+import pickle
+
+import pytest
+
+from automation_service.snapshot import FieldValues, TicketSnapshot
+
+
+RAW_ISSUE = {
+    'id': '10001', 'key': 'TESTE-1', 'self': 'http://jira/rest/api/2/issue/10001',
+    'fields': {
+        'summary': 'TESTE: Credit hold',
+        'priority': {'name': 'High', 'id': '2'},
+        'customfield_11700': {'value': 'Incluir'},
+        'customfield_11701': 'C1',
+        'attachment': [{'id': '1', 'filename': 'TLP_1.xlsx'}],
+        'description': 'teste',
+    },
+}
+
+
+def test_ticket_snapshot_from_raw():
+    """Tests that only the fields informed are kept and read as attributes"""
+    ticket = TicketSnapshot.from_raw(
+        RAW_ISSUE, ('summary', 'priority', 'customfield_11700', 'attachment', 'duedate'))
+
+    assert (ticket.key, ticket.id, str(ticket)) == ('TESTE-1', '10001', 'TESTE-1')
+    assert ticket.summary == 'TESTE: Credit hold'
+    assert ticket.fields.priority.name == 'High'
+    assert ticket.fields.customfield_11700.value == 'Incluir'
+    assert ticket.fields.attachment[0].filename == 'TLP_1.xlsx'
+    assert getattr(ticket.fields, 'duedate', None) is None
+    with pytest.raises(AttributeError):
+        ticket.fields.description # pylint: disable=pointless-statement
+    with pytest.raises(AttributeError):
+        ticket.other = 1 # pylint: disable=attribute-defined-outside-init
+
+    assert TicketSnapshot.from_raw(RAW_ISSUE).fields.description == 'teste'
+    assert TicketSnapshot.from_raw({'key': 'TESTE-2'}).summary is None
+
+
+def test_ticket_snapshot_pickle():
+    """Tests that the snapshot crosses the process boundaries"""
+    ticket = TicketSnapshot.from_raw(RAW_ISSUE, ('summary', 'priority'))
+    copy = pickle.loads(pickle.dumps(ticket))
+    assert copy == ticket
+    assert copy.url == ticket.url
+    assert copy.expanded == ticket.expanded
+    assert copy.fields.priority == FieldValues({'name': 'High', 'id': '2'})
@@ -0,0 +1,66 @@
+"""Tests for module automation_service.trace_report"""
+import io
+import json
+
+import pytest
+
+from automation_service import trace_report
+
+
+def make_span(span_id, name, start, duration, parent_id=None, trace_id='TESTE-1', **attributes):
+    """Returns a span as exported by the tracing"""
+    return {'trace_id': trace_id, 'span_id': span_id, 'parent_id': parent_id, 'name': name,
+            'start': start, 'duration': duration, 'thread': 'Thread-1',
+            'attributes': attributes}
+
+
+@pytest.fixture(name='spans')
+def fixture_spans():
+    """Spans of a ticket with two Jira calls and an Oracle statement"""
+    return [
+        make_span('a', 'handler.run', 100.0, 10.0, handler='TlpUpdateHandler'),
+        make_span('b', 'jira.call', 100.5, 3.0, 'a', endpoint='/rest/api/2/search'),
+        make_span('c', 'tlp.load_rows', 104.0, 5.0, 'a', rows=2),
+        make_span('d', 'oracle.statement', 104.5, 4.0, 'c', statement='update tb_ocs_tlp'),
+        make_span('e', 'service.poll', 99.0, 0.5, trace_id='service'),
+    ]
+
+
+def test_self_times(spans):
+    """Tests that the time of the children is removed from the parent"""
+    times = trace_report.self_times(spans[:4])
+    assert times == {'a': 2.0, 'b': 3.0, 'c': 1.0, 'd': 4.0}
+
+
+def test_breakdown(spans):
+    """Tests the aggregation by handler type, ignoring the service trace"""
+    result = trace_report.breakdown(spans)
+    assert list(result) == ['TlpUpdateHandler']
+    assert result['TlpUpdateHandler']['oracle.statement'] == 4.0
+    assert result['TlpUpdateHandler']['tickets'] == 1
+    assert sum(value for key, value in result['TlpUpdateHandler'].items()
+               if key != 'tickets') == 10.0
+
+
+def test_timeline(spans):
+    """Tests the offsets and the indentation of the timeline"""
+    lines = trace_report.timeline(trace_report.group_by_trace(spans)['TESTE-1'])
+    assert lines[0].split() == ['0.000s', '10.000s', 'handler.run', 'handler=TlpUpdateHandler']
+    assert lines[3].split('s ', 2)[2] == '    oracle.statement statement=update tb_ocs_tlp'
+
+
+def test_main(spans, tmp_path):
+    """Tests the report written from a file"""
+    trace_file = tmp_path / 'spans.jsonl'
+    trace_file.write_text('\n'.join(json.dumps(span) for span in spans) + '\ninvalid\n',
+                          encoding='UTF-8')
+
+    output = io.StringIO()
+    trace_report.main([str(trace_file)], output)
+    assert output.getvalue().startswith('TlpUpdateHandler (1 tickets, 10.000s)\n')
+    assert 'oracle.statement' in output.getvalue()
+
+    output = io.StringIO()
+    trace_report.main([str(trace_file), '--issue', 'TESTE-1'], output)
+    assert output.getvalue().startswith('TESTE-1\n')
+    assert 'TlpUpdateHandler (' not in output.getvalue()
@@ -0,0 +1,94 @@
+"""Tests for module automation_service.tracing"""
+import json
+
+import pytest
+
+from automation_service import context
+from automation_service import tracing
+
+
+@pytest.fixture(name='tracer')
+def fixture_tracer(tmp_path):
+    """Tracer exporting to a temporary file"""
+    return tracing.Tracer(tracing.JsonlExporter(str(tmp_path / 'traces' / 'spans.jsonl')))
+
+
+def read_spans(tracer: tracing.Tracer) -> list:
+    """Reads the spans exported by the tracer"""
+    with open(tracer.exporter.trace_file, encoding='UTF-8') as trace_file:
+        return [json.loads(line) for line in trace_file]
+
+
+def test_disabled_tracer():
+    """Tests that no span is created without an exporter"""
+    tracer = tracing.Tracer()
+    with tracer.span('teste') as span:
+        assert span is None
+    assert not tracer.enabled
+
+
+def test_span_tree(tracer):
+    """Tests the parent of the nested spans and the trace id from the context"""
+    with context.bind(issue_key='TESTE-1'):
+        with tracer.span('handler.run', handler='MockHandler') as root:
+            with tracer.span('jira.call', endpoint='/rest/api/2/issue/{id}') as child:
+                assert tracer.current_span() is child
+
+    spans = read_spans(tracer)
+    assert [span['name'] for span in spans] == ['jira.call', 'handler.run']
+    assert spans[0]['parent_id'] == root.span_id
+    assert spans[1]['parent_id'] is None
+    assert {span['trace_id'] for span in spans} == {'TESTE-1'}
+    assert spans[1]['attributes'] == {'handler': 'MockHandler'}
+    assert spans[1]['duration'] >= spans[0]['duration']
+
+
+def test_span_trace_id(tracer):
+    """Tests the trace id informed by attribute and the default of the service"""
+    with tracer.span('service.poll'):
+        with tracer.span('service.route', issue_key='TESTE-2'):
+            with tracer.span('oracle.connect'):
+                pass
+
+    spans = {span['name']: span for span in read_spans(tracer)}
+    assert spans['service.poll']['trace_id'] == tracing.SERVICE_TRACE
+    assert spans['service.route']['trace_id'] == 'TESTE-2'
+    assert spans['oracle.connect']['trace_id'] == 'TESTE-2'
+    assert 'issue_key' not in spans['service.route']['attributes']
+
+
+def test_span_error(tracer):
+    """Tests that the error is recorded and raised again"""
+    with pytest.raises(ValueError):
+        with tracer.span('teste'):
+            raise ValueError('teste')
+
+    assert read_spans(tracer)[0]['attributes'] == {'error': 'ValueError'}
+
+
+def test_exporter_buffer(tmp_path):
+    """Tests that the child spans are buffered until the root span ends"""
+    tracer = tracing.Tracer(tracing.JsonlExporter(str(tmp_path / 'spans.jsonl')))
+    with tracer.span('root'):
+        with tracer.span('child'):
+            pass
+        assert not tracer.exporter.trace_file.exists()
+        assert len(tracer.exporter.buffer) == 1
+
+    assert len(read_spans(tracer)) == 2
+
+
+def test_traced(tmp_path):
+    """Tests the decorator on the tracer of the service"""
+    @tracing.traced('teste.function')
+    def function(value):
+        return value * 2
+
+    tracing.configure(str(tmp_path / 'spans.jsonl'))
+    try:
+        assert function(2) == 4
+        assert read_spans(tracing.TRACER)[0]['name'] == 'teste.function'
+    finally:
+        tracing.configure('')
+
+    assert not tracing.TRACER.enabled
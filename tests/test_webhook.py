@@ -0,0 +1,87 @@
+"""Tests for module automation_service.webhook"""
+import http.client
+import json
+from unittest import mock
+
+import pytest
+
+from automation_service import webhook
+from automation_service.webhook import WebhookServer
+
+
+ISSUE = {'key': 'TESTE-1', 'fields': {'summary': 'TMS: Registrar cliente para Credit Hold'}}
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Starts a webhook server on a free port"""
+    server = WebhookServer('127.0.0.1', 0, on_issue=mock.MagicMock(return_value=True),
+                           token='secret', logger=mock.MagicMock())
+    server.start()
+    yield server
+    server.stop()
+
+
+def post(server: WebhookServer, body, path: str = '/?token=secret') -> http.client.HTTPResponse:
+    """Sends a request to the webhook server"""
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+    content = body if isinstance(body, bytes) else json.dumps(body).encode('UTF-8')
+    connection.request('POST', path, body=content, headers={'Content-Type': 'application/json'})
+    return connection.getresponse()
+
+
+@pytest.mark.parametrize(argnames='event', argvalues=['jira:issue_created', 'jira:issue_updated'])
+def test_webhook_accepts_issue_events(server: WebhookServer, event: str):
+    """Tests that the issue events are fed to the service"""
+    response = post(server, {'webhookEvent': event, 'issue': ISSUE})
+
+    assert response.status == 202
+    assert json.loads(response.read()) == {'accepted': True}
+    server.on_issue.assert_called_once_with(ISSUE)
+
+
+def test_webhook_issue_refused_by_service(server: WebhookServer):
+    """Tests the answer when the service does not accept the issue"""
+    server.on_issue.return_value = False
+    response = post(server, {'webhookEvent': 'jira:issue_created', 'issue': ISSUE})
+
+    assert response.status == 200
+    assert json.loads(response.read()) == {'accepted': False}
+
+
+def test_webhook_ignores_other_events(server: WebhookServer):
+    """Tests that the events that are not about issues are ignored"""
+    response = post(server, {'webhookEvent': 'comment_created', 'issue': ISSUE})
+
+    assert response.status == 200
+    server.on_issue.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    argnames='body,path,status',
+    argvalues=[(b'{invalid', '/?token=secret', 400),
+               ({'webhookEvent': 'jira:issue_created', 'issue': ISSUE}, '/', 403),
+               ({'webhookEvent': 'jira:issue_created', 'issue': ISSUE}, '/?token=wrong', 403)],
+    ids=['Invalid json', 'Without token', 'Wrong token'],
+)
+def test_webhook_invalid_requests(server: WebhookServer, body, path: str, status: int):
+    """Tests the invalid requests"""
+    assert post(server, body, path).status == status
+    server.on_issue.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    argnames='host,token,allowed',
+    argvalues=[('127.0.0.1', '', True), ('localhost', '', True), ('::1', '', True),
+               ('0.0.0.0', '', False), ('10.0.0.5', '', False), ('jira-hooks.local', '', False),
+               ('0.0.0.0', 'secret', True)],
+)
+def test_webhook_check_binding(host: str, token: str, allowed: bool):
+    """Tests that the endpoint is only exposed beyond the loopback with a token"""
+    if allowed:
+        webhook.check_binding(host, token)
+        return
+    with pytest.raises(ValueError):
+        webhook.check_binding(host, token)
+    with pytest.raises(ValueError):
+        WebhookServer(host, 0, on_issue=mock.MagicMock(), logger=mock.MagicMock())